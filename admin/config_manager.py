@@ -1,5 +1,8 @@
 import time
 import json
+import threading
+from types import MappingProxyType
+from opensearchpy import ConflictError, NotFoundError
 from search.opensearch_client import client
 
 CONFIG_INDEX = "frono_configs"
@@ -17,27 +20,223 @@ def create_config_index():
     if not client.indices.exists(index=CONFIG_INDEX):
         client.indices.create(index=CONFIG_INDEX, body=mapping)
         print(f"✅ Created {CONFIG_INDEX} index.")
-        
+
+    # The version document always exists, so a missing one means a failed read
+    try:
+        client.index(
+            index=CONFIG_INDEX,
+            id=VERSION_ID,
+            body={"key": VERSION_ID, "value": 0, "updated_at": int(time.time())},
+            op_type="create",
+            refresh=True
+        )
+    except ConflictError:
+        pass
+
+
+# Bumped on every admin change; workers poll this one document and reload
+# only when it moves.
+VERSION_ID = "config_version"
+VERSION_POLL_INTERVAL = 0.5
+
+BUMP_VERSION_SCRIPT = """
+    ctx._source.key = params.key;
+    ctx._source.value = (ctx._source.value == null ? 0 : ctx._source.value) + 1;
+    ctx._source.updated_at = params.now;
+"""
+
+
+class ConfigSnapshot:
+    """
+    Immutable view of frono_configs at one point in time, plus the derived
+    structures built from it. Readers keep whichever snapshot they grabbed;
+    refreshes publish a new one.
+    """
+    __slots__ = ("_values", "_derived", "version", "loaded_at")
+
+    def __init__(self, values: dict, version: int = 0, loaded_at: float = 0, derived: dict | None = None):
+        self._values = MappingProxyType(dict(values))
+        self._derived = MappingProxyType(dict(derived or {}))
+        self.version = version
+        self.loaded_at = loaded_at
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def get_int(self, key, default: int) -> int:
+        try:
+            return int(self._values.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_str(self, key, default: str = "") -> str:
+        value = self._values.get(key)
+        return default if value is None else str(value)
+
+    def get_json(self, key, default=None):
+        value = self._values.get(key)
+        if value is None:
+            return default
+        if not isinstance(value, str):
+            return value
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            print(f"Config {key} is not valid JSON, using default.")
+            return default
+
+    def derived(self, name: str):
+        return self._derived[name]
+
+    def as_dict(self) -> dict:
+        return dict(self._values)
+
+
 class ConfigManager:
-    _cache = {}
-    _last_sync = 0
-    TTL = 60  # Sync settings every 60 seconds
+    _snapshot = ConfigSnapshot({})
+    _builders = {}
+    _refresh_lock = threading.Lock()
+    _refresher = None
+    TTL = 60  # Full reload every 60 seconds even if the version is unchanged
+
+    @classmethod
+    def snapshot(cls) -> ConfigSnapshot:
+        """Current settings. Never does I/O."""
+        return cls._snapshot
 
     @classmethod
     def get_setting(cls, key, default=None):
-        now = time.time()
-        if not cls._cache or (now - cls._last_sync > cls.TTL):
-            cls._refresh_cache()
-        return cls._cache.get(key, default)
+        return cls._snapshot.get(key, default)
 
     @classmethod
-    def _refresh_cache(cls):
+    def derived(cls, name: str):
+        """A structure compiled from the current settings (see register_derived)."""
+        return cls._snapshot.derived(name)
+
+    # ------------------------------------------------
+    # DERIVED STRUCTURES
+    # ------------------------------------------------
+    @classmethod
+    def register_derived(cls, name: str, builder):
+        """
+        builder(snapshot) -> value is run once per config version, never per
+        request. Registering rebuilds the current snapshot straight away.
+        """
+        with cls._refresh_lock:
+            cls._builders[name] = builder
+            current = cls._snapshot
+            cls._publish(current.as_dict(), current.version)
+
+    @classmethod
+    def _publish(cls, values: dict, version: int):
+        """Builds every derived structure, then swaps the snapshot in one assignment."""
+        base = ConfigSnapshot(values, version, time.time())
+        previous = cls._snapshot
+
+        derived = {}
+        for name, builder in cls._builders.items():
+            try:
+                derived[name] = builder(base)
+            except Exception as e:
+                print(f"Config derive error ({name}): {e}")
+                # Keep serving the last good structure
+                if name in previous._derived:
+                    derived[name] = previous._derived[name]
+
+        cls._snapshot = ConfigSnapshot(values, version, base.loaded_at, derived)
+
+    # ------------------------------------------------
+    # LOADING
+    # ------------------------------------------------
+    @classmethod
+    def _fetch_version(cls) -> int | None:
+        """Realtime get of one tiny document; None when it can't be read."""
         try:
-            if not client.indices.exists(index=CONFIG_INDEX):
-                return
-            res = client.search(index=CONFIG_INDEX, body={"query": {"match_all": {}}, "size": 100})
-            hits = res.get("hits", {}).get("hits", [])
-            cls._cache = {h["_source"]["key"]: h["_source"]["value"] for h in hits}
-            cls._last_sync = time.time()
-        except Exception as e:
-            print(f"Config sync error: {e}")
\ No newline at end of file
+            doc = client.get(index=CONFIG_INDEX, id=VERSION_ID, _source_includes=["value"])
+            return int(doc["_source"].get("value") or 0)
+        except NotFoundError:
+            return 0
+        except Exception:
+            return None
+
+    @classmethod
+    def _refresh_cache(cls):
+        # One refresh at a time; readers keep using the old snapshot meanwhile
+        with cls._refresh_lock:
+            try:
+                if not client.indices.exists(index=CONFIG_INDEX):
+                    return
+                version = cls._fetch_version()
+                if version is None:
+                    # Keep the current snapshot (and its version) rather
+                    # than a 0 the poller would see as a change every tick
+                    print("Config sync skipped: version unreadable")
+                    return
+                res = client.search(
+                    index=CONFIG_INDEX,
+                    body={
+                        "query": {"bool": {"must_not": {"ids": {"values": [VERSION_ID]}}}},
+                        "size": 100
+                    }
+                )
+                hits = res.get("hits", {}).get("hits", [])
+                values = {h["_source"]["key"]: h["_source"]["value"] for h in hits}
+                cls._publish(values, version)
+            except Exception as e:
+                print(f"Config sync error: {e}")
+
+    @classmethod
+    def start_refresher(cls):
+        """
+        Loads settings now, then polls the version document every
+        VERSION_POLL_INTERVAL seconds and reloads when it changes.
+        """
+        cls._refresh_cache()
+
+        if cls._refresher and cls._refresher.is_alive():
+            return
+
+        def loop():
+            last_load = time.time()
+            while True:
+                time.sleep(VERSION_POLL_INTERVAL)
+                version = cls._fetch_version()
+                changed = version is not None and version != cls._snapshot.version
+                if changed or time.time() - last_load > cls.TTL:
+                    last_load = time.time()
+                    cls._refresh_cache()
+
+        cls._refresher = threading.Thread(target=loop, name="config-refresher", daemon=True)
+        cls._refresher.start()
+
+    @classmethod
+    def update_setting(cls, key, value):
+        client.index(
+            index=CONFIG_INDEX,
+            id=key,
+            body={"key": key, "value": value, "updated_at": int(time.time())},
+            refresh=True
+        )
+        cls.bump_version()
+        cls._refresh_cache()
+
+    @classmethod
+    def bump_version(cls) -> int:
+        """Tells every worker to reload."""
+        res = client.update(
+            index=CONFIG_INDEX,
+            id=VERSION_ID,
+            body={
+                "scripted_upsert": True,
+                "upsert": {},
+                "script": {
+                    "lang": "painless",
+                    "source": BUMP_VERSION_SCRIPT,
+                    "params": {"key": VERSION_ID, "now": int(time.time())}
+                }
+            },
+            retry_on_conflict=5,
+            refresh=True,
+            _source=["value"]
+        )
+        return int(res["get"]["_source"]["value"])
@@ -1,5 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends, Header, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, status
+from fastapi.responses import StreamingResponse
 from admin.config_manager import ConfigManager
+from search.leads_export import build_export_query, iter_leads, stream_csv, stream_ndjson
+from services.analytics import get_analytics
+from datetime import datetime
 import os
 
 # Create the router
@@ -22,7 +26,7 @@ async def verify_admin(x_api_key: str = Header(None)):
 def get_all_configs(authorized: bool = Depends(verify_admin)):
     """Refreshes and returns the current bot configuration."""
     ConfigManager._refresh_cache()
-    return ConfigManager._cache
+    return ConfigManager.snapshot().as_dict()
 
 @admin_router.post("/settings/update")
 def update_config(key: str, value: str, authorized: bool = Depends(verify_admin)):
@@ -35,4 +39,51 @@ def update_config(key: str, value: str, authorized: bool = Depends(verify_admin)
         ConfigManager.update_setting(key, value)
         return {"status": "success", "updated": key, "new_value": value}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Update failed: {str(e)}")
+
+@admin_router.get("/leads/export")
+def export_leads(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    min_score: int | None = None,
+    max_score: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    intent: list[str] | None = Query(None),
+    slices: int = Query(4, ge=1, le=16),
+    authorized: bool = Depends(verify_admin)
+):
+    """Streams frono_leads as CSV or NDJSON with constant memory."""
+    # Checked up front: once streaming, an error can only cut the file short
+    for name, value in (("date_from", date_from), ("date_to", date_to)):
+        if value:
+            try:
+                datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{name} must be an ISO date or datetime, e.g. 2025-01-31 or 2025-01-31T12:00:00"
+                )
+
+    query = build_export_query(min_score, max_score, date_from, date_to, intent)
+    leads = iter_leads(query, slices=slices)
+
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+
+    if format == "ndjson":
+        body, media_type = stream_ndjson(leads), "application/x-ndjson"
+    else:
+        body, media_type = stream_csv(leads), "text/csv"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="frono_leads_{stamp}.{format}"'}
+    )
+
+@admin_router.get("/analytics")
+def analytics_summary(
+    hours: int = Query(168, ge=1, le=24 * 90),
+    authorized: bool = Depends(verify_admin)
+):
+    """Funnel, lead and conversion numbers from the hourly rollups."""
+    return get_analytics(hours)
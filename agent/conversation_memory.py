@@ -0,0 +1,122 @@
+import threading
+from collections import deque
+
+from agent.prompt_budget import fit_text, CHARS_PER_TOKEN
+
+# Verbatim turns kept per session; older ones are folded into the summary
+WINDOW_TURNS = 4
+SUMMARY_MAX_TOKENS = 150
+# If the LLM can't summarise, evicted turns wait; past this many they are
+# folded in by plain truncation instead so memory stays bounded.
+MAX_PENDING_TURNS = 8
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a customer chat with the Frono.uk shop assistant. "
+    "Keep: products and prices discussed or compared, what the customer wants, "
+    "anything added to the cart, contact details given, open questions. "
+    "Drop greetings and small talk. Reply with the updated summary only, at most 80 words."
+)
+
+
+class ConversationMemory:
+    """
+    Per-session chat memory of constant size: the last WINDOW_TURNS turns
+    verbatim plus a short summary of everything before them.
+
+    Turns leaving the window wait in `pending` until fold() rewrites the
+    summary. fold() calls the LLM, so run it after the reply has been
+    sent (BackgroundTasks), never on the request path.
+    """
+
+    def __init__(self, window: int = WINDOW_TURNS):
+        self.window = deque()
+        self.window_size = window
+        self.summary = ""
+        self.pending = []
+        self._lock = threading.Lock()
+        self._folding = False
+
+    # ------------------------------------------------
+    # REQUEST PATH (memory only)
+    # ------------------------------------------------
+    def add_turn(self, user: str, bot: str | None = None):
+        with self._lock:
+            self.window.append({"user": user, "bot": bot})
+            while len(self.window) > self.window_size:
+                turn = self.window.popleft()
+                if turn["bot"]:
+                    self.pending.append(turn)
+
+    def set_reply(self, bot: str, user: str = ""):
+        """Fills in the reply of the newest turn (adds one if there is none)."""
+        with self._lock:
+            if self.window:
+                self.window[-1]["bot"] = bot
+                return
+        self.add_turn(user, bot)
+
+    def turns(self) -> list:
+        """Completed verbatim turns, oldest first."""
+        with self._lock:
+            return [dict(t) for t in self.window if t["bot"]]
+
+    def needs_summary(self) -> bool:
+        return bool(self.pending) and not self._folding
+
+    # ------------------------------------------------
+    # BACKGROUND
+    # ------------------------------------------------
+    def fold(self):
+        """Folds pending turns into the summary. Safe to call repeatedly."""
+        with self._lock:
+            if self._folding or not self.pending:
+                return
+            self._folding = True
+            batch = list(self.pending)
+            summary = self.summary
+
+        try:
+            new_summary = summarize(summary, batch)
+            if new_summary is None and len(batch) < MAX_PENDING_TURNS:
+                return
+            if new_summary is None:
+                new_summary = truncate_summary(summary, batch)
+
+            with self._lock:
+                self.summary = fit_text(new_summary, SUMMARY_MAX_TOKENS)
+                # Turns evicted while we were summarising stay pending
+                del self.pending[:len(batch)]
+        finally:
+            with self._lock:
+                self._folding = False
+
+
+def _render(turns: list) -> str:
+    return "".join(f"User: {t['user']}\nAssistant: {t['bot']}\n" for t in turns)
+
+
+def summarize(summary: str, turns: list) -> str | None:
+    """Asks the LLM for an updated summary; None if no provider answered."""
+    from llm.profiles import profile_for
+    from llm.router import get_router
+    from llm.scheduler import BACKGROUND
+
+    prompt = (
+        f"Current summary:\n{summary or '(empty)'}\n\n"
+        f"New conversation turns:\n{_render(turns)}\n"
+        "Updated summary:"
+    )
+    reply = get_router().generate(
+        prompt, system_prompt=SUMMARY_SYSTEM_PROMPT, fallback=None, priority=BACKGROUND,
+        profile=profile_for("SUMMARY")
+    )
+    return reply.strip() if reply else None
+
+
+def truncate_summary(summary: str, turns: list) -> str:
+    """No-LLM fallback: keep the most recent user requests."""
+    asks = "; ".join(fit_text(t["user"], 25) for t in turns)
+    text = f"{summary} Customer asked about: {asks}".strip()
+    # Keep the newest end of the text
+    limit = SUMMARY_MAX_TOKENS * CHARS_PER_TOKEN - 1
+    return text if len(text) <= limit else "…" + text[-limit:]
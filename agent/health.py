@@ -1,6 +1,16 @@
 from search.opensearch_client import ping
+from llm.router import get_router
+from llm.generation_cache import generation_cache
+from llm.scheduler import scheduler
+from llm.profiles import profile_stats
+from services.stream_sessions import stream_sessions
 
 def check_health():
     return {
-        "status": "ok" if ping() else "degraded"
+        "status": "ok" if ping() else "degraded",
+        "llm": get_router().health_report(),
+        "generation_cache": generation_cache.report(),
+        "llm_scheduler": scheduler.report(),
+        "generation_profiles": profile_stats.report(),
+        "reply_streams": stream_sessions.report()
     }
@@ -1,7 +1,9 @@
 import re
-from llm.groq_client import GroqClient 
+from llm.router import get_router
+from llm.scheduler import LOW
+from llm.profiles import profile_for
 
-llama = GroqClient() 
+llama = get_router()
 
 # --- PATTERNS ---
 EMAIL_PATTERN = r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b"
@@ -180,7 +182,10 @@ def llm_intent_fallback(message: str) -> str:
     )
 
     try:
-        result = llama.generate(prompt).upper()
+        # Unreachable providers classify as BROWSING rather than raising
+        result = llama.generate(
+            prompt, fallback="BROWSING", priority=LOW, profile=profile_for("INTENT_FALLBACK")
+        ).upper()
         
         # Explicit check for domain restriction
         if "OUT_OF_DOMAIN" in result:
@@ -1,5 +1,19 @@
 from admin.config_manager import ConfigManager
 
+
+def build_scoring_weights(config):
+    # Admin Config points with hardcoded fallbacks
+    return {
+        "BUYING": config.get_int("buying_points", 20),
+        "AFFIRMATION": config.get_int("affirmation_points", 15),
+        "PRODUCT_INFO": config.get_int("product_info_points", 10),
+        "CLOSING": config.get_int("closing_penalty", -10),
+    }
+
+
+ConfigManager.register_derived("scoring_weights", build_scoring_weights)
+
+
 class LeadScorer:
     def __init__(self):
         self.score = 0
@@ -7,11 +21,12 @@ class LeadScorer:
         self.email_captured = False
 
     def update(self, intent: str, text: str):
-        # Fetch dynamic points from Admin Config with hardcoded fallbacks
-        buying_pts = int(ConfigManager.get_setting("buying_points", 20))
-        affirmation_pts = int(ConfigManager.get_setting("affirmation_points", 15))
-        info_pts = int(ConfigManager.get_setting("product_info_points", 10))
-        closing_penalty = int(ConfigManager.get_setting("closing_penalty", -10))
+        # Points rebuilt once per config version
+        weights = ConfigManager.derived("scoring_weights")
+        buying_pts = weights["BUYING"]
+        affirmation_pts = weights["AFFIRMATION"]
+        info_pts = weights["PRODUCT_INFO"]
+        closing_penalty = weights["CLOSING"]
 
         points = 0
         
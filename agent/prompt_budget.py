@@ -0,0 +1,169 @@
+import re
+from admin.config_manager import ConfigManager
+
+# ---------------------------------------------------
+# TOKEN BUDGETS (per intent)
+# ---------------------------------------------------
+# Whole-prompt budgets in estimated tokens. Override any of them from
+# Admin Config with prompt_budgets_json, e.g. {"SUPPORT": 1800}.
+DEFAULT_BUDGETS = {
+    "ABOUT_BRAND": 700,
+    "BROWSING": 900,
+    "PRODUCT_INFO": 1200,
+    "BUYING": 900,
+    "SUPPORT": 1400,
+    "AFFIRMATION": 800,
+    "CLOSING": 500,
+    "LEAD_SUBMISSION": 600,
+    "default": 1000,
+}
+
+CHARS_PER_TOKEN = 4
+
+
+def _build_budgets(config):
+    overrides = config.get_json("prompt_budgets_json", {}) or {}
+    budgets = dict(DEFAULT_BUDGETS)
+    for intent, value in overrides.items():
+        try:
+            budgets[intent] = int(value)
+        except (TypeError, ValueError):
+            print(f"Ignoring prompt budget for {intent}: {value!r}")
+    return budgets
+
+
+ConfigManager.register_derived("prompt_budgets", _build_budgets)
+
+
+def budget_for(intent: str) -> int:
+    budgets = ConfigManager.derived("prompt_budgets")
+    return budgets.get(intent, budgets["default"])
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 characters per token for English; no tokenizer needed."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def fit_text(text: str, max_tokens: int) -> str:
+    """Cuts text to max_tokens at a word boundary, marking the cut with …"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens * CHARS_PER_TOKEN - 1, 0)
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+
+# ---------------------------------------------------
+# FACTS
+# ---------------------------------------------------
+# Retriever context is a header line followed by one line per item
+# ("- title: content", "  • name (...)", "1. name (...)"). Lines that
+# don't start an item belong to the item above.
+_ITEM_START = re.compile(r"^\s*(?:[-•*]|\d+\.)\s")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "do", "for", "have", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "to", "what", "you", "your", "with",
+}
+
+
+def split_facts(context: str) -> tuple[str, list[str]]:
+    """Returns (header, items)."""
+    header_lines = []
+    items = []
+    for line in context.splitlines():
+        if _ITEM_START.match(line):
+            items.append(line)
+        elif items:
+            items[-1] += "\n" + line
+        else:
+            header_lines.append(line)
+    return "\n".join(header_lines), items
+
+
+def _terms(text: str) -> set:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+
+def select_facts(context: str, query: str, max_tokens: int) -> tuple[str, dict]:
+    """
+    Keeps the items most relevant to `query` that fit in max_tokens.
+    Relevance is term overlap with the query; ties keep the retriever's
+    order (already score-sorted). Kept items stay in their original order
+    so numbered menus still line up.
+    """
+    header, items = split_facts(context)
+    report = {"total": len(items), "kept": 0, "trimmed": 0}
+
+    if max_tokens <= 0:
+        return "", report
+
+    used = estimate_tokens(header) + 1 if header else 0
+    if not items:
+        text = fit_text(header, max_tokens)
+        report["trimmed"] = int(text != header)
+        return text, report
+
+    query_terms = _terms(query)
+    ranked = sorted(
+        range(len(items)),
+        key=lambda i: (-len(query_terms & _terms(items[i])), i)
+    )
+
+    kept = {}
+    for i in ranked:
+        cost = estimate_tokens(items[i]) + 1
+        if used + cost <= max_tokens:
+            kept[i] = items[i]
+            used += cost
+        elif not kept and max_tokens - used > 20:
+            # The single most relevant fact is too long: keep its start
+            kept[i] = fit_text(items[i], max_tokens - used - 1)
+            used = max_tokens
+            report["trimmed"] += 1
+
+    report["kept"] = len(kept)
+    lines = ([header] if header else []) + [kept[i] for i in sorted(kept)]
+    return "\n".join(lines), report
+
+
+# ---------------------------------------------------
+# HISTORY
+# ---------------------------------------------------
+TURN_MAX_TOKENS = 200
+
+
+def select_turns(turns: list, max_tokens: int) -> tuple[list, dict]:
+    """
+    Newest turns first until the budget runs out; long messages are cut.
+    Returns the kept turns oldest first, as {"user", "bot"} dicts.
+    """
+    report = {"total": len(turns), "kept": 0}
+    if max_tokens <= 0:
+        return [], report
+
+    kept = []
+    used = 0
+
+    for turn in reversed(turns):
+        user = fit_text(turn["user"], TURN_MAX_TOKENS // 2)
+        bot = fit_text(turn["bot"], TURN_MAX_TOKENS)
+        cost = estimate_tokens(f"User: {user}\nAssistant: {bot}\n")
+        if used + cost > max_tokens:
+            break
+        kept.append({"user": user, "bot": bot})
+        used += cost
+
+    report["kept"] = len(kept)
+    return kept[::-1], report
+
+
+def select_history(turns: list, max_tokens: int) -> tuple[str, dict]:
+    """select_turns() rendered as a "User: / Assistant:" transcript."""
+    kept, report = select_turns(turns, max_tokens)
+    text = "".join(f"User: {t['user']}\nAssistant: {t['bot']}\n" for t in kept)
+    return text, report
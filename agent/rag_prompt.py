@@ -1,74 +1,155 @@
-from config import BOT_NAME
-
-
-def build_prompt(user_message, context, intent, lead_hook=None, history=""):
+from config import STRICT_SYSTEM_PROMPT
+from agent.prompt_budget import (
+    budget_for,
+    estimate_tokens,
+    fit_text,
+    select_facts,
+    select_turns,
+)
+
+USER_MESSAGE_MAX_TOKENS = 300
+# Facts always get at least this much: a long message is cut down (not
+# below USER_MESSAGE_MIN_TOKENS) before the facts are, and if that isn't
+# enough the prompt goes over budget rather than drop every fact
+FACTS_MIN_TOKENS = 150
+USER_MESSAGE_MIN_TOKENS = 80
+
+# ---------------------------------------------------
+# STABLE PREFIX
+# ---------------------------------------------------
+# Identical for every turn of every session, so it forms a prefix that
+# Ollama's KV cache and provider-side prompt caching can reuse. Anything
+# that changes per turn (facts, lead hooks, the message itself) goes in
+# the last user message instead; never add per-turn text here.
+RULES = (
+    "Rules:\n"
+    "- Answer using the verified facts given with the customer's message.\n"
+    "- If no verified facts are given, say clearly that you do not yet have "
+    "verified information and ask one clarifying question.\n"
+    "- Never contradict confirmed stock information.\n"
+    "- Do NOT proceed with payment unless contact is collected.\n"
+    "- When the user is ready to buy, guide them through next steps.\n"
+    "- Do NOT mention software, analytics, ERP, or unrelated services.\n"
+    "- Do NOT add assumptions or opinions.\n"
+    "- If a STRATEGIC GOAL is given, work it into your response naturally as a helpful suggestion.\n"
+)
+
+CHAT_SYSTEM_PROMPT = f"{STRICT_SYSTEM_PROMPT}\n{RULES}"
+
+
+def assemble_messages(user_message, context, intent, lead_hook=None, history=None, summary=""):
     """
-    Brand-safe, memory-aware, lead-optimized prompt builder.
-    Includes conversation history and optional lead hooks.
+    Brand-safe, memory-aware, lead-optimized chat messages.
+
+    Layout, most stable first:
+      system     CHAT_SYSTEM_PROMPT (same for everyone)
+      system     summary of earlier turns (changes only when memory folds)
+      user/asst  recent history turns
+      user       verified facts, lead hook, the message, closing line
+
+    Fills the intent's token budget by priority: rules and the user message
+    always, then the verified facts most relevant to the message (at least
+    FACTS_MIN_TOKENS of them), then the conversation summary, then the most
+    recent history turns ({"user", "bot"} dicts). Returns (messages, report)
+    where report has the estimated size of each part; facts_trimmed counts
+    facts cut short or left out.
     """
+    budget = budget_for(intent)
 
-    # ----------------------------------
-    # 1. Lead Hook Instruction
-    # ----------------------------------
-    hook_instruction = ""
+    user_max = USER_MESSAGE_MAX_TOKENS
+    user_block = f"User message:\n{fit_text(user_message, user_max)}\n\n"
+    hook_block = f"STRATEGIC GOAL: {lead_hook}\n\n" if lead_hook else ""
 
-    if lead_hook:
-        hook_instruction = (
-            f"\n- STRATEGIC GOAL: {lead_hook}\n"
-            "- Work this goal into your response naturally as a helpful suggestion."
+    if not context:
+        closing = (
+            "No verified facts are available for this message. Say clearly that you do not "
+            "yet have verified information and ask one clarifying question."
         )
+    else:
+        closing = "Answer clearly, naturally, and factually."
 
-    # ----------------------------------
-    # 2. Conversation Memory
-    # ----------------------------------
-    history_block = ""
+    facts_label = "Verified facts about Frono.uk:\n"
+    rules_tokens = estimate_tokens(RULES + hook_block + user_block + closing)
+    remaining = budget - rules_tokens
 
-    if history.strip():
-        history_block = (
-            "Conversation so far:\n"
-            f"{history}\n\n"
-        )
+    # A long message must not squeeze out the facts: shorten it first
+    shortfall = FACTS_MIN_TOKENS + estimate_tokens(facts_label) + 1 - remaining
+    if context and shortfall > 0 and user_max > USER_MESSAGE_MIN_TOKENS:
+        user_max = max(USER_MESSAGE_MIN_TOKENS, min(user_max, estimate_tokens(user_message)) - shortfall)
+        user_block = f"User message:\n{fit_text(user_message, user_max)}\n\n"
+        rules_tokens = estimate_tokens(RULES + hook_block + user_block + closing)
+        remaining = budget - rules_tokens
 
     # ----------------------------------
-    # 3. Fallback (No Context)
+    # 1. Verified Facts (by relevance)
     # ----------------------------------
-    if not context:
-        return (
-            f"You are {BOT_NAME}, the official assistant for Frono.uk.\n\n"
+    facts_block = ""
+    facts_report = {"total": 0, "kept": 0, "trimmed": 0}
 
-            f"{history_block}"
-
-            "Rules:\n"
-            "- Do NOT guess or invent information.\n"
-            "- Only speak about Frono.uk if verified facts are available."
-            f"{hook_instruction}\n\n"
-
-            f"User message:\n{user_message}\n\n"
-
-            "Say clearly that you do not yet have verified information "
-            "and ask one clarifying question."
+    if context:
+        facts, facts_report = select_facts(
+            context, user_message, max(remaining - estimate_tokens(facts_label) - 1, FACTS_MIN_TOKENS)
         )
+        if facts:
+            facts_block = f"{facts_label}{facts}\n\n"
+            remaining -= estimate_tokens(facts_block)
 
     # ----------------------------------
-    # 4. Main RAG Prompt (With Memory)
+    # 2. Conversation Memory (newest first)
     # ----------------------------------
-    return (
-        f"You are {BOT_NAME}, the official assistant for Frono.uk.\n\n"
-
-        f"{history_block}"
-
-        "Rules:\n"
-        "- Answer using the verified facts below."
-        "- Never contradict confirmed stock information.\n"
-        "- Do NOT proceed with payment unless contact is collected.\n"
-        "- When the user is ready to buy, guide them through next steps."
-        "- Do NOT mention software, analytics, ERP, or unrelated services.\n"
-        "- Do NOT add assumptions or opinions."
-        f"{hook_instruction}\n\n"
-
-        f"Verified facts about Frono.uk:\n{context}\n\n"
-
-        f"User message:\n{user_message}\n\n"
-
-        "Answer clearly, naturally, and factually."
+    summary_block = ""
+    if summary:
+        candidate = f"Earlier in this conversation:\n{summary}"
+        if estimate_tokens(candidate) <= remaining:
+            summary_block = candidate
+            remaining -= estimate_tokens(candidate)
+
+    turns, history_report = select_turns(history or [], remaining)
+
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    if summary_block:
+        messages.append({"role": "system", "content": summary_block})
+    for turn in turns:
+        messages.append({"role": "user", "content": turn["user"]})
+        messages.append({"role": "assistant", "content": turn["bot"]})
+    messages.append({
+        "role": "user",
+        "content": f"{facts_block}{hook_block}{user_block}{closing}"
+    })
+
+    history_tokens = estimate_tokens(summary_block) + sum(
+        estimate_tokens(t["user"]) + estimate_tokens(t["bot"]) for t in turns
     )
+    report = {
+        "intent": intent,
+        "budget": budget,
+        "tokens": rules_tokens + estimate_tokens(facts_block) + history_tokens,
+        "rules_tokens": rules_tokens,
+        "facts_tokens": estimate_tokens(facts_block),
+        "history_tokens": history_tokens,
+        "prefix_tokens": estimate_tokens(CHAT_SYSTEM_PROMPT),
+        "facts_kept": facts_report["kept"],
+        "facts_total": facts_report["total"],
+        "facts_trimmed": facts_report["trimmed"] + facts_report["total"] - facts_report["kept"],
+        "user_trimmed": estimate_tokens(user_message) > user_max,
+        "history_kept": history_report["kept"],
+        "history_total": history_report["total"],
+    }
+    return messages, report
+
+
+def flatten_messages(messages: list) -> str:
+    """One string for logs, cache keys and text-only callers."""
+    return "\n\n".join(m["content"] for m in messages)
+
+
+def assemble_prompt(user_message, context, intent, lead_hook=None, history=None, summary=""):
+    """Same as assemble_messages, as one prompt string."""
+    messages, report = assemble_messages(user_message, context, intent, lead_hook, history, summary)
+    return flatten_messages(messages), report
+
+
+def build_prompt(user_message, context, intent, lead_hook=None, history=None, summary=""):
+    """Prompt text only; see assemble_messages for the size report."""
+    prompt, _ = assemble_prompt(user_message, context, intent, lead_hook, history, summary)
+    return prompt
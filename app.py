@@ -2,11 +2,14 @@
 import uuid
 import time
 import re
-from queue import Queue
-from fastapi import FastAPI, BackgroundTasks, Request
+import json
+import asyncio
+from queue import Queue, Empty
+from fastapi import FastAPI, BackgroundTasks, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 
 # --- IMPORTS ---
 from agent.lead_scoring import LeadScorer
@@ -20,24 +23,36 @@ from services.email_templates import (
     sales_notification_email
 )
 from services.stock_service import StockService
-from models.schemas import LeadCreate, LeadResponse
-from llm.llama_client import LLaMAClient
+from services.lead_buffer import LeadBuffer, LeadBufferFull
+from services import stock_events, sync_events
+from services import analytics
+from services.stream_sessions import stream_sessions
+from models.schemas import LeadCreate, LeadResponse, BulkLeadResponse
+from llm.llama_client import close_clients as close_llama_clients
 from agent.health import check_health
 from agent.intent_detector import detect_intent, extract_contact_info
-from agent.rag_prompt import build_prompt
-from search.retriever import retrieve_context, COLLECTION_GROUPS
-from search.leads_repo import create_lead
+from agent.rag_prompt import assemble_messages, flatten_messages
+from agent.conversation_memory import ConversationMemory
+from search.retriever import retrieve_context, invalidate_caches, group_for_collections, COLLECTION_GROUPS
+from search.leads_repo import create_lead, bulk_upsert_leads, lead_id_for, ensure_leads_mapping
 from services.email_service import send_email
 from services.email_templates import customer_confirmation_email, sales_notification_email
 from config import SALES_EMAIL, BOT_NAME, STRICT_SYSTEM_PROMPT
-from llm.groq_client import GroqClient # WAS: from llm.llama_client import LLaMAClient
+from config import (
+    LEAD_WRITE_BEHIND,
+    LEAD_JOURNAL_PATH,
+    LEAD_FLUSH_INTERVAL_MS,
+    LEAD_FLUSH_MAX_RECORDS,
+    LEAD_BUFFER_MAX
+)
+from llm.router import get_router, FALLBACK_REPLY # Groq first, Ollama as failover (config.LLM_PROVIDERS)
+from llm.generation_cache import generation_cache, cacheable, cache_key
+from llm.scheduler import priority_for, BACKGROUND
+from llm.profiles import profile_for
 from admin.config_manager import ConfigManager
 from admin.routes import admin_router
 from admin.config_manager import create_config_index
 
-
-# Inside process_message or chat
-no_data_msg = ConfigManager.get_setting("safe_no_data_reply", "Sorry, I can't help with that.")
 # ---------------------------------------------------
 # GLOBAL STORE FOR MULTI-USER QUEUES
 # ---------------------------------------------------
@@ -48,6 +63,12 @@ SAFE_NO_DATA_REPLY = (
     "Could you please contact support@frono.uk or clarify the product, category, or SKU?"
 )
 
+# Admin-editable reply text, rebuilt once per config version
+ConfigManager.register_derived(
+    "reply_templates",
+    lambda config: {"no_data": config.get_str("safe_no_data_reply", SAFE_NO_DATA_REPLY)}
+)
+
 user_queues = {}
 
 # Temporary stock reservations (session-based)
@@ -66,12 +87,94 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Optional write-behind for /lead (see services/lead_buffer.py)
+lead_buffer = LeadBuffer(
+    LEAD_JOURNAL_PATH,
+    flush_interval_ms=LEAD_FLUSH_INTERVAL_MS,
+    max_records=LEAD_FLUSH_MAX_RECORDS,
+    max_pending=LEAD_BUFFER_MAX
+) if LEAD_WRITE_BEHIND else None
+
 @app.on_event("startup")
 async def startup_event():
     # This runs once when the server starts
     create_config_index()
-# llama = LLaMAClient()
-llama = GroqClient()
+    try:
+        ensure_leads_mapping()
+    except Exception as e:
+        # Leads still work; only /admin/leads/export sorts on lead_id
+        print(f"⚠️ Could not add lead_id to the frono_leads mapping: {e}")
+    ConfigManager.start_refresher()
+    analytics.create_rollup_index()
+    analytics.start_rollup_job()
+    # master_sync's stock changes and alias swaps (it runs as its own process)
+    sync_events.start_listener(client, on_catalog_rebuilt)
+    if lead_buffer:
+        lead_buffer.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if lead_buffer:
+        lead_buffer.stop()
+    analytics.flush_counters()
+    close_llama_clients()
+
+llama = get_router()
+
+
+# ---------------------------------------------------
+# REPLY GENERATION (shared across identical prompts)
+# ---------------------------------------------------
+def llm_request(result: dict) -> dict:
+    """
+    Chat messages (stable system prefix first) when process_message built
+    them; the canned early-return prompts still go as prompt + system.
+    """
+    if result.get("messages"):
+        return {
+            "prompt": result["final_prompt"],
+            "messages": result["messages"],
+            "session_id": result.get("session_id"),
+        }
+    return {"prompt": result["final_prompt"], "system_prompt": STRICT_SYSTEM_PROMPT}
+
+
+def generate_reply(result: dict) -> str:
+    request = llm_request(result)
+    # Checkout turns jump the LLM queue; browsing is shed first
+    priority = priority_for(result["intent"], result["session"])
+    # Greetings and goodbyes go to the small model with a short reply cap
+    profile = profile_for(result["intent"])
+
+    if not cacheable(result["intent"], result["session"]):
+        generation_cache.bypass()
+        return llama.generate(**request, priority=priority, profile=profile)
+
+    key = cache_key(request.get("system_prompt", ""), request["prompt"], llama.model_key,
+                    f"generate:{profile['name']}")
+    return generation_cache.generate(
+        key, request["prompt"],
+        lambda: llama.generate(**request, fallback=None, priority=priority, profile=profile),
+        fallback=FALLBACK_REPLY
+    )
+
+
+def stream_reply(result: dict):
+    request = llm_request(result)
+    priority = priority_for(result["intent"], result["session"])
+    profile = profile_for(result["intent"])
+
+    if not cacheable(result["intent"], result["session"]):
+        generation_cache.bypass()
+        return llama.stream(**request, priority=priority, profile=profile)
+
+    key = cache_key(request.get("system_prompt", ""), request["prompt"], llama.model_key,
+                    f"stream:{profile['name']}")
+    return generation_cache.stream(
+        key, request["prompt"],
+        lambda: llama.stream(**request, fallback=None, priority=priority, profile=profile),
+        fallback=FALLBACK_REPLY
+    )
 
 # ---------------------------------------------------
 # UPDATED SCHEMA (Now requires session_id)
@@ -83,7 +186,7 @@ class PromptRequest(BaseModel): # type: ignore
 
 @app.get("/admin/settings")
 def get_settings():
-    return ConfigManager._cache
+    return ConfigManager.snapshot().as_dict()
 
 @app.post("/admin/settings/update")
 def update_setting(key: str, value: str):
@@ -91,13 +194,7 @@ def update_setting(key: str, value: str):
     if value.isdigit():
         value = int(value)
         
-    client.index(
-        index="frono_configs",
-        id=key,
-        body={"key": key, "value": value, "updated_at": time.time()},
-        refresh=True
-    )
-    ConfigManager._refresh_cache()
+    ConfigManager.update_setting(key, value)
     return {"status": "updated", "key": key, "new_value": value}
 
 # ---------------------------------------------------
@@ -114,7 +211,8 @@ def health():
 def test_llama(req: PromptRequest):
     response = llama.generate(
         prompt=req.prompt,
-        system_prompt=STRICT_SYSTEM_PROMPT
+        system_prompt=STRICT_SYSTEM_PROMPT,
+        priority=BACKGROUND     # debug traffic never competes with customers
     )
     return {"response": response}
 @app.get("/api/collections")
@@ -159,71 +257,66 @@ def extract_topic(text):
 def chat(req: PromptRequest, background_tasks: BackgroundTasks):
     result = process_message(req)
     
-    reply = llama.generate(
-        prompt=result["final_prompt"],
-        system_prompt=STRICT_SYSTEM_PROMPT
-    )
+    reply = generate_reply(result)
 
     session = result["session"]
     scorer = result["scorer"]
-    session["history"][-1]["bot"] = reply
+    session["history"].set_reply(reply, user=req.prompt)
+    if session["history"].needs_summary():
+        # Summarise turns that left the window after the reply is sent
+        background_tasks.add_task(session["history"].fold)
     # DEBUG LOGS
     print(f"DEBUG: Session Stage: {session.get('stage')}")
-    print(f"DEBUG: Order in Cache: {stock_reservations.get(req.session_id)}")
+    print(f"DEBUG: Cart in Cache: {stock_reservations.get(req.session_id)}")
     # -----------------------------
     # Auto Send Email on Order
     # -----------------------------
     if session["stage"] == "converted" and session.get("email"):
-        order = stock_reservations.get(req.session_id)
-        if not order:
-            print("❌ Email logic skipped: No order found in stock_reservations.")
+        cart = stock_reservations.get(req.session_id)
+        if not cart:
+            print("❌ Email logic skipped: No cart found in stock_reservations.")
         elif not session.get("email"):
             print("❌ Email logic skipped: No email address in session.")
         else:
             # ✅ This block should now run reliably
             print(f"📧 Triggering email for {session['email']}...")
-        if order:
-            # 1 Updated stock commit logic in app.py
-            # ✅ Replace the failing client.update with this:
+        if cart:
+            # 1️⃣ Commit every cart line in one bulk request
             try:
-                # Inside your chat_stream when an order is confirmed:
-                StockService.reserve_and_commit(
-                    sku=order["sku"],
-                    qty=order["qty"]
-                )
-
-                print(f"✅ Stock committed for {order['sku']}")
+                commit = StockService.commit_cart(cart)
             except Exception as e:
-                print(f"❌ Stock update failed: {e}")
-
+                commit = {"committed": False, "lines": [], "error": str(e)}
 
-            # 2️⃣ Send customer email
-            background_tasks.add_task(
-                send_email,
-                session["email"],
-                "Your Frono Order Confirmation",
-                customer_confirmation_email(
-                    product=order["name"],
-                    qty=order["qty"],
-                    price=order["price"]
+            if not commit["committed"]:
+                print(f"❌ Stock update failed: {commit}")
+                set_stage(session, "failed")
+            else:
+                print(f"✅ Stock committed for {[l['sku'] for l in commit['lines']]}")
+
+                # 2️⃣ Send customer email
+                background_tasks.add_task(
+                    send_email,
+                    session["email"],
+                    "Your Frono Order Confirmation",
+                    customer_confirmation_email(cart)
                 )
-            )
 
-            # 3️⃣ Send sales notification (Fixed: now goes to SALES_EMAIL)
-            background_tasks.add_task(
-                send_email,
-                SALES_EMAIL,
-                "New Order Received",
-                sales_notification_email(
-                    email=session["email"],
-                    intent="ORDER_PLACED",
-                    score=scorer.score
+                # 3️⃣ Send sales notification (Fixed: now goes to SALES_EMAIL)
+                background_tasks.add_task(
+                    send_email,
+                    SALES_EMAIL,
+                    "New Order Received",
+                    sales_notification_email(
+                        email=session["email"],
+                        intent="ORDER_PLACED",
+                        score=scorer.score
+                    )
                 )
-            )
 
-            # 4️⃣ Cleanup (MOVED INSIDE THE IF BLOCK)
-            stock_reservations.pop(req.session_id, None)
-            session["stage"] = "completed"
+                # 4️⃣ Cleanup (MOVED INSIDE THE IF BLOCK)
+                stock_reservations.pop(req.session_id, None)
+                session["cart"] = []
+                set_stage(session, "completed")
 
     return {
         "intent": result["intent"],
@@ -231,6 +324,48 @@ def chat(req: PromptRequest, background_tasks: BackgroundTasks):
         "lead_score": scorer.score
     }
 
+# ---------------------------------------------------
+# CART HELPERS
+# ---------------------------------------------------
+def add_to_cart(session: dict, product: dict, qty: int):
+    """Adds a line to the session cart, merging repeat SKUs."""
+    for line in session["cart"]:
+        if line["sku"] == product["sku"]:
+            line["qty"] = qty
+            line["available"] = product.get("qty", 0)
+            return line
+
+    line = {
+        "sku": product["sku"],
+        "name": product["name"],
+        "price": product["price"],
+        "qty": qty,
+        "available": product.get("qty", 0),
+        "group": group_for_collections(product.get("collection")),
+    }
+    session["cart"].append(line)
+    return line
+
+
+def set_stage(session: dict, stage: str):
+    """Moves the session through the funnel and counts its first entry into each stage."""
+    if session.get("stage") == stage:
+        return
+
+    session["stage"] = stage
+    analytics.record_stage(stage, session)
+
+    if stage == "converted":
+        for group in {line.get("group") for line in session.get("cart", [])}:
+            analytics.record_group("converted", group, session)
+
+
+def cart_summary(session: dict) -> str:
+    if session.get("cart"):
+        return ", ".join(f"{l['qty']} x {l['name']}" for l in session["cart"])
+    return session["selected_product"]["name"]
+
+
 # ---------------------------------------------------
 # CHAT STREAM ENDPOINT (WRITES TO SPECIFIC QUEUE)
 # ---------------------------------------------------
@@ -246,13 +381,15 @@ def process_message(req: PromptRequest):
             "last_topic": None,
             "selected_product": None,   # ✅ LOCK PRODUCT
             "scorer": LeadScorer(),
-            "history": [],
+            "history": ConversationMemory(),
             "email": None,
             "menu": {},
             "stock_confirmed": False,
             "reserved_qty": None,
-            "order": None,
+            "cart": [],                 # ✅ MULTI-LINE ORDER
+            "counted": set(),           # analytics already recorded for this session
         }
+        analytics.record_stage("browsing", user_sessions[session_id])
 
     session = user_sessions[session_id]
     scorer = session["scorer"]
@@ -299,10 +436,7 @@ def process_message(req: PromptRequest):
             "Do not provide any other information or help."
         )
         # ✅ Add this turn to history so the stream endpoint doesn't crash
-        session["history"].append({
-            "user": req.prompt,
-            "bot": None
-        })
+        session["history"].add_turn(req.prompt)
         return {
             "intent": "OUT_OF_DOMAIN",
             "final_prompt": final_prompt,
@@ -332,15 +466,16 @@ def process_message(req: PromptRequest):
         session["email"] = contact["email"]
         scorer.email_captured = True
 
-        session["stage"] = "converted"
+        set_stage(session, "converted")
         intent = "LEAD_SUBMISSION"
+        session["history"].add_turn(req.prompt)
 
         return {
             "intent": intent,
             "final_prompt": (
                 "Thank you! ✅\n\n"
                 "Your order for **"
-                f"{session['selected_product']['name']}** has been received.\n"
+                f"{cart_summary(session)}** has been received.\n"
                 "Please check your email for confirmation."
             ),
             "scorer": scorer,
@@ -368,18 +503,16 @@ def process_message(req: PromptRequest):
     latest_product = get_product_by_name(req.prompt)
 
     if latest_product:
-        # Reset checkout if product changed
+        # New product selected: lines already in the cart are kept
         if (
             not session.get("selected_product")
             or session["selected_product"]["sku"] != latest_product["sku"]
         ):
             session["selected_product"] = latest_product
             session["stock_confirmed"] = False
-            session["order"] = None
+            analytics.record_group("interest", group_for_collections(latest_product.get("collection")), session)
             session["reserved_qty"] = None
 
-            stock_reservations.pop(session_id, None)
-
         product = session["selected_product"]
 
 
@@ -396,10 +529,11 @@ def process_message(req: PromptRequest):
     if intent == "LEAD_SUBMISSION" and session.get("selected_product"):
         context = (
             f"Thank you! ✅\n\n"
-            f"Your order for **{session['selected_product']['name']}** "
+            f"Your order for **{cart_summary(session)}** "
             f"is being processed.\n"
             "Please check your email for confirmation."
         )
+        session["history"].add_turn(req.prompt)
         return {
             "intent": intent,
             "final_prompt": context,
@@ -420,27 +554,26 @@ def process_message(req: PromptRequest):
             available = product.get("qty", 0)
 
             if available >= requested_qty:
-                order = {
-                    "sku": product["sku"],
-                    "name": product["name"],
-                    "price": product["price"],
-                    "qty": requested_qty,
-                    "available": available,
-                }
+                add_to_cart(session, product, requested_qty)
 
-                stock_reservations[session_id] = order
-                session["order"] = order
+                stock_reservations[session_id] = session["cart"]
                 session["stock_confirmed"] = True
                 session["reserved_qty"] = requested_qty
-                session["stage"] = "checkout"
+                set_stage(session, "checkout")
+
+                cart_lines = "\n".join(
+                    f"  • {line['name']} x {line['qty']} (£{line['price']})"
+                    for line in session["cart"]
+                )
 
                 context = (
-                    f"CONFIRMED: **{product['name']}** is available.\n"
+                    f"CONFIRMED: **{product['name']}** is available and added to the cart.\n"
                     f"Price: £{product['price']}.\n\n"
-                    "Please provide your email address to continue."
+                    f"Cart:\n{cart_lines}\n\n"
+                    "The user can add another product, or provide an email address to check out."
                 )
             else:
-                session["stage"] = "interest"
+                set_stage(session, "interest")
                 context = (
                     f"NOTICE: Only {available} units left. "
                     f"You requested {requested_qty}."
@@ -460,14 +593,12 @@ def process_message(req: PromptRequest):
 
     # 🔐 TRUTH GATE — NO VERIFIED DATA
     if not context:
-        session["history"].append({
-            "user": req.prompt,
-            "bot": SAFE_NO_DATA_REPLY
-        })
+        no_data_reply = ConfigManager.derived("reply_templates")["no_data"]
+        session["history"].add_turn(req.prompt, no_data_reply)
 
         return {
             "intent": intent,
-            "final_prompt": SAFE_NO_DATA_REPLY,
+            "final_prompt": no_data_reply,
             "scorer": scorer,
             "session": session
         }
@@ -479,14 +610,14 @@ def process_message(req: PromptRequest):
     if (
         "email" in contact
         and session["stock_confirmed"]
-        and session["order"]
+        and session["cart"]
         and session["stage"] not in ["converted", "completed"]
     ):
 
         session["email"] = contact["email"]
         scorer.email_captured = True
 
-        session["stage"] = "converted"
+        set_stage(session, "converted")
         intent = "LEAD_SUBMISSION"
 
         print("✅ CONVERTED:", session["email"])
@@ -497,7 +628,7 @@ def process_message(req: PromptRequest):
     if session["stage"] not in ["converted", "completed"]:
 
         if intent == "PRODUCT_INFO":
-            session["stage"] = "interest"
+            set_stage(session, "interest")
 
         # elif intent == "BUYING":
         #     session["stage"] = "checkout"
@@ -515,7 +646,8 @@ def process_message(req: PromptRequest):
     elif session["stage"] == "checkout" and not session["email"]:
 
         lead_hook = (
-            "Ask ONLY for user's email for order confirmation."
+            "Ask ONLY for user's email for order confirmation, "
+            "unless they want to add another product to the cart."
         )
 
     elif intent == "LEAD_SUBMISSION":
@@ -525,30 +657,32 @@ def process_message(req: PromptRequest):
     # ------------------------------------------------
     # 11. Build History
     # ------------------------------------------------
-    history_text = ""
+    memory = session["history"]
 
-    for turn in session["history"][-5:]:
-        if turn["bot"]:
-            history_text += (
-                f"User: {turn['user']}\n"
-                f"Assistant: {turn['bot']}\n"
-            )
-
-    final_prompt = build_prompt(
+    # Stable system prefix first, per-turn facts and message last
+    messages, prompt_report = assemble_messages(
         user_message=req.prompt,
         context=context,
         intent=intent,
         lead_hook=lead_hook,
-        history=history_text,
+        history=memory.turns(),
+        summary=memory.summary,
+    )
+    final_prompt = flatten_messages(messages)
+
+    print(
+        f"📏 Prompt [{intent}] {prompt_report['tokens']}/{prompt_report['budget']} tokens "
+        f"(prefix {prompt_report['prefix_tokens']}, "
+        f"rules {prompt_report['rules_tokens']}, facts {prompt_report['facts_tokens']}, "
+        f"history {prompt_report['history_tokens']}) | "
+        f"facts {prompt_report['facts_kept']}/{prompt_report['facts_total']}, "
+        f"turns {prompt_report['history_kept']}/{prompt_report['history_total']}"
     )
 
     # ------------------------------------------------
     # 12. Save Turn
     # ------------------------------------------------
-    session["history"].append({
-        "user": req.prompt,
-        "bot": None
-    })
+    memory.add_turn(req.prompt)
 
     # ------------------------------------------------
     # 13. Debug
@@ -560,12 +694,15 @@ def process_message(req: PromptRequest):
         "product": session["selected_product"]["name"]
         if session["selected_product"] else None,
         "stock": session["stock_confirmed"],
-        "order": bool(session["order"])
+        "cart": len(session["cart"])
     })
 
     return {
         "intent": intent,
         "final_prompt": final_prompt,
+        "messages": messages,
+        "session_id": session_id,
+        "prompt_report": prompt_report,
         "scorer": scorer,
         "session": session,
         "products": products
@@ -600,42 +737,55 @@ def chat_stream(req: PromptRequest, background_tasks: BackgroundTasks):
     print(f"Current Stage: {session.get('stage')}")
     # ----------------------------------------------
 
-    full_reply = ""
-    for token in llama.stream(prompt=final_prompt, system_prompt=STRICT_SYSTEM_PROMPT):
-        full_reply += token
-        user_queue.put(token)
+    # Stops early (and closes the LLM stream) if the tab is closed or a
+    # newer message replaces this one
+    full_reply, stopped = stream_sessions.pump(
+        stream_sessions.begin(session_id),
+        stream_reply(result),
+        user_queue,
+        max_tokens=profile_for(result["intent"])["max_tokens"]
+    )
 
-    # Save the full bot response to history
-    # ✅ Safe update: check if list is not empty
-    if session.get("history"):
-        session["history"][-1]["bot"] = full_reply
-    else:
-        # Fallback if history was somehow skipped
-        session["history"].append({"user": req.prompt, "bot": full_reply})
+    if stopped:
+        print(f"✂️ Reply for {session_id} cancelled ({stopped}) after {len(full_reply)} chars")
+        if stopped == "disconnected":
+            # Don't replay a half reply when the tab reconnects later
+            while not user_queue.empty():
+                try:
+                    user_queue.get_nowait()
+                except Empty:
+                    break
+        if full_reply:
+            full_reply += " …"
+
+    # Save the bot response to history (partial if it was cancelled)
+    # ✅ Safe update: adds the turn if it was somehow skipped
+    session["history"].set_reply(full_reply, user=req.prompt)
+    if session["history"].needs_summary():
+        # Summarise turns that left the window once streaming is done
+        background_tasks.add_task(session["history"].fold)
 
     # --- EMAIL & STOCK LOGIC ---
     if session.get("stage") == "converted" and session.get("email"):
-        order = stock_reservations.get(session_id)
+        cart = stock_reservations.get(session_id)
         
-        if order:
+        if cart:
             print(f"📧 Triggering email for {session['email']}...")
             
-            # 1. Update OpenSearch Stock
+            # 1. Update OpenSearch Stock (all lines, one bulk request)
             try:
-                StockService.reserve_and_commit(
-                    sku=order["sku"],
-                    qty=order["qty"]
-                )
+                commit = StockService.commit_cart(cart)
+            except Exception as e:
+                commit = {"committed": False, "lines": [], "error": str(e)}
 
-                print(f"✅ Stock committed for in Stream {order['sku']}")
-                
-                print(f"✅ Stock successfully updated for {order['sku']}")
+            if not commit["committed"]:
+                print("❌ Stock commit failed:", commit)
 
-            except Exception as e:
-                print("❌ Stock commit failed:", e)
+                set_stage(session, "failed")
+                user_queue.put("__END__")
+                return {"status": "failed", "lines": commit["lines"]}
 
-                session["stage"] = "failed"
-                return
+            print(f"✅ Stock successfully updated for {[l['sku'] for l in commit['lines']]}")
 
 
             # 2. Add Email Tasks
@@ -643,7 +793,7 @@ def chat_stream(req: PromptRequest, background_tasks: BackgroundTasks):
                 send_email,
                 session["email"],
                 "Your Frono Order Confirmation",
-                customer_confirmation_email(order["name"], order["qty"], order["price"])
+                customer_confirmation_email(cart)
             )
             
             background_tasks.add_task(
@@ -655,12 +805,64 @@ def chat_stream(req: PromptRequest, background_tasks: BackgroundTasks):
 
             # 3. Finalize Session
             stock_reservations.pop(session_id, None)
-            session["stage"] = "completed"
+            session["cart"] = []
+            set_stage(session, "completed")
         else:
-            print("❌ Stage was 'converted' but no order was found in stock_reservations.")
+            print("❌ Stage was 'converted' but no cart was found in stock_reservations.")
+
+    if stopped != "disconnected":
+        user_queue.put("__END__")
+    return {"status": "cancelled" if stopped else "started"}
+# ---------------------------------------------------
+# LIVE STOCK UPDATES
+# ---------------------------------------------------
+def push_stock_update(event: dict):
+    """
+    Refreshes the stock held by every session showing the changed SKU
+    and pushes a `stock` SSE event to its queue.
+    """
+    sku = event["sku"]
+    qty = event["qty"]
+
+    for session_id, session in list(user_sessions.items()):
+        referenced = False
+
+        selected = session.get("selected_product")
+        if selected and selected.get("sku") == sku:
+            selected["qty"] = qty
+            referenced = True
+
+        for line in session.get("cart", []):
+            if line["sku"] == sku:
+                line["available"] = qty
+                referenced = True
+
+        # Menus hold product names (see retrieve_context)
+        if event.get("name") and event["name"] in session.get("menu", {}).values():
+            referenced = True
+
+        if referenced and session_id in user_queues:
+            user_queues[session_id].put({
+                "type": "stock",
+                "payload": {
+                    "sku": sku,
+                    "name": event.get("name"),
+                    "qty": qty,
+                    "in_stock": bool(qty and qty > 0),
+                }
+            })
+
+
+def on_catalog_rebuilt(alias: str | None):
+    """A sync swapped an index alias (or events were missed): nothing cached still holds."""
+    invalidate_caches()
+    generation_cache.clear()
+    print(f"♻️ Catalog caches cleared ({alias or 'missed sync events'})")
+
+
+stock_events.subscribe(invalidate_caches)
+stock_events.subscribe(push_stock_update)
 
-    user_queue.put("__END__")
-    return {"status": "started"}
 # ---------------------------------------------------
 # SSE ENDPOINT (READS FROM SPECIFIC QUEUE)
 # ---------------------------------------------------
@@ -671,33 +873,37 @@ def chat_stream_events(session_id: str, request: Request):
     if session_id not in user_queues:
         user_queues[session_id] = Queue()
 
-    def event_generator():
+    async def event_generator():
         q = user_queues[session_id]
-        
-        while True:
-            # Check for client disconnect (FastAPI handles this largely automatically in generator context)
-            if await_client_disconnect(request):
-                # Optional: Cleanup queue if client leaves
-                # del user_queues[session_id] 
-                break
-
-            if not q.empty():
-                token = q.get()
-                
-                if isinstance(token, dict) and token.get("type") == "products":
-                    import json
-                    yield f"event: products\ndata: {json.dumps(token["payload"])}\n\n"
+        # While no reader is attached, chat_stream stops generating
+        stream_sessions.connect(session_id)
+
+        try:
+            while True:
+                if await request.is_disconnected():
+                    break
+
+                try:
+                    token = q.get_nowait()
+                except Empty:
+                    # Wait briefly without holding a worker thread
+                    await asyncio.sleep(0.05)
+                    continue
+
+                # Typed events: products, stock
+                if isinstance(token, dict) and token.get("type"):
+                    yield f"event: {token['type']}\ndata: {json.dumps(token['payload'])}\n\n"
                     continue
 
                 if token == "__END__":
                     yield "event: end\ndata: END\n\n"
                     # We keep the queue alive for the session duration
-                    continue 
-                
+                    continue
+
                 yield f"data: {token}\n\n"
-            else:
-                # Sleep briefly to prevent CPU spike while waiting for tokens
-                time.sleep(0.05) 
+        finally:
+            # Runs on disconnect, or when Starlette cancels the response
+            stream_sessions.disconnect(session_id)
 
     return StreamingResponse( # type: ignore
         event_generator(),
@@ -708,10 +914,6 @@ def chat_stream_events(session_id: str, request: Request):
         }
     )
 
-def await_client_disconnect(request: Request):
-    # Helper to check connection status if needed
-    return False 
-
 # ---------------------------------------------------
 # LEAD CAPTURE + EMAIL AUTOMATION
 # ---------------------------------------------------
@@ -722,7 +924,16 @@ def capture_lead(
     lead: LeadCreate,
     background_tasks: BackgroundTasks
 ):
-    result = create_lead(lead.dict())
+    result = None
+
+    if lead_buffer:
+        try:
+            result = lead_buffer.submit(lead.dict())
+        except LeadBufferFull as e:
+            print(f"⚠️ Lead buffer full, writing synchronously: {e}")
+
+    if result is None:
+        result = create_lead(lead.dict())
 
     # Optional: email automation
     if lead.consent:
@@ -744,4 +955,115 @@ def capture_lead(
         #     )
         # )
 
-    return result
\ No newline at end of file
+    return result
+
+
+# ---------------------------------------------------
+# BULK LEAD IMPORT (Shopify forms, trade show lists)
+# ---------------------------------------------------
+MAX_BULK_LEADS = 50000
+
+
+def parse_lead_rows(raw: bytes) -> list:
+    """
+    Accepts a JSON array or NDJSON. A bad NDJSON line becomes an
+    exception placeholder so it is reported against its own row.
+    """
+    text = raw.decode("utf-8").strip()
+
+    if text.startswith("["):
+        return json.loads(text)
+
+    rows = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            rows.append(e)
+    return rows
+
+
+def _validation_message(e: Exception) -> str:
+    if isinstance(e, ValidationError):
+        return "; ".join(err["msg"] for err in e.errors())
+    return str(e)
+
+
+@app.post("/leads/bulk", response_model=BulkLeadResponse)
+async def capture_leads_bulk(request: Request):
+    """
+    Bulk lead import. No emails are sent for imported leads.
+    """
+    start = time.time()
+
+    try:
+        rows = parse_lead_rows(await request.body())
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid payload: {e}")
+
+    if len(rows) > MAX_BULK_LEADS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_LEADS} leads per request")
+
+    results = []
+    batch = {}      # lead_id -> merged lead data
+    row_ids = {}    # row -> lead_id
+
+    # ------------------------------------------------
+    # 1. Validate + dedupe within the batch
+    # ------------------------------------------------
+    for i, row in enumerate(rows):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            lead = LeadCreate(**row).dict()
+        except (ValidationError, ValueError, TypeError) as e:
+            results.append({"row": i, "status": "invalid", "error": _validation_message(e)})
+            continue
+
+        lead_id = lead_id_for(lead)
+        row_ids[i] = lead_id
+
+        if lead_id in batch:
+            prev = batch[lead_id]
+            batch[lead_id] = {
+                **prev,
+                **{k: v for k, v in lead.items() if v is not None},
+                "lead_score": max(prev["lead_score"], lead["lead_score"]),
+            }
+            results.append({"row": i, "status": "merged", "id": lead_id})
+        else:
+            batch[lead_id] = lead
+            results.append({"row": i, "status": None, "id": lead_id})
+
+    # ------------------------------------------------
+    # 2. One streaming bulk write
+    # ------------------------------------------------
+    written = await run_in_threadpool(bulk_upsert_leads, list(batch.values())) if batch else {}
+
+    failed = 0
+    for r in results:
+        if r["status"] not in (None, "merged"):
+            continue
+
+        outcome = written.get(r["id"], {"status": "error", "error": "No bulk response"})
+
+        if outcome["status"] == "error":
+            failed += r["status"] is None
+            r["status"] = "error"
+            r["error"] = str(outcome.get("error"))
+        elif r["status"] is None:
+            r["status"] = outcome["status"]
+
+    invalid = sum(1 for r in results if r["status"] == "invalid")
+
+    return {
+        "total": len(rows),
+        "written": len(batch) - failed,
+        "invalid": invalid,
+        "failed": failed,
+        "took_ms": int((time.time() - start) * 1000),
+        "results": results,
+    }
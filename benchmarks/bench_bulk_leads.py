@@ -0,0 +1,65 @@
+"""
+Throughput benchmark for bulk lead ingestion against the local node.
+
+Generates synthetic leads (with some in-batch duplicates), writes them with
+bulk_upsert_leads and reports leads/s, then deletes them again.
+
+    python -m benchmarks.bench_bulk_leads --leads 20000
+"""
+import argparse
+import random
+import time
+
+from search.opensearch_client import client
+from search.leads_repo import INDEX, bulk_upsert_leads, lead_id_for
+
+SOURCE = "bench_bulk_leads"
+
+
+def make_leads(n: int, duplicate_ratio: float):
+    leads = {}
+    for i in range(n):
+        # Reuse an earlier contact now and then, like a real import would
+        j = random.randrange(i) if i and random.random() < duplicate_ratio else i
+        lead = {
+            "name": f"Bench Lead {j}",
+            "email": f"bench.lead.{j}@example.com",
+            "intent": random.choice(["BUYING", "PRODUCT_INFO", "BROWSING"]),
+            "lead_score": random.randint(0, 100),
+            "source": SOURCE,
+            "consent": True,
+        }
+        lead_id = lead_id_for(lead)
+        if lead_id in leads:
+            lead["lead_score"] = max(lead["lead_score"], leads[lead_id]["lead_score"])
+        leads[lead_id] = lead
+    return list(leads.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--duplicates", type=float, default=0.05)
+    args = parser.parse_args()
+
+    leads = make_leads(args.leads, args.duplicates)
+
+    for run in ("create", "update"):
+        start = time.time()
+        results = bulk_upsert_leads(leads, chunk_size=args.chunk_size)
+        elapsed = time.time() - start
+
+        errors = sum(1 for r in results.values() if r["status"] == "error")
+        print(f"⏱️ {run}: {len(leads)} leads in {elapsed:.2f}s "
+              f"({len(leads) / elapsed:,.0f} leads/s, {errors} errors)")
+
+    client.delete_by_query(
+        index=INDEX,
+        body={"query": {"term": {"source": SOURCE}}},
+        refresh=True
+    )
+
+
+if __name__ == "__main__":
+    main()
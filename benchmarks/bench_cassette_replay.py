@@ -0,0 +1,80 @@
+"""
+Record/replay fidelity for llm/cassette.py.
+
+Records chat replies streamed from a fake Ollama (prefill + per-token
+delays) through the router, stops the server, then replays the cassette
+at 1x, 0.5x and 0x speed. Replayed TTFT and stream time should track the
+recording at 1x, scale at 0.5x and vanish at 0x, with the same text.
+
+    python -m benchmarks.bench_cassette_replay --calls 40
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_llama_client import FakeServer
+from llm.cassette import Cassette, CassetteProvider
+from llm.llama_client import LLaMAClient
+from llm.router import LLMRouter
+from llm.scheduler import LLMScheduler
+
+SYSTEM = "You are a helpful shop assistant. " * 20
+
+
+def run(router: LLMRouter, calls: int) -> dict:
+    ttft, total, replies = [], [], []
+    for i in range(calls):
+        messages = [{"role": "system", "content": SYSTEM},
+                    {"role": "user", "content": f"Question {i % 10}: " + "details " * (20 * (i % 5))}]
+        start = time.perf_counter()
+        first = None
+        text = ""
+        for token in router.stream(messages=messages, fallback=None):
+            first = first or time.perf_counter() - start
+            text += token
+        ttft.append(first * 1000)
+        total.append((time.perf_counter() - start) * 1000)
+        replies.append(text)
+    return {"ttft": ttft, "total": total, "replies": replies}
+
+
+def router_for(provider) -> LLMRouter:
+    return LLMRouter([provider], scheduler=LLMScheduler(max_concurrency=1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=40)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.jsonl.gz")
+    server = FakeServer(tokens=40, token_delay=0.005, connect_delay=0, prefill_per_token=0.0005, slots=1)
+    try:
+        client = LLaMAClient(host=server.url)
+        recorded = run(router_for(CassetteProvider(client, Cassette(path), "record")), args.calls)
+    finally:
+        server.proc.terminate()
+
+    size = os.path.getsize(path)
+    print(f"📼 {args.calls} calls recorded to {size} bytes ({size / args.calls:.0f} B/call), server stopped")
+    print(f"   recorded   TTFT p50 {statistics.median(recorded['ttft']):6.1f}ms | "
+          f"stream p50 {statistics.median(recorded['total']):6.1f}ms")
+
+    for speed in (1.0, 0.5, 0.0):
+        cassette = Cassette(path)
+        replayed = run(router_for(CassetteProvider(client, cassette, "replay", speed)), args.calls)
+        same = sum(a == b for a, b in zip(recorded["replies"], replayed["replies"]))
+        print(f"   replay {speed:3.1f}x TTFT p50 {statistics.median(replayed['ttft']):6.1f}ms | "
+              f"stream p50 {statistics.median(replayed['total']):6.1f}ms | "
+              f"identical text {same}/{args.calls} | {cassette.stats}")
+
+    # An unrecorded request behaves like a provider that is down
+    missing = router_for(CassetteProvider(client, Cassette(path), "replay", 0))
+    reply = "".join(missing.stream("never recorded"))
+    print(f"❓ unrecorded request -> fallback reply: {reply!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Promotion-burst benchmark for the generation cache.
+
+Many sessions send the same first message at once, so their final
+prompts are identical. Compares provider calls and time to first token
+with the cache off and on (single-flight while in flight, then TTL hits).
+First checks that a reply cut off mid-stream is not cached, with and
+without hedging.
+
+    python -m benchmarks.bench_generation_cache --sessions 200 --distinct 5
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_llm_router import FakeProvider
+from llm.errors import LLMUnavailable
+from llm.generation_cache import GenerationCache, cache_key
+from llm.router import LLMRouter
+from llm.scheduler import LLMScheduler
+
+
+class CountingProvider(FakeProvider):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        with self._lock:
+            self.calls += 1
+        yield from super().stream(prompt, system_prompt, profile)
+
+
+class BreaksMidStream(CountingProvider):
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        with self._lock:
+            self.calls += 1
+        yield "Hello "
+        yield "wor"
+        raise LLMUnavailable("connection reset", self.name, 503)
+
+
+def check_interrupted(hedge_after_ms: int) -> bool:
+    """A truncated reply reaches its reader but is not served to the next one."""
+    provider = BreaksMidStream("groq", ttft=0)
+    backup = CountingProvider("ollama", ttft=0.5)
+    router = LLMRouter([provider, backup], hedge_after_ms, scheduler=LLMScheduler(max_concurrency=1000))
+    cache = GenerationCache()
+    key = cache_key("system", "hi", router.model_key, "stream")
+    replies = []
+    for _ in range(2):
+        router.health[provider.name].record_success()        # out of cool-down
+        replies.append("".join(cache.stream(key, "hi", lambda: router.stream("hi", "system", fallback=None))))
+    ok = replies == ["Hello wor", "Hello wor"] and provider.calls == 2 and cache.report()["entries"] == 0
+    print(f"{'✅' if ok else '❌'} mid-stream failure (hedge {hedge_after_ms}ms): replies {replies}, "
+          f"provider calls {provider.calls}, cached entries {cache.report()['entries']}")
+    return ok
+
+
+def run(sessions: int, distinct: int, use_cache: bool, concurrency: int) -> dict:
+    provider = CountingProvider("groq", ttft=0.3, tokens=60, token_delay=0.005)
+    # Own scheduler: the shared one applies the real Groq rate limits
+    router = LLMRouter([provider], scheduler=LLMScheduler(max_concurrency=1000))
+    cache = GenerationCache()
+    prompts = [f"User message:\ndo you have oil filled radiators? (variant {i})" for i in range(distinct)]
+
+    def one(i):
+        prompt = random.choice(prompts)
+        start = time.perf_counter()
+        if use_cache:
+            key = cache_key("system", prompt, router.model_key, "stream")
+            tokens = cache.stream(key, prompt, lambda: router.stream(prompt, "system", fallback=None))
+        else:
+            tokens = router.stream(prompt, "system")
+        ttft = None
+        for _ in tokens:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft * 1000
+
+    # Sessions arrive over ~1s, like a promo email landing
+    def staggered(i):
+        time.sleep(random.random())
+        return one(i)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        ttfts = sorted(pool.map(staggered, range(sessions)))
+
+    return {
+        "calls": provider.calls,
+        "p50": statistics.median(ttfts),
+        "p99": ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.99))],
+        "stats": cache.report() if use_cache else {},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    check_interrupted(0)
+    check_interrupted(100)
+
+    print(f"🧊 {args.sessions} sessions, {args.distinct} distinct prompts")
+    for use_cache in (False, True):
+        m = run(args.sessions, args.distinct, use_cache, args.concurrency)
+        label = "cache on" if use_cache else "cache off"
+        print(f"⏱️ {label:<10} provider calls {m['calls']:4} | "
+              f"TTFT p50 {m['p50']:7.1f}ms p99 {m['p99']:7.1f}ms {m['stats']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Per-intent generation profiles vs one model for everything.
+
+A fake Groq serves the large and small models at their typical speeds
+(TTFT and tokens/s) and writes replies of a natural length per intent,
+cut at the profile's max tokens. The same chat mix is run once with every
+reply on the large model at 1024 max tokens, once with profile_for(intent).
+
+    python -m benchmarks.bench_generation_profiles --requests 200
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import GROQ_MODEL, GROQ_SMALL_MODEL
+from llm.profiles import profile_for, profile_stats, _cost
+from llm.router import LLMRouter
+from llm.scheduler import LLMScheduler
+
+# (TTFT seconds, seconds per output token)
+SPEEDS = {
+    GROQ_MODEL: (0.30, 1 / 275),
+    GROQ_SMALL_MODEL: (0.12, 1 / 750),
+}
+
+# intent -> (share of traffic, natural reply length in tokens)
+MIX = {
+    "PRODUCT_INFO": (0.35, 180),
+    "BROWSING": (0.20, 110),
+    "CLOSING": (0.15, 35),
+    "ABOUT_BRAND": (0.10, 120),
+    "BUYING": (0.10, 140),
+    "SUPPORT": (0.05, 200),
+    "LEAD_SUBMISSION": (0.05, 70),
+}
+PROMPT_TOKENS = 900
+LEGACY = {"name": "legacy", "model": "large", "max_tokens": 1024, "temperature": 0.7, "stop": []}
+
+
+class FakeGroq:
+    def __init__(self):
+        self.name = "groq"
+        self.model = GROQ_MODEL
+        self.models = {"large": GROQ_MODEL, "small": GROQ_SMALL_MODEL}
+        self.max_tokens = 1024
+
+    def model_for(self, profile: dict | None) -> str:
+        return self.models.get(profile["model"], self.model) if profile else self.model
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        return "".join(self.stream(prompt, system_prompt, profile))
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        ttft, per_token = SPEEDS[self.model_for(profile)]
+        natural = MIX[prompt.split("|", 1)[0]][1]
+        n = min(natural, profile["max_tokens"] if profile else self.max_tokens)
+        time.sleep(ttft)
+        # 8 tokens per chunk keeps sleep overhead out of the numbers
+        for i in range(0, n, 8):
+            time.sleep(per_token * min(8, n - i))
+            yield "tok " * min(8, n - i)
+
+
+def run(requests: int, concurrency: int, use_profiles: bool) -> dict:
+    router = LLMRouter([FakeGroq()], scheduler=LLMScheduler(max_concurrency=1000))
+    intents = random.Random(3).choices(list(MIX), weights=[w for w, _ in MIX.values()], k=requests)
+    padding = "x" * (PROMPT_TOKENS * 4)
+
+    def one(intent):
+        profile = profile_for(intent) if use_profiles else LEGACY
+        start = time.perf_counter()
+        chars = sum(len(t) for t in router.stream(f"{intent}|{padding}", profile=profile))
+        model = router.providers[0].model_for(profile)
+        return intent, time.perf_counter() - start, _cost(model, PROMPT_TOKENS, chars // 4)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, intents))
+
+    by_intent = {}
+    for intent, elapsed, cost in results:
+        s = by_intent.setdefault(intent, {"ms": [], "usd": 0.0})
+        s["ms"].append(elapsed * 1000)
+        s["usd"] += cost
+    return by_intent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    before = run(args.requests, args.concurrency, use_profiles=False)
+    after = run(args.requests, args.concurrency, use_profiles=True)
+
+    print(f"🎛️ {args.requests} replies, one model vs per-intent profiles")
+    total_before = total_after = 0.0
+    for intent in MIX:
+        if intent not in before:
+            continue
+        b, a = before[intent], after[intent]
+        total_before += b["usd"]
+        total_after += a["usd"]
+        p = profile_for(intent)
+        print(f"   {intent:<16} {p['model']:<5} n={len(a['ms']):3} | "
+              f"p50 {statistics.median(b['ms']):6.0f} -> {statistics.median(a['ms']):6.0f}ms | "
+              f"${b['usd']:.5f} -> ${a['usd']:.5f}")
+    print(f"💷 total ${total_before:.5f} -> ${total_after:.5f} "
+          f"({1 - total_after / total_before:.0%} less)")
+
+    report = profile_stats.report()["profiles"]
+    saved = {k: (v["saved_ms_per_call"], v["saved_usd"]) for k, v in report.items() if v["saved_usd"]}
+    print(f"📊 profile_stats saved (ms/call, usd): {saved}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+LLaMAClient benchmark against a local fake Ollama server.
+
+Compares the old per-call `requests.post` + `json.loads` client with the
+pooled LLaMAClient (sync stream, async stream, /api/chat). Reports time to
+first token, total time per stream and how many TCP connections the
+server saw.
+
+    python -m benchmarks.bench_llama_client --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from llm.llama_client import LLaMAClient, close_clients, aclose_clients
+
+
+def legacy_stream(url: str, prompt: str):
+    """The pre-pool client: new connection per call, json.loads per line."""
+    payload = {"model": "bench", "prompt": prompt, "system": "", "stream": True}
+    with requests.post(f"{url}/api/generate", json=payload, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            data = json.loads(line)
+            if "response" in data:
+                yield data["response"]
+            if data.get("done") is True:
+                break
+
+
+def timed(stream) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    for _ in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        tokens += 1
+    return ttft or 0.0, time.perf_counter() - start, tokens
+
+
+async def atimed(stream) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    ttft = None
+    tokens = 0
+    async for _ in stream:
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        tokens += 1
+    return ttft or 0.0, time.perf_counter() - start, tokens
+
+
+class FakeServer:
+    """Runs benchmarks.fake_ollama in its own process so it doesn't share our GIL."""
+
+    def __init__(self, tokens: int, token_delay: float, connect_delay: float,
+                 prefill_per_token: float = 0.0, slots: int = 4):
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(self.port),
+             "--tokens", str(tokens), "--token-delay", str(token_delay),
+             "--connect-delay", str(connect_delay),
+             "--prefill-per-token", str(prefill_per_token), "--slots", str(slots)],
+            stdout=subprocess.DEVNULL
+        )
+        for _ in range(100):
+            try:
+                self.stats()
+                return
+            except requests.ConnectionError:
+                time.sleep(0.05)
+        raise RuntimeError("fake Ollama did not start")
+
+    def stats(self) -> dict:
+        return requests.get(f"{self.url}/stats", timeout=5).json()
+
+    @property
+    def connections(self) -> int:
+        # Each /stats call opens one connection of its own; leave those out
+        self._stats_calls = getattr(self, "_stats_calls", 1) + 1
+        return self.stats()["connections"] - self._stats_calls
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+
+def report(name: str, results: list, elapsed: float, fake: FakeServer, connections_before: int):
+    ttfts = sorted(r[0] * 1000 for r in results)
+    totals = sorted(r[1] * 1000 for r in results)
+    p99 = ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.99))]
+    print(f"⏱️ {name:<14} {len(results) / elapsed:7.1f} streams/s | "
+          f"TTFT p50 {statistics.median(ttfts):6.2f}ms p99 {p99:6.2f}ms | "
+          f"total p50 {statistics.median(totals):6.2f}ms | "
+          f"{fake.connections - connections_before} connections")
+
+
+def run_threads(fn, n: int, concurrency: int) -> tuple[list, float]:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda i: fn(i), range(n)))
+    return results, time.perf_counter() - start
+
+
+async def run_async(client: LLaMAClient, n: int, concurrency: int) -> tuple[list, float]:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            return await atimed(client.astream(prompt=f"hello {i}", system_prompt="bench"))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(n)))
+    await aclose_clients()
+    return list(results), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--connect-delay", type=float, default=0.002,
+                        help="server-side cost of a new connection (TCP/TLS setup)")
+    args = parser.parse_args()
+
+    fake = FakeServer(args.tokens, args.token_delay, args.connect_delay)
+    client = LLaMAClient(model="bench", host=fake.url)
+    n, c = args.requests, args.concurrency
+
+    print(f"🦙 {n} streams x {args.tokens} tokens, concurrency {c}, against {fake.url}")
+
+    before = fake.connections
+    results, elapsed = run_threads(lambda i: timed(legacy_stream(fake.url, f"hello {i}")), n, c)
+    report("legacy", results, elapsed, fake, before)
+
+    before = fake.connections
+    results, elapsed = run_threads(lambda i: timed(client.stream(prompt=f"hello {i}", system_prompt="bench")), n, c)
+    report("pooled sync", results, elapsed, fake, before)
+
+    before = fake.connections
+    messages = [{"role": "user", "content": "hello"}]
+    results, elapsed = run_threads(lambda i: timed(client.stream(messages=messages, system_prompt="bench")), n, c)
+    report("pooled chat", results, elapsed, fake, before)
+
+    before = fake.connections
+    results, elapsed = asyncio.run(run_async(client, n, c))
+    report("pooled async", results, elapsed, fake, before)
+
+    close_clients()
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main()
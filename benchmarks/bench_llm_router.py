@@ -0,0 +1,137 @@
+"""
+Time-to-first-token benchmark for LLMRouter with and without hedging.
+
+Two in-process fake providers: a fast primary that stalls now and then
+(like a rate-limited or overloaded Groq) and a slower but steady
+secondary. Also checks failover when the primary errors outright, and
+first that a stalled loser's slot is freed as soon as the hedge wins.
+
+    python -m benchmarks.bench_llm_router --requests 300 --hedge-ms 150
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm.cancel import on_cancel
+from llm.errors import LLMUnavailable
+from llm.router import LLMRouter, FALLBACK_REPLY
+from llm.scheduler import LLMScheduler
+
+
+class FakeProvider:
+    def __init__(self, name: str, ttft: float, stall_rate: float = 0.0, stall: float = 0.0,
+                 error_rate: float = 0.0, tokens: int = 20, token_delay: float = 0.002):
+        self.name = name
+        self.ttft = ttft
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.error_rate = error_rate
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        return "".join(self.stream(prompt, system_prompt))
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        if random.random() < self.error_rate:
+            time.sleep(self.ttft)
+            raise LLMUnavailable(f"{self.name} is down", self.name, 503)
+        # Waits like a blocked socket read: closing the response ends it
+        closed = threading.Event()
+        with on_cancel(closed.set):
+            if closed.wait(self.stall if random.random() < self.stall_rate else self.ttft):
+                raise LLMUnavailable(f"{self.name} stream closed", self.name)
+        for i in range(self.tokens):
+            yield f"{self.name}{i} "
+            time.sleep(self.token_delay)
+
+
+def measure(router: LLMRouter, n: int, concurrency: int) -> dict:
+    def one(_):
+        start = time.perf_counter()
+        ttft = None
+        text = []
+        for token in router.stream("hello"):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            text.append(token)
+        return ttft * 1000, "".join(text)
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(n)))
+
+    ttfts = sorted(r[0] for r in results)
+    return {
+        "p50": statistics.median(ttfts),
+        "p99": ttfts[min(len(ttfts) - 1, int(len(ttfts) * 0.99))],
+        "fallbacks": sum(1 for r in results if r[1] == FALLBACK_REPLY),
+    }
+
+
+def check_loser_cancelled(hedge_ms: int) -> bool:
+    """A stalled primary that lost the hedge gives its slot back when the winner takes over."""
+    scheduler = LLMScheduler(max_concurrency=100)
+    router = LLMRouter([
+        FakeProvider("primary", ttft=0.05, stall_rate=1.0, stall=5.0),
+        FakeProvider("secondary", ttft=0.05),
+    ], hedge_after_ms=hedge_ms, scheduler=scheduler)
+    stream = router.stream("hello")
+    next(stream)                                # the secondary's first token
+    start = time.perf_counter()
+    while scheduler.report()["active"] > 1 and time.perf_counter() - start < 5:
+        time.sleep(0.001)
+    held_ms = (time.perf_counter() - start) * 1000
+    stream.close()
+    ok = held_ms < 100
+    print(f"{'✅' if ok else '❌'} stalled loser released its slot {held_ms:.1f}ms after the hedge won")
+    return ok
+
+
+def report(name: str, router: LLMRouter, m: dict):
+    print(f"⏱️ {name:<22} TTFT p50 {m['p50']:7.1f}ms p99 {m['p99']:7.1f}ms | "
+          f"hedges {router.stats['hedges']:3} wins {router.stats['hedge_wins']:3} "
+          f"failovers {router.stats['failovers']:3} fallbacks {m['fallbacks']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--hedge-ms", type=int, default=150)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    def providers(error_rate=0.0):
+        return [
+            FakeProvider("primary", ttft=0.05, stall_rate=args.stall_rate, stall=1.5, error_rate=error_rate),
+            FakeProvider("secondary", ttft=0.12),
+        ]
+
+    check_loser_cancelled(args.hedge_ms)
+
+    print(f"🔀 {args.requests} streams, concurrency {args.concurrency}, "
+          f"primary stalls {args.stall_rate:.0%} of the time")
+
+    router = LLMRouter(providers())
+    report("failover only", router, measure(router, args.requests, args.concurrency))
+
+    router = LLMRouter(providers(), hedge_after_ms=args.hedge_ms)
+    report(f"hedged @{args.hedge_ms}ms", router, measure(router, args.requests, args.concurrency))
+
+    router = LLMRouter(providers(error_rate=0.2))
+    report("primary 20% errors", router, measure(router, args.requests, args.concurrency))
+
+    router = LLMRouter([
+        FakeProvider("primary", ttft=0.01, error_rate=1.0),
+        FakeProvider("secondary", ttft=0.01, error_rate=1.0),
+    ])
+    report("all providers down", router, measure(router, 20, 4))
+
+
+if __name__ == "__main__":
+    main()
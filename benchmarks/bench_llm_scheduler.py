@@ -0,0 +1,148 @@
+"""
+Overload benchmark for the LLM scheduler.
+
+A fake Groq enforces a tokens-per-minute bucket (429 + Retry-After when it
+runs dry) and reports x-ratelimit-* headers; a fake local Ollama is slower
+but unlimited. A mixed burst of checkout, product and browsing turns is
+offered at about twice what Groq allows, once with no scheduling and once
+through LLMScheduler.
+
+    python -m benchmarks.bench_llm_scheduler --requests 40 --seconds 10
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm.errors import LLMRateLimited
+from llm.router import LLMRouter
+from llm.scheduler import LLMScheduler, CRITICAL, NORMAL, LOW, PRIORITY_NAMES
+
+
+class FakeGroq:
+    """Server-side token bucket: `capacity` tokens refilling at `rate`/s."""
+
+    def __init__(self, scheduler: LLMScheduler, capacity: float, rate: float):
+        self.name = "groq"
+        self.model = "fake-70b"
+        self.max_tokens = 300
+        self.scheduler = scheduler
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = time.time()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _headers(self) -> dict:
+        return {
+            "x-ratelimit-limit-tokens": str(self.capacity),
+            "x-ratelimit-remaining-tokens": str(int(self.level)),
+            "x-ratelimit-reset-tokens": f"{(self.capacity - self.level) / self.rate:.2f}s",
+        }
+
+    def _charge(self, tokens: int):
+        with self._lock:
+            now = time.time()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.level < tokens:
+                self.rejected += 1
+                wait = (tokens - self.level) / self.rate
+                headers = {**self._headers(), "retry-after": f"{wait:.2f}"}
+                self.scheduler.observe_headers(self.name, headers)
+                raise LLMRateLimited("fake groq: TPM exceeded", self.name, 429, wait)
+            self.level -= tokens
+            self.scheduler.observe_headers(self.name, self._headers())
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        return "".join(self.stream(prompt, system_prompt))
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        time.sleep(0.02)
+        self._charge((len(prompt) + len(system_prompt)) // 4 + self.max_tokens)
+        time.sleep(0.08)
+        for i in range(30):
+            yield f"groq{i} "
+            time.sleep(0.003)
+
+
+class FakeOllama:
+    def __init__(self):
+        self.name = "ollama"
+        self.model = "fake-8b"
+        self.max_tokens = 300
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        return "".join(self.stream(prompt, system_prompt))
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        time.sleep(0.6)
+        for i in range(30):
+            yield f"ollama{i} "
+            time.sleep(0.01)
+
+
+def run(requests: int, seconds: float, scheduled: bool) -> dict:
+    if scheduled:
+        scheduler = LLMScheduler(max_concurrency=16)
+        scheduler.set_limits("groq", tpm=6000)
+    else:
+        # Effectively no scheduling: no cap, no rate limits
+        scheduler = LLMScheduler(max_concurrency=10_000)
+
+    groq = FakeGroq(scheduler, capacity=6000, rate=600)
+    router = LLMRouter([groq, FakeOllama()], scheduler=scheduler)
+    prompt = "User message:\n" + "x" * 1600
+    mix = [CRITICAL] * 2 + [NORMAL] * 3 + [LOW] * 5
+    random.seed(7)
+    plan = [(random.random() * seconds, random.choice(mix)) for _ in range(requests)]
+
+    def one(item):
+        delay, priority = item
+        time.sleep(delay)
+        start = time.perf_counter()
+        first = None
+        for token in router.stream(prompt, "system", priority=priority):
+            first = first or token
+        return priority, time.perf_counter() - start, first
+
+    with ThreadPoolExecutor(requests) as pool:
+        results = list(pool.map(one, plan))
+
+    by_class = {}
+    for priority, elapsed, first in results:
+        c = by_class.setdefault(PRIORITY_NAMES[priority], {"n": 0, "groq": 0, "fallback": 0, "lat": []})
+        c["n"] += 1
+        c["lat"].append(elapsed * 1000)
+        if first and first.startswith("groq"):
+            c["groq"] += 1
+        elif not first or not first.startswith("ollama"):
+            c["fallback"] += 1
+    return by_class, groq.rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    for scheduled in (False, True):
+        by_class, rejected = run(args.requests, args.seconds, scheduled)
+        print(f"🚦 {'with scheduler' if scheduled else 'no scheduler'}: {rejected} x 429 from groq")
+        for name, c in sorted(by_class.items()):
+            lat = sorted(c["lat"])
+            print(f"   {name:<9} n={c['n']:3} on groq {c['groq'] / c['n']:5.0%} "
+                  f"fallback {c['fallback']:2} | latency p50 {statistics.median(lat):6.0f}ms "
+                  f"p95 {lat[int(len(lat) * 0.95) - 1]:6.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
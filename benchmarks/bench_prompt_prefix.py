@@ -0,0 +1,144 @@
+"""
+Time to first token: old prompt layout vs stable-prefix chat messages.
+
+Runs multi-turn shopping sessions, interleaved like real traffic, against
+the fake Ollama with prompt prefill charged per token the KV slots don't
+already hold (see benchmarks/fake_ollama.py). Three layouts:
+
+  legacy     intro + history + rules + facts + message, as one
+             /api/generate prompt (the layout before assemble_messages)
+  messages   assemble_messages() to /api/chat: invariant system prefix,
+             history, then facts + message last
+  context    the same messages with LLaMAClient.context_reuse, so follow-up
+             turns send only the new message plus the session's context
+
+Context reuse only pays while each session's KV slot survives until its
+next turn; with more live sessions than slots (try --sessions 8) every
+follow-up re-reads the whole, ever longer, context.
+
+    python -m benchmarks.bench_prompt_prefix --sessions 4 --turns 6
+"""
+import argparse
+import random
+import statistics
+import time
+
+from agent.prompt_budget import estimate_tokens, select_facts, select_history
+from agent.rag_prompt import assemble_messages
+from benchmarks.bench_llama_client import FakeServer
+from config import BOT_NAME, STRICT_SYSTEM_PROMPT
+from llm import llama_client
+from llm.llama_client import LLaMAClient
+
+INTENT = "PRODUCT_INFO"
+REPLY_TOKENS = 60
+PRODUCTS = ["oak dining table", "velvet sofa", "walnut bookcase", "linen armchair",
+            "marble side table", "rattan bed frame", "glass desk", "teak bench"]
+QUESTIONS = ["Do you have the {p} in stock?", "What sizes does the {p} come in?",
+             "How much is delivery for the {p}?", "Can I get the {p} in another colour?",
+             "What is the {p} made of?", "Is there a warranty on the {p}?"]
+
+
+def facts_for(product: str) -> str:
+    """Retriever-style context: a dozen facts, most about the product asked for."""
+    lines = [f"- The {product} is available in {c}." for c in ("natural", "black", "white")]
+    lines += [f"- The {product} costs £{random.randint(90, 900)} and ships in {random.randint(2, 9)} days."]
+    lines += [f"- The {product} has a {random.randint(1, 5)} year warranty covering frame and finish."]
+    lines += [f"- {p.capitalize()} stock: {random.randint(0, 40)} units in the Leeds warehouse." for p in PRODUCTS]
+    return "\n".join(lines)
+
+
+def legacy_prompt(user_message: str, context: str, history: list) -> str:
+    """assemble_prompt() before the stable-prefix layout (budgets left out)."""
+    intro = f"You are {BOT_NAME}, the official assistant for Frono.uk.\n\n"
+    history_text, _ = select_history(history, 600)
+    history_block = f"Conversation so far:\n{history_text}\n\n" if history_text else ""
+    rules = (
+        "Rules:\n"
+        "- Answer using the verified facts below."
+        "- Never contradict confirmed stock information.\n"
+        "- Do NOT proceed with payment unless contact is collected.\n"
+        "- When the user is ready to buy, guide them through next steps."
+        "- Do NOT mention software, analytics, ERP, or unrelated services.\n"
+        "- Do NOT add assumptions or opinions.\n\n"
+    )
+    facts, _ = select_facts(context, user_message, 400)
+    return (
+        f"{intro}{history_block}{rules}Verified facts about Frono.uk:\n{facts}\n\n"
+        f"User message:\n{user_message}\n\nAnswer clearly, naturally, and factually."
+    )
+
+
+def run(layout: str, sessions: int, turns: int, prefill: float, slots: int) -> dict:
+    random.seed(7)
+    server = FakeServer(tokens=REPLY_TOKENS, token_delay=0.0, connect_delay=0.0,
+                        prefill_per_token=prefill, slots=slots)
+    client = LLaMAClient(host=server.url)
+    client.context_reuse = layout == "context"
+    llama_client.context_stats.update(reused=0, fresh=0, reset=0)
+    histories = [[] for _ in range(sessions)]
+    ttft = {"first": [], "follow_up": []}
+    prompt_tokens = []
+
+    try:
+        # Round-robin: every session's turn 1, then every turn 2, ...
+        for turn in range(turns):
+            for s in range(sessions):
+                product = PRODUCTS[(s + turn) % len(PRODUCTS)]
+                message = QUESTIONS[turn % len(QUESTIONS)].format(p=product)
+                context = facts_for(product)
+                history = histories[s]
+
+                if layout == "legacy":
+                    prompt = legacy_prompt(message, context, history)
+                    prompt_tokens.append(estimate_tokens(STRICT_SYSTEM_PROMPT + prompt))
+                    stream = client.stream(prompt=prompt, system_prompt=STRICT_SYSTEM_PROMPT)
+                else:
+                    messages, _ = assemble_messages(message, context, INTENT, history=history)
+                    prompt_tokens.append(sum(estimate_tokens(m["content"]) for m in messages))
+                    stream = client.stream(messages=messages, session_id=f"{layout}-{s}")
+
+                reply = []
+                start = time.perf_counter()
+                first = None
+                for token in stream:
+                    first = first or time.perf_counter() - start
+                    reply.append(token)
+                ttft["first" if turn == 0 else "follow_up"].append(first * 1000)
+                history.append({"user": message, "bot": "".join(reply).strip()})
+
+        stats = server.stats()
+    finally:
+        server.proc.terminate()
+
+    return {
+        "ttft": ttft,
+        "prompt_tokens": statistics.mean(prompt_tokens),
+        "prefill_tokens": stats["prefill_tokens"],
+        "context": dict(llama_client.context_stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--prefill-per-token", type=float, default=0.001,
+                        help="seconds per uncached prompt token (0.001 = 1000 tok/s)")
+    parser.add_argument("--slots", type=int, default=4, help="KV cache slots (OLLAMA_NUM_PARALLEL)")
+    args = parser.parse_args()
+
+    print(f"⏱️ {args.sessions} interleaved sessions x {args.turns} turns, "
+          f"prefill {1 / args.prefill_per_token:.0f} tok/s, {args.slots} KV slots")
+    for layout in ("legacy", "messages", "context"):
+        m = run(layout, args.sessions, args.turns, args.prefill_per_token, args.slots)
+        first, follow = m["ttft"]["first"], m["ttft"]["follow_up"]
+        extra = f" | {m['context']}" if layout == "context" else ""
+        print(f"   {layout:<9} TTFT p50 turn 1 {statistics.median(first):6.1f}ms, "
+              f"later turns {statistics.median(follow):6.1f}ms "
+              f"(p95 {statistics.quantiles(follow, n=20)[-1]:6.1f}ms) | "
+              f"prompt ~{m['prompt_tokens']:.0f} tokens, {m['prefill_tokens']} prefilled{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Collections map fetch: the old sequential N+1 walk vs ShopifyClient.
+
+Runs against benchmarks/fake_shopify.py (per-call latency + leaky bucket
+with 429s) and checks every map against the fake's real membership, since
+the old walk doesn't retry and silently loses throttled pages.
+
+    python -m benchmarks.bench_shopify_fetch --collections 120 --leak-rate 20
+"""
+import argparse
+import re
+import time
+
+import requests
+
+from benchmarks.fake_shopify import FakeShopify
+from services.shopify_client import ShopifyClient
+
+
+def legacy_collections_map(base: str) -> dict:
+    """fetch_collections_map() before ShopifyClient."""
+    collections_map = {}
+
+    def paginate(url):
+        while url:
+            res = requests.get(url, headers={"X-Shopify-Access-Token": "bench"})
+            data = res.json()
+            link = res.headers.get("Link")
+            url = (
+                re.findall(r'<(.*?)>; rel="next"', link)[0]
+                if link and 'rel="next"' in link
+                else None
+            )
+            yield data
+
+    collections = []
+    for data in paginate(f"{base}/custom_collections.json?limit=250"):
+        collections.extend(data.get("custom_collections", []))
+    for data in paginate(f"{base}/smart_collections.json?limit=250"):
+        collections.extend(data.get("smart_collections", []))
+
+    for col in collections:
+        for data in paginate(f"{base}/collections/{col['id']}/products.json?limit=250"):
+            for p in data.get("products", []):
+                collections_map.setdefault(p["id"], []).append(col["title"])
+    return collections_map
+
+
+def expected_map(fake: FakeShopify) -> dict:
+    ordered = ([c for c in fake.collections if c["kind"] == "custom"]
+               + [c for c in fake.collections if c["kind"] == "smart"])
+    expected = {}
+    for col in ordered:
+        for product_id in fake.members[col["id"]]:
+            expected.setdefault(product_id, []).append(col["title"])
+    return expected
+
+
+def run(label: str, fake: FakeShopify, fetch) -> None:
+    # Let the bucket drain between runs
+    time.sleep(fake.capacity / fake.leak_rate)
+    before = dict(requests=fake.requests, throttled=fake.throttled)
+    start = time.time()
+    result = fetch()
+    elapsed = time.time() - start
+    expected = expected_map(fake)
+    lost = sum(len(v) for v in expected.values()) - sum(len(v) for v in result.values())
+    print(f"   {label:<16} {elapsed:6.2f}s | calls {fake.requests - before['requests']:4} "
+          f"(429s {fake.throttled - before['throttled']:3}) | "
+          f"memberships lost {lost:5} | {'✅ exact' if result == expected else '❌ differs'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collections", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--leak-rate", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    fake = FakeShopify(collections=args.collections, latency=args.latency, leak_rate=args.leak_rate).start()
+    print(f"🛍️ {args.collections} collections, {args.latency * 1000:.0f}ms per call, "
+          f"bucket {fake.capacity} leaking {args.leak_rate}/s")
+
+    def client_fetch(concurrency):
+        client = ShopifyClient(fake.url, "bench", concurrency, args.leak_rate)
+        try:
+            return client.collection_products_map(client.list_collections())
+        finally:
+            client.close()
+
+    try:
+        run("sequential (old)", fake, lambda: legacy_collections_map(fake.url))
+        run("client x1", fake, lambda: client_fetch(1))
+        run(f"client x{args.concurrency}", fake, lambda: client_fetch(args.concurrency))
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Closed-tab benchmark for reply streaming.
+
+Serves the app's SSE endpoint with uvicorn (startup hooks off, so no
+OpenSearch needed) and streams replies from a fake Ollama through the
+real LLaMAClient and router into each session's queue, exactly as
+/chat/stream does. Each shopper reads for a moment after the first
+token, then closes the tab. Compares how many tokens Ollama generated
+with the cancellation off and on.
+
+    python -m benchmarks.bench_stream_cancel --sessions 20 --read-for 0.5
+"""
+import argparse
+import threading
+import time
+from queue import Queue
+
+import httpx
+import uvicorn
+
+import app as frono
+from benchmarks.bench_llama_client import FakeServer
+from llm.llama_client import LLaMAClient
+from llm.router import LLMRouter
+from llm.scheduler import LLMScheduler
+from services.stream_sessions import StreamSessions
+
+TOKENS = 300
+TOKEN_DELAY = 0.01
+
+
+def serve() -> str:
+    config = uvicorn.Config(frono.app, host="127.0.0.1", port=0, lifespan="off", log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def shopper(base: str, session_id: str, read_for: float, got: list):
+    """Opens the SSE stream, reads for a while after the first token, closes the tab."""
+    deadline = None
+    with httpx.stream("GET", f"{base}/chat/stream/events/{session_id}", timeout=10) as r:
+        for line in r.iter_lines():
+            if not line.startswith("data: "):
+                continue
+            got.append(line)
+            deadline = deadline or time.time() + read_for
+            if time.time() > deadline:
+                break
+
+
+def run(base: str, ollama: FakeServer, sessions: int, read_for: float, cancel: bool) -> dict:
+    # Grace 0.2s keeps the run short; production uses DISCONNECT_GRACE
+    frono.stream_sessions = registry = StreamSessions(grace=0.2 if cancel else float("inf"))
+    frono.user_queues.clear()
+    router = LLMRouter([LLaMAClient(host=ollama.url)], scheduler=LLMScheduler(max_concurrency=1000))
+    before = ollama.stats()
+    received = [[] for _ in range(sessions)]
+    replies = [None] * sessions
+
+    def one(i):
+        sid = f"bench-{cancel}-{i}"
+        frono.user_queues[sid] = Queue()
+        reader = threading.Thread(target=shopper, args=(base, sid, read_for, received[i]))
+        reader.start()
+        # Same loop as /chat/stream
+        replies[i] = registry.pump(
+            registry.begin(sid), router.stream("hello", "system"), frono.user_queues[sid], TOKENS
+        )
+        reader.join()
+
+    start = time.time()
+    workers = [threading.Thread(target=one, args=(i,)) for i in range(sessions)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.time() - start
+
+    after = ollama.stats()
+    return {
+        "generated": after["tokens_sent"] - before["tokens_sent"],
+        "aborted": after["aborted"] - before["aborted"],
+        "read": sum(len(r) for r in received),
+        "partial_chars": sum(len(text) for text, _ in replies),
+        "seconds": elapsed,
+        "stats": registry.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--read-for", type=float, default=0.5)
+    args = parser.parse_args()
+
+    base = serve()
+    ollama = FakeServer(tokens=TOKENS, token_delay=TOKEN_DELAY, connect_delay=0)
+    try:
+        print(f"✂️ {args.sessions} shoppers close the tab after {args.read_for}s "
+              f"of a {TOKENS}-token reply ({TOKENS * TOKEN_DELAY:.0f}s)")
+        for cancel in (False, True):
+            m = run(base, ollama, args.sessions, args.read_for, cancel)
+            label = "cancel on" if cancel else "cancel off"
+            print(f"   {label:<10} ollama generated {m['generated']:5} tokens "
+                  f"(aborted {m['aborted']:2}) | shoppers read {m['read']:4} | partial kept "
+                  f"{m['partial_chars']:5} chars | "
+                  f"worker busy {m['seconds']:4.1f}s | {m['stats']}")
+    finally:
+        ollama.proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
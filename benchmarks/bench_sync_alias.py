@@ -0,0 +1,115 @@
+"""
+What chat queries see while a full product sync runs: writing into the
+live index vs building a new version behind the frono_products alias.
+
+A reader thread searches frono_products every few ms during the sync
+and records latency and hits.total. The fake OpenSearch (a subprocess)
+adds --contention to searches on an index that a bulk is writing to,
+standing in for refreshes, merges and invalidated caches; the catalog
+counts come straight from what the reader got back. Before each run
+every product's price is changed in the fake Shopify, so every document
+is rewritten in all three cases.
+
+    python -m benchmarks.bench_sync_alias --products 3000 --contention 0.02
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import threading
+import time
+
+from opensearchpy import OpenSearch
+
+import master_sync as ms
+from benchmarks.bench_sync_pipeline import free_port, spawn
+from benchmarks.fake_shopify import FakeShopify
+from services.shopify_client import ShopifyClient
+
+QUERY = {"size": 5, "query": {"match": {"name": "product"}}}
+
+
+def reader(client: OpenSearch, stop: threading.Event, samples: list, interval: float):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            total = client.search(index=ms.PRODUCT_INDEX, body=QUERY)["hits"]["total"]["value"]
+        except Exception:
+            total = None        # index missing
+        samples.append(((time.perf_counter() - start) * 1000, total))
+        time.sleep(interval)
+
+
+def reprice(shopify: FakeShopify, step: int):
+    for product in shopify.products:
+        variants = [{**v, "price": f"{19.99 + step:.2f}"} for v in product["variants"]]
+        shopify.touch(product["id"], variants=variants)
+
+
+def run(label: str, sync, shopify: FakeShopify, args, step: int):
+    port = free_port()
+    fake_os = spawn("benchmarks.fake_opensearch", "--port", str(port), "--per-doc", str(args.per_doc),
+                    "--contention", str(args.contention))
+    try:
+        ms.os_client = OpenSearch(hosts=[{"host": "127.0.0.1", "port": port}])
+        ms.shopify_client = ShopifyClient(shopify.url, "bench", 8, shopify.leak_rate)
+        with contextlib.redirect_stdout(io.StringIO()):
+            ms.sync_all_products()                      # the catalog as it was
+        expected = ms.os_client.count(index=ms.PRODUCT_INDEX)["count"]
+        reprice(shopify, step)
+
+        def sampled(work):
+            samples, stop = [], threading.Event()
+            thread = threading.Thread(target=reader, args=(
+                OpenSearch(hosts=[{"host": "127.0.0.1", "port": port}]), stop, samples, args.interval))
+            thread.start()
+            start = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                work()
+            elapsed = time.time() - start
+            stop.set()
+            thread.join()
+            latencies = sorted(latency for latency, _ in samples)
+            return elapsed, samples, statistics.median(latencies), latencies[int(len(latencies) * 0.95)]
+
+        _, _, idle_p50, idle_p95 = sampled(lambda: time.sleep(1))
+        elapsed, samples, p50, p95 = sampled(sync)
+        partial = sum(1 for _, total in samples if total != expected)
+        print(f"   {label:<20} sync {elapsed:5.2f}s | idle p50 {idle_p50:4.1f}ms p95 {idle_p95:4.1f}ms -> "
+              f"during sync p50 {p50:4.1f}ms p95 {p95:5.1f}ms ({len(samples)} queries) | "
+              f"saw a partial or missing catalog {partial:4}x")
+    finally:
+        ms.shopify_client.close()
+        fake_os.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=3000)
+    parser.add_argument("--per-doc", type=float, default=0.0002)
+    parser.add_argument("--contention", type=float, default=0.02)
+    parser.add_argument("--interval", type=float, default=0.005)
+    args = parser.parse_args()
+
+    shopify = FakeShopify(products=args.products, collections=40, latency=0.05).start()
+    print(f"🛍️ {args.products} products, {args.per_doc * 1000:.1f}ms per indexed doc, "
+          f"+{args.contention * 1000:.0f}ms per search while its index is being written")
+
+    def recreate():
+        # A mapping change without aliases: drop the index and fill it again
+        ms.os_client.indices.delete(index=ms.PRODUCT_INDEX)
+        ms.sync_all_products()
+
+    def blue_green():
+        ms.sync_products("full")
+
+    try:
+        run("in place", ms.sync_all_products, shopify, args, 1)
+        run("recreate in place", recreate, shopify, args, 2)
+        run("blue/green (alias)", blue_green, shopify, args, 3)
+    finally:
+        shopify.stop()
+
+
+if __name__ == "__main__":
+    main()
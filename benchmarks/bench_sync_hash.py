@@ -0,0 +1,79 @@
+"""
+Full product sync with content_hash skipping: how many documents a
+steady-state run rewrites when only a few products changed in Shopify.
+
+Fills a fake OpenSearch with one full sync, edits --touched products in
+the fake Shopify (price or stock), then syncs again twice: once with the
+stored hashes stripped (what every run did before content_hash: rewrite
+the whole catalog) and once with them in place.
+
+    python -m benchmarks.bench_sync_hash --products 4000 --touched 40
+"""
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from opensearchpy import OpenSearch
+
+import master_sync as ms
+from benchmarks.fake_opensearch import FakeOpenSearch
+from benchmarks.fake_shopify import FakeShopify
+from services.shopify_client import ShopifyClient
+
+
+def sync(fake_os: FakeOpenSearch) -> tuple[float, int, str]:
+    """(seconds, documents written, the 📊 summary line)."""
+    before = fake_os.stats["indexed"] + fake_os.stats["deleted"]
+    out = io.StringIO()
+    start = time.time()
+    with contextlib.redirect_stdout(out):
+        ms.sync_all_products()
+    elapsed = time.time() - start
+    summary = next((l for l in out.getvalue().splitlines() if l.startswith("📊")), "")
+    return elapsed, fake_os.stats["indexed"] + fake_os.stats["deleted"] - before, summary
+
+
+def touch(shopify: FakeShopify, count: int, rng: random.Random):
+    for product_id in rng.sample(range(1, len(shopify.products) + 1), count):
+        variants = [dict(v) for v in shopify.products[product_id - 1]["variants"]]
+        variants[0]["inventory_quantity"] += 1
+        shopify.touch(product_id, variants=variants)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=4000)
+    parser.add_argument("--touched", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--per-doc", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    shopify = FakeShopify(products=args.products, collections=40, latency=args.latency).start()
+    fake_os = FakeOpenSearch(per_doc=args.per_doc).start()
+    ms.os_client = OpenSearch(hosts=[{"host": "127.0.0.1", "port": fake_os.port}])
+    ms.shopify_client = ShopifyClient(shopify.url, "bench", 8, shopify.leak_rate)
+    try:
+        elapsed, written, _ = sync(fake_os)
+        print(f"🛍️ {args.products} products indexed ({written} SKUs, {elapsed:.2f}s), "
+              f"{args.touched} edited before each run")
+
+        touch(shopify, args.touched, rng)
+        for doc in fake_os.indices[ms.PRODUCT_INDEX]["docs"].values():
+            doc.pop("content_hash", None)
+        elapsed, written, summary = sync(fake_os)
+        print(f"   no hashes    {elapsed:6.2f}s | {written:6} documents written | {summary}")
+
+        touch(shopify, args.touched, rng)
+        elapsed, written, summary = sync(fake_os)
+        print(f"   content_hash {elapsed:6.2f}s | {written:6} documents written | {summary}")
+    finally:
+        ms.shopify_client.close()
+        shopify.stop()
+        fake_os.stop()
+
+
+if __name__ == "__main__":
+    main()
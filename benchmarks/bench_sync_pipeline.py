@@ -0,0 +1,140 @@
+"""
+Full product sync: build every action, then bulk (old) vs the streaming
+pipeline in master_sync.sync_all_products.
+
+Fake Shopify and fake OpenSearch run as subprocesses so tracemalloc only
+sees the sync itself. Each variant fills an empty index (as a rebuilt
+version starts, and so that content_hash skips nothing) once timed and
+once traced for peak memory. The old version keeps every action in
+memory; the pipeline should hold a few pages and start writing while
+Shopify is still paging.
+
+    python -m benchmarks.bench_sync_pipeline --products 2000 8000
+"""
+import argparse
+import contextlib
+import io
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import requests
+from opensearchpy import OpenSearch, helpers
+
+import master_sync as ms
+from services.shopify_client import ShopifyClient
+
+
+def legacy_sync_all_products():
+    """sync_all_products() before the pipeline: scan, collect, then one helpers.bulk."""
+    collections_map = ms.fetch_collections_map()
+
+    existing_qty = {}
+    try:
+        for hit in helpers.scan(ms.os_client, index=ms.PRODUCT_INDEX, query={"_source": ["sku", "qty"]}):
+            existing_qty[hit["_source"]["sku"]] = hit["_source"].get("qty")
+    except Exception:
+        pass
+
+    actions, active_skus, stock_changes = [], set(), []
+    high_water_mark = None
+    for page in ms.shopify_client.paginate("products.json", status="active", limit=250):
+        for product in page.get("products", []):
+            high_water_mark = ms.later(high_water_mark, product["updated_at"])
+            for doc in ms.variant_docs(product, collections_map):
+                sku = doc["sku"]
+                active_skus.add(sku)
+                if sku in existing_qty and existing_qty[sku] != doc["qty"]:
+                    stock_changes.append((sku, doc["qty"], product["title"]))
+                actions.append({"_op_type": "index", "_index": ms.PRODUCT_INDEX, "_id": sku, "_source": doc})
+
+    for sku in set(existing_qty) - active_skus:
+        actions.append({"_op_type": "delete", "_index": ms.PRODUCT_INDEX, "_id": sku})
+        stock_changes.append((sku, 0, None))
+
+    helpers.bulk(ms.os_client, actions, stats_only=False, raise_on_error=False)
+    ms.write_checkpoint(high_water_mark, full=True)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn(module: str, *args) -> subprocess.Popen:
+    proc = subprocess.Popen([sys.executable, "-m", module, *args], stdout=subprocess.PIPE, text=True)
+    proc.stdout.readline()      # the "listening" line
+    return proc
+
+
+def run_once(sync) -> float:
+    start = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sync()
+    return time.time() - start
+
+
+def fresh_index(args):
+    """A fake OpenSearch with an empty index, as a rebuilt version starts."""
+    port = free_port()
+    fake_os = spawn("benchmarks.fake_opensearch", "--port", str(port), "--per-doc", str(args.per_doc))
+    ms.os_client = OpenSearch(hosts=[{"host": "127.0.0.1", "port": port}])
+    return fake_os, f"http://127.0.0.1:{port}/_fake/stats"
+
+
+def measure(label: str, sync, args, shopify_url: str) -> None:
+    ms.shopify_client = ShopifyClient(shopify_url, "bench", args.concurrency, args.leak_rate)
+    fake_os, stats_url = fresh_index(args)
+    try:
+        start = time.time()
+        elapsed = run_once(sync)
+        stats = requests.get(stats_url).json()
+    finally:
+        fake_os.terminate()
+
+    fake_os, _ = fresh_index(args)
+    try:
+        tracemalloc.start()
+        run_once(sync)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        fake_os.terminate()
+        ms.shopify_client.close()
+
+    print(f"   {label:<13} {elapsed:6.2f}s | peak {peak / 2 ** 20:7.1f} MiB | "
+          f"first write at {stats['first_bulk_at'] - start:5.2f}s | "
+          f"bulk requests {stats['bulk_requests']:3} (largest {stats['bulk_bytes_max'] / 2 ** 20:4.1f} MiB) | "
+          f"indexed {stats['docs'].get(ms.PRODUCT_INDEX)} SKUs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[2000, 8000])
+    parser.add_argument("--collections", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--leak-rate", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--per-doc", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    for products in args.products:
+        port = free_port()
+        shopify = spawn("benchmarks.fake_shopify", "--port", str(port), "--products", str(products),
+                        "--collections", str(args.collections), "--latency", str(args.latency),
+                        "--leak-rate", str(args.leak_rate))
+        print(f"🛍️ {products} products, {args.latency * 1000:.0f}ms per Shopify call, "
+              f"{args.per_doc * 1000:.1f}ms per indexed doc")
+        try:
+            url = f"http://127.0.0.1:{port}/admin/api/2025-01"
+            measure("collect (old)", legacy_sync_all_products, args, url)
+            measure("pipeline", ms.sync_all_products, args, url)
+        finally:
+            shopify.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks.
+
+Serves /api/generate and /api/chat as NDJSON over chunked HTTP/1.1 with
+keep-alive, like the real server, and counts the TCP connections it
+accepts so pooled and unpooled clients can be told apart (GET /stats).
+
+With --prefill-per-token it also charges for reading the prompt the way
+llama.cpp does: each of --slots KV caches remembers the last prompt +
+reply it processed, and only the tokens after the longest prefix shared
+with a slot cost time. /api/generate returns a `context` that a later
+request can send back to continue from.
+
+    python -m benchmarks.fake_ollama --port 11500
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128    # default 5 drops SYNs when a pool fills at once
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading mid-stream reset the socket; not an error here
+        pass
+
+
+class FakeOllama:
+    def __init__(self, port: int = 0, tokens: int = 50, token_delay: float = 0.0,
+                 first_token_delay: float = 0.0, connect_delay: float = 0.0,
+                 prefill_per_token: float = 0.0, slots: int = 4):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.first_token_delay = first_token_delay
+        # Simulates TCP/TLS setup cost that keep-alive avoids
+        self.connect_delay = connect_delay
+        self.connections = 0
+        self.requests = 0
+        self.tokens_sent = 0
+        self.aborted = 0        # streams the client closed early
+        self.prefill_per_token = prefill_per_token
+        self.prefill_tokens = 0     # prompt tokens that missed every KV slot
+        self._slots = [""] * max(slots, 1)     # most recently used last
+        self._contexts = {}         # context id -> text it stands for
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with fake._lock:
+                    fake.connections += 1
+                if fake.connect_delay:
+                    time.sleep(fake.connect_delay)
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                # Counters for benchmarks running the server in another process
+                if self.path != "/stats":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                payload = json.dumps({
+                    "connections": fake.connections, "requests": fake.requests,
+                    "tokens_sent": fake.tokens_sent, "aborted": fake.aborted,
+                    "prefill_tokens": fake.prefill_tokens,
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                chat = self.path == "/api/chat"
+                text = fake.render(body, chat)
+                prefill = fake.prefill(text)
+                lines = fake.lines(body.get("model", ""), chat)
+                if not chat:
+                    lines[-1]["context"] = fake.context_for(text + fake.reply)
+
+                if not body.get("stream", True):
+                    text = "".join(
+                        (l["message"]["content"] if chat else l["response"]) for l in lines
+                    )
+                    final = dict(lines[-1])
+                    if chat:
+                        final["message"] = {"role": "assistant", "content": text}
+                    else:
+                        final["response"] = text
+                    payload = json.dumps(final).encode()
+                    time.sleep(prefill + fake.first_token_delay + fake.token_delay * fake.tokens)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                time.sleep(prefill + fake.first_token_delay)
+                try:
+                    for line in lines:
+                        data = json.dumps(line).encode() + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                        self.wfile.flush()
+                        with fake._lock:
+                            fake.tokens_sent += 1
+                        if fake.token_delay:
+                            time.sleep(fake.token_delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Like Ollama: the client hung up, stop generating
+                    with fake._lock:
+                        fake.aborted += 1
+                    self.close_connection = True
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    @property
+    def reply(self) -> str:
+        return "".join(f"tok{i} " for i in range(self.tokens))
+
+    def render(self, body: dict, chat: bool) -> str:
+        """The text the model reads, standing in for the chat template."""
+        if chat:
+            return "".join(f"<{m['role']}>{m['content']}" for m in body.get("messages", []))
+        context = body.get("context") or [None]
+        with self._lock:
+            text = self._contexts.get(context[0], "")
+        if body.get("system"):
+            text += f"<system>{body['system']}"
+        return text + f"<user>{body.get('prompt', '')}"
+
+    def prefill(self, text: str) -> float:
+        """Seconds to read `text`, given what the KV slots hold; then caches it + the reply."""
+        with self._lock:
+            best, shared = 0, 0
+            for i, cached in enumerate(self._slots):
+                n = len(os.path.commonprefix([cached, text]))
+                if n > shared:
+                    best, shared = i, n
+            # Like Ollama's multi-user cache: a slot holding more than the
+            # shared prefix isn't cut back, the prefix is forked into the LRU slot
+            if len(self._slots[best]) > shared:
+                best = 0
+            self._slots.pop(best)
+            self._slots.append(text + self.reply)
+            missed = (len(text) - shared) // 4
+            self.prefill_tokens += missed
+        return missed * self.prefill_per_token
+
+    def context_for(self, text: str) -> list:
+        # Real contexts are token ids; here the first one names the text
+        with self._lock:
+            context_id = len(self._contexts) + 1
+            self._contexts[context_id] = text
+        return [context_id] + [0] * (len(text) // 4)
+
+    def lines(self, model: str, chat: bool) -> list:
+        lines = []
+        for i in range(self.tokens):
+            token = f"tok{i} "
+            if chat:
+                lines.append({"model": model, "message": {"role": "assistant", "content": token}, "done": False})
+            else:
+                lines.append({"model": model, "response": token, "done": False})
+        done = {"model": model, "done": True, "eval_count": self.tokens}
+        if chat:
+            done["message"] = {"role": "assistant", "content": ""}
+        else:
+            done["response"] = ""
+        lines.append(done)
+        return lines
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--prefill-per-token", type=float, default=0.0)
+    parser.add_argument("--slots", type=int, default=4)
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.port, args.tokens, args.token_delay, args.first_token_delay,
+                      args.connect_delay, args.prefill_per_token, args.slots).start()
+    print(f"🦙 Fake Ollama on {fake.url} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
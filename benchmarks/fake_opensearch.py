@@ -0,0 +1,357 @@
+"""
+Local stand-in for the parts of the OpenSearch REST API the sync uses.
+
+Keeps documents in memory per index and serves _bulk (NDJSON), _mget,
+scroll searches (helpers.scan), _mapping with _meta, index create/get/
+delete/_settings/_refresh and aliases, with a cost per bulk request plus
+per document so indexing takes time like the real thing. Searches take
+--search-cost, plus --contention while a bulk is writing to the same
+index (standing in for refreshes, merges and invalidated caches). Search
+bodies are not evaluated: every document matches.
+GET /_fake/stats returns counters, POST /_fake/reset zeroes them.
+
+    python -m benchmarks.fake_opensearch --port 9300 --per-doc 0.0002
+"""
+import argparse
+import fnmatch
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeOpenSearch:
+    def __init__(self, port: int = 0, bulk_overhead: float = 0.005, per_doc: float = 0.0002,
+                 search_cost: float = 0.002, contention: float = 0.0):
+        self.bulk_overhead = bulk_overhead
+        self.per_doc = per_doc
+        self.search_cost = search_cost
+        self.contention = contention
+        self.indices = {}       # name -> {"docs": {id: source}, "meta": {}, "properties": {}, "settings": {}}
+        self.aliases = {}       # alias -> index
+        self._writing = {}      # index -> bulk requests in flight
+        self._scrolls = {}      # scroll id -> remaining hits
+        self._lock = threading.Lock()
+        self.stats = {"bulk_requests": 0, "bulk_bytes_max": 0, "indexed": 0, "deleted": 0,
+                      "first_bulk_at": None, "searches": 0}
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def _handle(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                parts = [p for p in url.path.split("/") if p]
+                raw = self._body()
+                status, payload = fake.route(self.command, parts, query, raw)
+                self._send(status, payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+
+    # ------------------------------------------------
+    # ROUTING
+    # ------------------------------------------------
+    def route(self, method: str, parts: list, query: dict, raw: bytes):
+        if parts == ["_fake", "reset"]:
+            with self._lock:
+                self.stats.update(bulk_requests=0, bulk_bytes_max=0, indexed=0, deleted=0,
+                                  first_bulk_at=None, searches=0)
+            return 200, {"acknowledged": True}
+        if parts == ["_fake", "stats"]:
+            with self._lock:
+                sizes = {name: len(i["docs"]) for name, i in self.indices.items()}
+            return 200, {**self.stats, "docs": sizes}
+        if parts and parts[-1] == "_bulk":
+            return self.bulk(parts[0] if len(parts) == 2 else None, raw)
+        if parts == ["_aliases"]:
+            return self.update_aliases(json.loads(raw or b"{}"))
+        if parts[:1] == ["_alias"] and len(parts) == 2:
+            return self.get_alias(parts[1])
+        if parts[:2] == ["_cluster", "health"]:
+            return 200, {"status": "green", "timed_out": False}
+        if parts[:2] == ["_search", "scroll"]:
+            body = json.loads(raw or b"{}")
+            if method == "DELETE":
+                for sid in body.get("scroll_id", []):
+                    self._scrolls.pop(sid, None)
+                return 200, {"succeeded": True}
+            return 200, self._scroll_page(body["scroll_id"], None)
+        if len(parts) == 2 and parts[1] == "_mget":
+            return self.mget(parts[0], json.loads(raw or b"{}"), query)
+        if len(parts) == 2 and parts[1] == "_search":
+            return self.search(parts[0], json.loads(raw or b"{}"), query)
+        if len(parts) == 2 and parts[1] == "_count":
+            index = self._index(parts[0])
+            return (200, {"count": len(index["docs"])}) if index else self._missing(parts[0])
+        if len(parts) == 2 and parts[1] == "_mapping":
+            return self.mapping(method, parts[0], json.loads(raw or b"{}"))
+        if len(parts) == 2 and parts[1] == "_settings":
+            return self.settings(method, parts[0], json.loads(raw or b"{}"))
+        if len(parts) == 2 and parts[1] == "_refresh":
+            return (200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}) if self._index(parts[0]) \
+                else self._missing(parts[0])
+        if len(parts) == 1 and not parts[0].startswith("_"):
+            return self.index_api(method, parts[0], json.loads(raw or b"{}"))
+        return 404, {"error": {"type": "fake_unsupported", "reason": f"{method} /{'/'.join(parts)}"}, "status": 404}
+
+    def resolve(self, name: str) -> str:
+        return self.aliases.get(name, name)
+
+    def _index(self, name: str, create: bool = False):
+        with self._lock:
+            name = self.resolve(name)
+            if name not in self.indices and create:
+                self.indices[name] = {"docs": {}, "meta": {}, "properties": {}, "settings": {}}
+            return self.indices.get(name)
+
+    @staticmethod
+    def _missing(name: str):
+        return 404, {"error": {"type": "index_not_found_exception", "reason": f"no such index [{name}]",
+                               "index": name}, "status": 404}
+
+    # ------------------------------------------------
+    # ENDPOINTS
+    # ------------------------------------------------
+    def bulk(self, default_index: str | None, raw: bytes):
+        lines = [l for l in raw.split(b"\n") if l.strip()]
+        items = []
+        targets = set()
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op, meta = next(iter(action.items()))
+            name = self.resolve(meta.get("_index", default_index))
+            targets.add(name)
+            doc_id = meta.get("_id") or uuid.uuid4().hex
+            index = self._index(name, create=op != "delete")
+            if op == "delete":
+                i += 1
+                found = index is not None and index["docs"].pop(doc_id, None) is not None
+                items.append({op: {"_index": name, "_id": doc_id, "status": 200 if found else 404,
+                                   "result": "deleted" if found else "not_found"}})
+                self.stats["deleted"] += found
+                continue
+            source = json.loads(lines[i + 1])
+            i += 2
+            if op == "update":
+                current = index["docs"].get(doc_id)
+                if current is None and "doc_as_upsert" not in source and "upsert" not in source:
+                    items.append({op: {"_index": name, "_id": doc_id, "status": 404,
+                                       "error": {"type": "document_missing_exception"}}})
+                    continue
+                source = {**(current or source.get("upsert", {})), **source.get("doc", {})}
+            created = doc_id not in index["docs"]
+            index["docs"][doc_id] = source
+            self.stats["indexed"] += 1
+            items.append({op: {"_index": name, "_id": doc_id, "status": 201 if created else 200,
+                               "result": "created" if created else "updated"}})
+
+        with self._lock:
+            self.stats["bulk_requests"] += 1
+            self.stats["bulk_bytes_max"] = max(self.stats["bulk_bytes_max"], len(raw))
+            self.stats["first_bulk_at"] = self.stats["first_bulk_at"] or time.time()
+            for name in targets:
+                self._writing[name] = self._writing.get(name, 0) + 1
+        try:
+            time.sleep(self.bulk_overhead + self.per_doc * len(items))
+        finally:
+            with self._lock:
+                for name in targets:
+                    self._writing[name] -= 1
+        return 200, {"took": 1, "errors": any("error" in next(iter(it.values())) for it in items), "items": items}
+
+    @staticmethod
+    def _filter(source: dict, query: dict):
+        includes = query.get("_source_includes")
+        if includes:
+            keep = includes.split(",")
+            return {k: v for k, v in source.items() if k in keep}
+        return source
+
+    def mget(self, name: str, body: dict, query: dict):
+        index = self._index(name)
+        if index is None:
+            return self._missing(name)
+        docs = []
+        for doc_id in body.get("ids", []):
+            source = index["docs"].get(doc_id)
+            if source is None:
+                docs.append({"_index": name, "_id": doc_id, "found": False})
+            else:
+                docs.append({"_index": name, "_id": doc_id, "found": True,
+                             "_source": self._filter(source, query)})
+        return 200, {"docs": docs}
+
+    def search(self, name: str, body: dict, query: dict):
+        index = self._index(name)
+        if index is None:
+            return self._missing(name)
+        name = self.resolve(name)
+        self.stats["searches"] += 1
+        want_source = body.get("_source", True)
+        fields = want_source if isinstance(want_source, list) else None
+        size = int(query.get("size", body.get("size", 10)))
+        docs = list(index["docs"].items())
+        total = len(docs)
+        if "scroll" not in query:
+            docs = docs[:size]
+        hits = []
+        for doc_id, source in docs:
+            hit = {"_index": name, "_id": doc_id}
+            if want_source is not False:
+                hit["_source"] = {k: source.get(k) for k in fields} if fields else source
+            hits.append(hit)
+        if "scroll" in query:
+            sid = uuid.uuid4().hex
+            self._scrolls[sid] = (hits, size)
+            return 200, self._scroll_page(sid, size)
+
+        time.sleep(self.search_cost + (self.contention if self._writing.get(name) else 0))
+        return 200, {"hits": {"total": {"value": total}, "hits": hits}, "aggregations": {}}
+
+    def _scroll_page(self, sid: str, size: int | None):
+        hits, size = self._scrolls.get(sid, ([], size or 10))
+        page, rest = hits[:size], hits[size:]
+        self._scrolls[sid] = (rest, size)
+        return {"_scroll_id": sid, "_shards": {"total": 1, "successful": 1, "skipped": 0},
+                "hits": {"total": {"value": len(hits)}, "hits": page}}
+
+    def mapping(self, method: str, name: str, body: dict):
+        index = self._index(name, create=method == "PUT")
+        if index is None:
+            return self._missing(name)
+        if method == "PUT":
+            if "_meta" in body:
+                index["meta"] = body["_meta"]
+            index["properties"].update(body.get("properties", {}))
+            return 200, {"acknowledged": True}
+        return 200, {self.resolve(name): {"mappings": self._mappings(index)}}
+
+    @staticmethod
+    def _mappings(index: dict) -> dict:
+        return {"_meta": index["meta"], "properties": index["properties"]}
+
+    def settings(self, method: str, name: str, body: dict):
+        index = self._index(name)
+        if index is None:
+            return self._missing(name)
+        if method == "PUT":
+            for key, value in body.get("index", body).items():
+                if value is None:
+                    index["settings"].pop(key, None)
+                else:
+                    index["settings"][key] = str(value)
+            return 200, {"acknowledged": True}
+        return 200, {self.resolve(name): {"settings": {"index": dict(index["settings"])}}}
+
+    def index_api(self, method: str, name: str, body: dict):
+        if method == "PUT":
+            if self.resolve(name) in self.indices or name in self.aliases:
+                return 400, {"error": {"type": "resource_already_exists_exception", "index": name}, "status": 400}
+            index = self._index(name, create=True)
+            index["settings"] = {k: str(v) for k, v in body.get("settings", {}).get("index", {}).items()}
+            index["meta"] = body.get("mappings", {}).get("_meta", {})
+            index["properties"] = dict(body.get("mappings", {}).get("properties", {}))
+            return 200, {"acknowledged": True, "index": name}
+        if method == "DELETE":
+            with self._lock:
+                if self.indices.pop(name, None) is None:
+                    return self._missing(name)
+                self.aliases = {a: i for a, i in self.aliases.items() if i != name}
+            return 200, {"acknowledged": True}
+
+        # GET / HEAD, with * wildcards; an alias name finds its index
+        with self._lock:
+            names = [n for n in self.indices if fnmatch.fnmatchcase(n, name)] if "*" in name \
+                else [self.resolve(name)] if self.resolve(name) in self.indices else []
+            found = {n: {"aliases": {a: {} for a, i in self.aliases.items() if i == n},
+                         "mappings": self._mappings(self.indices[n]),
+                         "settings": {"index": dict(self.indices[n]["settings"])}} for n in names}
+        if not found and "*" not in name:
+            return self._missing(name)
+        return 200, found
+
+    def get_alias(self, alias: str):
+        if alias not in self.aliases:
+            return 404, {"error": f"alias [{alias}] missing", "status": 404}
+        return 200, {self.aliases[alias]: {"aliases": {alias: {}}}}
+
+    def update_aliases(self, body: dict):
+        with self._lock:
+            aliases, indices = dict(self.aliases), dict(self.indices)
+            for action in body.get("actions", []):
+                op, args = next(iter(action.items()))
+                if op == "add":
+                    aliases[args["alias"]] = args["index"]
+                elif op == "remove":
+                    aliases.pop(args["alias"], None)
+                elif op == "remove_index":
+                    indices.pop(args["index"], None)
+            if aliases.keys() & indices.keys():
+                return 400, {"error": {"type": "invalid_alias_name_exception"}, "status": 400}
+            # Applied together or not at all
+            self.aliases, self.indices = aliases, indices
+            self.stats["alias_swaps"] = self.stats.get("alias_swaps", 0) + 1
+        return 200, {"acknowledged": True}
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-opensearch", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9300)
+    parser.add_argument("--bulk-overhead", type=float, default=0.005)
+    parser.add_argument("--per-doc", type=float, default=0.0002)
+    parser.add_argument("--search-cost", type=float, default=0.002)
+    parser.add_argument("--contention", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeOpenSearch(args.port, args.bulk_overhead, args.per_doc, args.search_cost, args.contention).start()
+    print(f"🔎 Fake OpenSearch on http://127.0.0.1:{fake.port} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Local stand-in for the Shopify Admin REST API, for sync benchmarks.
+
+Serves custom/smart collections, collection products, products, pages and
+policies with Link rel="next" cursor pagination, a fixed latency per call
+and Shopify's leaky bucket: each call adds one, the bucket drains at
+--leak-rate per second, and a call into a full bucket gets a 429 with
+Retry-After. Every response carries X-Shopify-Shop-Api-Call-Limit.
+products.json honours status and updated_at_min, the collection listings
+honour product_id; touch() edits a product.
+
+    python -m benchmarks.fake_shopify --port 11600 --collections 120
+"""
+import argparse
+import json
+import random
+import re
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+API_PREFIX = "/admin/api/2025-01"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class FakeShopify:
+    def __init__(self, port: int = 0, collections: int = 120, products: int = 1500,
+                 per_collection: int = 60, latency: float = 0.15, capacity: int = 40,
+                 leak_rate: float = 20.0, seed: int = 1):
+        rng = random.Random(seed)
+        self.latency = latency
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self._updated = time.monotonic()
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+        self.products = [self._product(i, rng) for i in range(1, products + 1)]
+        self.collections = [
+            {"id": 1000 + i, "title": f"Collection {i}", "kind": "custom" if i % 3 else "smart"}
+            for i in range(collections)
+        ]
+        # A few big collections span several 250-product pages
+        self.members = {
+            c["id"]: sorted(rng.sample(range(1, products + 1),
+                                       min(products, per_collection * (6 if i % 25 == 0 else 1))))
+            for i, c in enumerate(self.collections)
+        }
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, payload: dict, headers: dict | None = None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/stats":
+                    return self._send(200, {"requests": fake.requests, "throttled": fake.throttled})
+
+                allowed, used = fake.take()
+                limit = {"X-Shopify-Shop-Api-Call-Limit": f"{used}/{fake.capacity}"}
+                if not allowed:
+                    return self._send(429, {"errors": "Exceeded 2 calls per second for api client. "
+                                                      "Reduce request rates to resume uninterrupted service."},
+                                      {**limit, "Retry-After": "1.0"})
+
+                time.sleep(fake.latency)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                items, key = fake.route(url.path[len(API_PREFIX) + 1:])
+                if items is None:
+                    return self._send(404, {"errors": "Not Found"}, limit)
+                if key == "products":
+                    items = fake.filter(items, query)
+                elif "product_id" in query:
+                    product_id = int(query["product_id"])
+                    items = [c for c in items if product_id in fake.members[c["id"]]]
+
+                limit_n = int(query.get("limit", 50))
+                offset = int(query.get("page_info", 0))
+                page = items[offset:offset + limit_n]
+                if query.get("fields") == "id":
+                    page = [{"id": item["id"]} for item in page]
+                headers = dict(limit)
+                if offset + limit_n < len(items):
+                    # Real page_info cursors carry the filters too
+                    carried = {k: v for k, v in query.items() if k not in ("limit", "page_info")}
+                    cursor = urlencode({**carried, "limit": limit_n, "page_info": offset + limit_n})
+                    headers["Link"] = f'<http://{self.headers.get("Host")}{url.path}?{cursor}>; rel="next"'
+                self._send(200, {key: page}, headers)
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}{API_PREFIX}"
+
+    @staticmethod
+    def _product(i: int, rng: random.Random) -> dict:
+        return {
+            "id": i,
+            "title": f"Product {i}",
+            "product_type": rng.choice(["Garden", "Christmas", "Heating", ""]),
+            "body_html": "<p>" + "Lovely thing. " * 20 + "</p>",
+            "status": "active",
+            "updated_at": "2025-01-01T00:00:00+00:00",
+            "variants": [{"sku": f"SKU-{i}-{v}", "price": "19.99", "inventory_quantity": rng.randint(0, 30)}
+                         for v in range(rng.randint(1, 3))],
+        }
+
+    def take(self) -> tuple[bool, int]:
+        """One call into the bucket: (allowed, level after)."""
+        with self._lock:
+            now = time.monotonic()
+            self.level = max(self.level - (now - self._updated) * self.leak_rate, 0.0)
+            self._updated = now
+            self.requests += 1
+            if self.level + 1 > self.capacity:
+                self.throttled += 1
+                return False, int(self.level)
+            self.level += 1
+            return True, int(self.level)
+
+    @staticmethod
+    def filter(products: list, query: dict) -> list:
+        """status (default active) and updated_at_min, as products.json does."""
+        status = query.get("status", "active")
+        if status != "any":
+            products = [p for p in products if p["status"] == status]
+        if "updated_at_min" in query:
+            since = datetime.fromisoformat(query["updated_at_min"])
+            products = [p for p in products if datetime.fromisoformat(p["updated_at"]) >= since]
+        return products
+
+    def touch(self, product_id: int, **fields):
+        """Edits a product the way the Shopify admin would (bumps updated_at)."""
+        product = self.products[product_id - 1]
+        product.update(fields, updated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        return product
+
+    def route(self, path: str):
+        if path in ("custom_collections.json", "smart_collections.json"):
+            kind = path.split("_")[0]
+            return [c for c in self.collections if c["kind"] == kind], path[:-5]
+        match = re.fullmatch(r"collections/(\d+)/products\.json", path)
+        if match:
+            members = self.members.get(int(match.group(1)))
+            if members is None:
+                return None, None
+            return [self.products[i - 1] for i in members], "products"
+        if path == "products.json":
+            return self.products, "products"
+        if path == "pages.json":
+            return [{"id": 1, "title": "About", "body_html": "<p>About us</p>"}], "pages"
+        if path == "policies.json":
+            return [{"title": "Refund", "body": "30 days"}], "policies"
+        return None, None
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-shopify", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11600)
+    parser.add_argument("--collections", type=int, default=120)
+    parser.add_argument("--products", type=int, default=1500)
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--leak-rate", type=float, default=20.0)
+    args = parser.parse_args()
+
+    fake = FakeShopify(args.port, args.collections, args.products,
+                       latency=args.latency, leak_rate=args.leak_rate).start()
+    print(f"🛍️ Fake Shopify on {fake.url} (Ctrl+C to stop)", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Concurrency stress test for StockService.commit.
+
+Runs many threads placing orders (single lines through commit, two-line
+carts through commit_cart) against the same SKUs and checks that stock is
+never oversold and that every unit sold is accounted for.
+
+By default it runs against an in-process stand-in that mimics the
+OpenSearch update and _bulk APIs (versioned get + compare-and-set index
+with retry_on_conflict). The stand-in runs the real COMMIT_SCRIPT and
+RESTOCK_SCRIPT source, translated from its small painless subset to
+Python, so a change to either script shows up here; a script it can't
+translate fails the run. Pass --live to run against the local node instead.
+
+    python -m benchmarks.stock_commit_stress
+    python -m benchmarks.stock_commit_stress --live --threads 32
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from opensearchpy import NotFoundError, ConflictError
+
+import services.stock_service as stock_service
+from services.stock_service import StockService, INDEX
+
+
+# ---------------------------------------------------
+# PAINLESS (the subset the stock scripts use)
+# ---------------------------------------------------
+class _Map(dict):
+    """A painless Map: dot access, missing fields read as null."""
+
+    def __getattr__(self, key):
+        return self.get(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+    def remove(self, key):
+        return self.pop(key, None)
+
+
+_TOKENS = [(r"\|\|", " or "), (r"&&", " and "), (r"\bnull\b", "None"),
+           (r"\btrue\b", "True"), (r"\bfalse\b", "False")]
+
+
+def _expression(text: str) -> str:
+    if re.search(r"!(?!=)", text):
+        raise ValueError(f"Unsupported painless: {text}")
+    for pattern, repl in _TOKENS:
+        text = re.sub(pattern, repl, text)
+    return text
+
+
+def painless_to_python(source: str):
+    """
+    Compiles if/else blocks and `;` statements over ctx and params into a
+    function run(ctx, params). Anything else raises, so the stand-in never
+    quietly runs something other than the script under test.
+    """
+    lines, depth = ["def run(ctx, params):", "    pass"], 1
+    for raw in source.strip().splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("}"):
+            depth -= 1
+            line = line[1:].strip()
+            if not line:
+                continue
+            if line != "else {":
+                raise ValueError(f"Unsupported painless: {raw}")
+            lines.append("    " * depth + "else:")
+            depth += 1
+        elif match := re.fullmatch(r"if \((.*)\) \{", line):
+            lines.append("    " * depth + f"if {_expression(match.group(1))}:")
+            depth += 1
+        elif line.endswith(";"):
+            lines.append("    " * depth + _expression(line[:-1]))
+            lines.append("    " * depth + "pass")
+        else:
+            raise ValueError(f"Unsupported painless: {raw}")
+
+    namespace = {}
+    exec("\n".join(lines), namespace)
+    return namespace["run"]
+
+
+class FakeStockIndex:
+    """
+    Minimal stand-in for the parts of the OpenSearch client StockService uses.
+    Each update reads the document, runs the request's painless script, then
+    tries to write back conditioned on the seq_no it read, exactly like a
+    shard does.
+    """
+
+    def __init__(self, docs: dict, write_delay: float = 0.001):
+        self._lock = threading.Lock()
+        self._docs = {k: {"seq_no": 0, "source": dict(v)} for k, v in docs.items()}
+        self.write_delay = write_delay
+        self.conflicts = 0
+        self._scripts = {}
+
+    def get(self, index, id, **kwargs):
+        with self._lock:
+            if id not in self._docs:
+                raise NotFoundError(404, "document_missing_exception", {})
+            doc = self._docs[id]
+            return {"_id": id, "_seq_no": doc["seq_no"], "_source": dict(doc["source"])}
+
+    def _script(self, source: str):
+        if source not in self._scripts:
+            self._scripts[source] = painless_to_python(source)
+        return self._scripts[source]
+
+    def update(self, index, id, body, retry_on_conflict=0, _source=None, **kwargs):
+        run_script = self._script(body["script"]["source"])
+        params = _Map(body["script"]["params"])
+
+        # Simulated network / queueing latency before the shard sees the request.
+        time.sleep(random.random() * self.write_delay)
+
+        for _ in range(retry_on_conflict + 1):
+            current = self.get(index, id)
+            ctx = _Map(_source=_Map(current["_source"]), op="index")
+            run_script(ctx, params)
+            src = dict(ctx["_source"])
+
+            if ctx["op"] == "noop":
+                return self._response(id, "noop", src, _source)
+
+            # Yield between read and write so concurrent updates interleave.
+            time.sleep(0)
+
+            with self._lock:
+                doc = self._docs[id]
+                if doc["seq_no"] == current["_seq_no"]:
+                    doc["seq_no"] += 1
+                    doc["source"] = src
+                    return self._response(id, "updated", src, _source)
+                self.conflicts += 1
+
+        raise ConflictError(409, "version_conflict_engine_exception", {})
+
+    def bulk(self, body, **kwargs):
+        """Scripted updates only (what _bulk_scripts sends), one item per line."""
+        items = []
+        for action, doc in zip(body[::2], body[1::2]):
+            meta = action["update"]
+            try:
+                res = self.update(meta["_index"], meta["_id"], doc, meta.get("retry_on_conflict", 0),
+                                  doc.get("_source"))
+                items.append({"update": {**res, "status": 200}})
+            except NotFoundError:
+                items.append({"update": {"_id": meta["_id"], "status": 404}})
+            except ConflictError:
+                items.append({"update": {"_id": meta["_id"], "status": 409}})
+        return {"items": items}
+
+    @staticmethod
+    def _response(id, result, src, fields):
+        fields = fields or []
+        return {
+            "_id": id,
+            "result": result,
+            "get": {"_source": {k: src.get(k) for k in fields}}
+        }
+
+
+def run(skus: dict, threads: int, orders: int, max_qty: int):
+    outcomes = {"committed": 0, "insufficient": 0, "conflict": 0, "not_found": 0, "error": 0,
+                "cart_committed": 0, "cart_rolled_back": 0}
+    sold = {sku: 0 for sku in skus}
+    lock = threading.Lock()
+
+    def place_order(_):
+        lines = [{"sku": sku, "qty": random.randint(1, max_qty)}
+                 for sku in random.sample(list(skus), min(len(skus), random.choice((1, 2))))]
+        try:
+            if len(lines) == 1:
+                result = StockService.commit(lines[0]["sku"], lines[0]["qty"])
+                status, committed = result["status"], result["status"] == "committed"
+            else:
+                result = StockService.commit_cart(lines)
+                committed = result["committed"]
+                status = "cart_committed" if committed else "cart_rolled_back"
+        except Exception:
+            with lock:
+                outcomes["error"] += 1
+            return
+
+        with lock:
+            outcomes[status] += 1
+            if committed:
+                for line in lines:
+                    sold[line["sku"]] += line["qty"]
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(place_order, range(orders)))
+    elapsed = time.time() - start
+
+    return outcomes, sold, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="Run against the configured OpenSearch node")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--skus", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=500)
+    parser.add_argument("--max-qty", type=int, default=3)
+    args = parser.parse_args()
+
+    skus = {
+        f"STRESS-{i:03d}": {"sku": f"STRESS-{i:03d}", "name": f"Stress Product {i}", "qty": args.stock}
+        for i in range(args.skus)
+    }
+
+    if args.live:
+        for sku, src in skus.items():
+            stock_service.client.index(index=INDEX, id=sku, body=src, refresh=True)
+        fake = None
+    else:
+        fake = FakeStockIndex(skus)
+        stock_service.client = fake
+
+    outcomes, sold, elapsed = run(skus, args.threads, args.orders, args.max_qty)
+
+    print(f"⏱️ {args.orders} orders on {args.threads} threads in {elapsed:.2f}s "
+          f"({args.orders / elapsed:,.0f} orders/s)")
+    print(f"📊 Outcomes: {outcomes}")
+    if fake:
+        print(f"🔁 Conflicts retried: {fake.conflicts}")
+
+    ok = outcomes["error"] == 0
+    for sku in skus:
+        remaining = StockService.get_by_sku(sku)["_source"]["qty"]
+        balanced = remaining + sold[sku] == args.stock
+        ok = ok and balanced and remaining >= 0
+        print(f"{'✅' if balanced and remaining >= 0 else '❌'} {sku}: sold {sold[sku]}, left {remaining}")
+
+    if args.live:
+        for sku in skus:
+            stock_service.client.delete(index=INDEX, id=sku, refresh=True)
+
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,28 @@ SHOPIFY_API_PASSWORD=""
 SHOPIFY_ACCESS_TOKEN=""
 SHOPIFY_STORE_NAME=""
 API_VERSION="2025-01"
+# Sync fetches (services/shopify_client.py). Shopify's REST bucket holds 40
+# calls and leaks 2/s (Plus: 400 and 20/s); the client follows the
+# X-Shopify-Shop-Api-Call-Limit header and backs off on 429.
+SHOPIFY_MAX_CONCURRENCY = 8
+SHOPIFY_LEAK_RATE = 2.0
+SHOPIFY_TIMEOUT = 30
+SHOPIFY_MAX_RETRIES = 5
+# master_sync --mode auto: incremental runs (products changed since the last
+# checkpoint) with a full resync once this many hours have passed
+PRODUCT_FULL_SYNC_HOURS = 24
+# Full sync pipeline: actions per bulk request (and its size cap), and how
+# many Shopify pages may be fetched ahead of indexing
+SYNC_BULK_CHUNK = 500
+SYNC_BULK_MAX_BYTES = 10 * 1024 * 1024
+SYNC_PREFETCH_PAGES = 2
+# Incremental syncs look up collections per changed product (two calls each)
+# up to this many products; past that the full collections walk is cheaper
+SYNC_COLLECTIONS_LOOKUP_MAX = 100
+# Full syncs build a new versioned index and swap the alias to it (False:
+# write into the live index); older versions kept around for --rollback
+SYNC_FULL_REBUILD = True
+SYNC_KEEP_VERSIONS = 2
 
 # Index names
 INDEX_PRODUCTS = "frono_products"
@@ -18,15 +40,72 @@ INDEX_POLICIES = "frono_policies"
 INDEX_LEADS = "frono_leads"
 INDEX_SESSIONS = "frono_sessions"
 
+# Lead write-behind (optional): /lead acknowledges immediately and a
+# background flusher bulk-writes journaled leads to frono_leads.
+LEAD_WRITE_BEHIND = False
+LEAD_JOURNAL_PATH = "data/lead_journal.ndjson"
+LEAD_FLUSH_INTERVAL_MS = 500
+LEAD_FLUSH_MAX_RECORDS = 500
+LEAD_BUFFER_MAX = 10000
+
 # Llama configuration
 LLAMA_MODEL = "mistral:latest"
-LLAMA_API_URL = "http://127.0.0.1:11434/api/generate"
-LLAMA_MODEL = "mistral:latest"
+LLAMA_HOST = "http://127.0.0.1:11434"   # /api/generate and /api/chat live under this
 LLAMA_TIMEOUT = 120
+LLAMA_KEEP_ALIVE = "30m"                # keep the model loaded between requests
+LLAMA_MAX_CONNECTIONS = 20              # pooled keep-alive connections per process
+# Used by "small" generation profiles; point it at e.g. llama3.2:3b once pulled
+LLAMA_SMALL_MODEL = LLAMA_MODEL
+# Per-session KV reuse through /api/generate "context": a follow-up turn sends
+# only the new message and Ollama skips re-reading the conversation. Off by
+# default. /api/chat already reuses the stable system prefix, but Mistral's
+# chat template moves the system prompt into the last user message, so with
+# Mistral only this option avoids re-reading the whole prompt every turn.
+# A session starts over once its context passes LLAMA_CONTEXT_MAX_TOKENS.
+LLAMA_CONTEXT_REUSE = False
+LLAMA_CONTEXT_MAX_TOKENS = 3072
+LLAMA_CONTEXT_SESSIONS = 500            # contexts kept in memory (LRU)
 
 # GROQ Configuration (Fastest Inference)
 GROQ_API_KEY = ""  # <--- PASTE YOUR KEY HERE
 GROQ_MODEL = "llama-3.3-70b-versatile"  # Very fast and smart model
+GROQ_TIMEOUT = 30
+# Used by "small" generation profiles (greetings, goodbyes, intent fallback)
+GROQ_SMALL_MODEL = "llama-3.1-8b-instant"
+
+# List prices in USD per million tokens (input, output), for the
+# per-profile cost report. Unlisted models (local Ollama) count as free.
+LLM_PRICES = {
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+
+# LLM routing: providers are tried in this order, unhealthy ones are skipped.
+LLM_PROVIDERS = ["groq", "ollama"]
+# Hedged streaming: if no token has arrived after this many ms, start the
+# next provider as well and keep whichever streams first. 0 disables it.
+LLM_HEDGE_AFTER_MS = 0
+
+# Record / replay of LLM calls (llm/cassette.py): "record" saves every call
+# the router makes to LLM_CASSETTE_PATH, "replay" serves them from there with
+# no network or API key. Replayed delays are the recorded ones times
+# LLM_CASSETTE_SPEED (0 = no delays). "" = live calls only.
+LLM_CASSETTE_MODE = ""
+LLM_CASSETTE_PATH = "temp/llm_cassette.jsonl.gz"
+LLM_CASSETTE_SPEED = 1.0
+
+# LLM scheduler: in-flight LLM calls per process, and the Groq limits
+# assumed until its x-ratelimit-* headers arrive.
+LLM_MAX_CONCURRENCY = 16
+GROQ_RPM = 30
+GROQ_TPM = 12000
+
+# Generation cache: identical prompts for these intents share one
+# generation while in flight and reuse the reply for GENERATION_CACHE_TTL
+# seconds. Both can be overridden in Admin Config.
+GENERATION_CACHE_INTENTS = ["ABOUT_BRAND", "BROWSING", "PRODUCT_INFO", "POLICY_QUERY", "OUT_OF_DOMAIN"]
+GENERATION_CACHE_TTL = 60
+GENERATION_CACHE_MAX = 500
 
 # Bot configuration
 BOT_NAME = "Frono BuddyAI"
@@ -0,0 +1,87 @@
+import socket
+import threading
+from contextlib import contextmanager
+
+# ---------------------------------------------------
+# STREAM CANCELLATION ACROSS THREADS
+# ---------------------------------------------------
+# A generator can't be closed while another thread is blocked inside it,
+# and a stalled provider may not yield again until its timeout. The
+# router runs each hedged stream under a CancelScope; providers wrap the
+# time their response is open in `with on_cancel(...)`, and the router's
+# cancel() calls that closer from its own thread. The blocked read then
+# fails straight away and the stream thread unwinds.
+
+_local = threading.local()
+
+
+class CancelScope:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._closers = []
+        self.cancelled = False
+
+    def add(self, closer):
+        with self._lock:
+            if not self.cancelled:
+                self._closers.append(closer)
+                return
+        # Cancelled before the response opened: close it right away
+        _call(closer)
+
+    def remove(self, closer):
+        with self._lock:
+            if closer in self._closers:
+                self._closers.remove(closer)
+
+    def cancel(self):
+        # Closers run under the lock: once remove() returns, a response
+        # that went back to the pool can no longer be shut down
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            for closer in self._closers:
+                _call(closer)
+            self._closers = []
+
+
+def _call(closer):
+    try:
+        closer()
+    except Exception as e:
+        print(f"⚠️ Stream cancel failed: {e}")
+
+
+def abort_response(response):
+    """
+    Unblocks an httpx response read stuck in another thread. Closing the
+    response there would wait for that read; shutting the socket down
+    fails it at once (the broken connection is dropped from the pool).
+    """
+    stream = response.extensions.get("network_stream")
+    sock = stream.get_extra_info("socket") if stream else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def bind(scope: CancelScope | None):
+    """Sets the scope for streams opened by the current thread."""
+    _local.scope = scope
+
+
+@contextmanager
+def on_cancel(closer):
+    """Providers wrap the life of an open response; no-op outside a scope."""
+    scope = getattr(_local, "scope", None)
+    if scope is None:
+        yield
+        return
+    scope.add(closer)
+    try:
+        yield
+    finally:
+        scope.remove(closer)
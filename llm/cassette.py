@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+import orjson
+
+from config import LLM_CASSETTE_PATH, LLM_CASSETTE_SPEED
+from llm.errors import LLMError, LLMTimeout, LLMRateLimited, LLMUnavailable
+
+# ---------------------------------------------------
+# RECORD / REPLAY (offline LLM calls)
+# ---------------------------------------------------
+# A cassette is one JSON line per call (gzipped when the path ends in .gz):
+# the request, the tokens as they arrived, time to first token and the gaps
+# between tokens in ms, or the LLMError the call raised. Calls are matched
+# on provider, model, sampling settings and prompt / messages; identical
+# requests replay their recordings in order, the last one repeating.
+#
+# A request with no recording fails as LLMUnavailable, so the router falls
+# back exactly as it would with the provider down.
+_ERRORS = {cls.__name__: cls for cls in (LLMError, LLMTimeout, LLMRateLimited, LLMUnavailable)}
+
+
+def request_key(provider, prompt: str, system_prompt: str, profile: dict | None, messages: list | None) -> str:
+    request = {
+        "provider": provider.name,
+        "model": provider.model_for(profile),
+        "sampling": {k: profile[k] for k in ("max_tokens", "temperature", "stop")} if profile else None,
+        "messages": messages if messages is not None else [system_prompt, prompt],
+    }
+    return hashlib.sha1(orjson.dumps(request, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+class Cassette:
+    def __init__(self, path: str = LLM_CASSETTE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._calls = {}        # key -> [recording, ...]
+        self._served = {}       # key -> how many replayed so far
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if os.path.exists(path):
+            with _open(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        call = orjson.loads(line)
+                        self._calls.setdefault(call["key"], []).append(call)
+
+    def __len__(self) -> int:
+        return sum(len(calls) for calls in self._calls.values())
+
+    def record(self, call: dict):
+        line = orjson.dumps(call) + b"\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Append per call: a crashed run keeps what it recorded
+            with _open(self.path, "ab") as f:
+                f.write(line)
+            self._calls.setdefault(call["key"], []).append(call)
+            self.stats["recorded"] += 1
+
+    def next(self, key: str) -> dict | None:
+        with self._lock:
+            calls = self._calls.get(key)
+            if not calls:
+                self.stats["misses"] += 1
+                return None
+            n = self._served.get(key, 0)
+            self._served[key] = n + 1
+            self.stats["replayed"] += 1
+            return calls[min(n, len(calls) - 1)]
+
+    def rewind(self):
+        with self._lock:
+            self._served.clear()
+
+
+class CassetteProvider:
+    """
+    Wraps a GroqClient / LLaMAClient. mode "record" calls through and saves
+    each call; "replay" never touches the wrapped client, only its name and
+    models. Delays replay at `speed` times the recorded ones (0 = none).
+    """
+
+    def __init__(self, provider, cassette: Cassette, mode: str, speed: float = LLM_CASSETTE_SPEED):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.provider = provider
+        self.cassette = cassette
+        self.mode = mode
+        self.speed = speed
+        self.name = provider.name
+        self.model = provider.model
+        self.models = getattr(provider, "models", {})
+        self.max_tokens = getattr(provider, "max_tokens", 0)
+
+    def model_for(self, profile: dict | None) -> str:
+        return self.provider.model_for(profile)
+
+    def _sleep(self, ms: float):
+        if self.speed and ms > 0:
+            time.sleep(ms * self.speed / 1000)
+
+    # -----------------------------
+    # REPLAY
+    # -----------------------------
+    def _recording(self, key: str) -> dict:
+        call = self.cassette.next(key)
+        if call is None:
+            raise LLMUnavailable(f"{self.name}: no recording for request {key[:12]}", self.name)
+        return call
+
+    def _raise_recorded(self, call: dict):
+        error = call["error"]
+        cls = _ERRORS.get(error["type"], LLMError)
+        raise cls(error["message"], self.name, error.get("status"), error.get("retry_after"))
+
+    def _replay_stream(self, key: str):
+        call = self._recording(key)
+        if call["ttft_ms"] is not None:
+            self._sleep(call["ttft_ms"])
+        for i, token in enumerate(call["tokens"]):
+            if i:
+                self._sleep(call["gaps_ms"][i - 1])
+            yield token
+        if call.get("error"):
+            self._raise_recorded(call)
+
+    # -----------------------------
+    # RECORD
+    # -----------------------------
+    def _save(self, key: str, request: dict, kind: str, tokens: list, ttft: float | None,
+              gaps: list, total: float, error: LLMError | None = None):
+        call = {
+            "key": key,
+            "provider": self.name,
+            "model": self.model_for(request["profile"]),
+            "call": kind,
+            "request": request["messages"] if request["messages"] is not None
+            else {"system": request["system_prompt"], "prompt": request["prompt"]},
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "gaps_ms": [round(g * 1000, 1) for g in gaps],
+            "total_ms": round(total * 1000, 1),
+            "tokens": tokens,
+        }
+        if error is not None:
+            call["error"] = {
+                "type": type(error).__name__, "message": str(error),
+                "status": error.status, "retry_after": error.retry_after,
+            }
+        self.cassette.record(call)
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        key = request_key(self.provider, prompt, system_prompt, profile, messages)
+        if self.mode == "replay":
+            call = self._recording(key)
+            self._sleep(call["total_ms"])
+            if call.get("error"):
+                self._raise_recorded(call)
+            return "".join(call["tokens"]).strip()
+
+        request = {"prompt": prompt, "system_prompt": system_prompt, "profile": profile, "messages": messages}
+        start = time.perf_counter()
+        try:
+            reply = self.provider.generate(**request, session_id=session_id)
+        except LLMError as e:
+            self._save(key, request, "generate", [], None, [], time.perf_counter() - start, e)
+            raise
+        elapsed = time.perf_counter() - start
+        self._save(key, request, "generate", [reply], elapsed, [], elapsed)
+        return reply
+
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        key = request_key(self.provider, prompt, system_prompt, profile, messages)
+        if self.mode == "replay":
+            yield from self._replay_stream(key)
+            return
+
+        request = {"prompt": prompt, "system_prompt": system_prompt, "profile": profile, "messages": messages}
+        tokens, gaps = [], []
+        ttft = None
+        start = last = time.perf_counter()
+        stream = self.provider.stream(**request, session_id=session_id)
+        try:
+            for token in stream:
+                now = time.perf_counter()
+                if ttft is None:
+                    ttft = now - start
+                else:
+                    gaps.append(now - last)
+                last = now
+                tokens.append(token)
+                yield token
+        except LLMError as e:
+            # Partial tokens + the error: replays the mid-stream failure too
+            self._save(key, request, "stream", tokens, ttft, gaps, time.perf_counter() - start, e)
+            raise
+        finally:
+            # Closed early (client went away): nothing complete to record
+            stream.close()
+        self._save(key, request, "stream", tokens, ttft, gaps, time.perf_counter() - start)
+
+
+_cassette = None
+
+
+def wrap_providers(providers: list, mode: str) -> list:
+    """The router's providers behind the shared cassette at LLM_CASSETTE_PATH."""
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette()
+    verb = "Recording" if mode == "record" else f"Replaying ({len(_cassette)} calls on file)"
+    print(f"📼 {verb} LLM calls: {_cassette.path}")
+    return [CassetteProvider(p, _cassette, mode) for p in providers]
@@ -0,0 +1,26 @@
+class LLMError(Exception):
+    """Any failure talking to an LLM provider. generate() and stream() raise it the same way."""
+
+    def __init__(self, message: str, provider: str = "", status: int | None = None, retry_after: float | None = None):
+        super().__init__(message)
+        self.provider = provider
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class LLMRateLimited(LLMError):
+    pass
+
+
+class LLMUnavailable(LLMError):
+    """Connection refused / reset or a 5xx from the provider."""
+    pass
+
+
+class LLMStreamInterrupted(LLMError):
+    """A provider failed after some tokens were already streamed; the reply is truncated."""
+    pass
@@ -0,0 +1,219 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from admin.config_manager import ConfigManager
+from config import GENERATION_CACHE_INTENTS, GENERATION_CACHE_TTL, GENERATION_CACHE_MAX
+from services import stock_events
+
+# ---------------------------------------------------
+# POLICY (per intent, editable in Admin Config)
+# ---------------------------------------------------
+# generation_cache_intents_json: ["BROWSING", ...] turns the cache on for
+# those intents only. generation_cache_ttl: seconds a finished reply is kept.
+# Sessions in these stages always bypass it: their turns are personal.
+PERSONAL_STAGES = {"checkout", "converted", "completed", "failed"}
+PERSONAL_INTENTS = {"BUYING", "LEAD_SUBMISSION"}
+
+
+def _build_policy(config):
+    intents = config.get_json("generation_cache_intents_json", GENERATION_CACHE_INTENTS)
+    return {
+        "intents": frozenset(intents or []) - PERSONAL_INTENTS,
+        "ttl": config.get_int("generation_cache_ttl", GENERATION_CACHE_TTL),
+    }
+
+
+ConfigManager.register_derived("generation_cache_policy", _build_policy)
+
+
+def cacheable(intent: str, session: dict | None = None) -> bool:
+    policy = ConfigManager.derived("generation_cache_policy")
+    if intent not in policy["intents"] or policy["ttl"] <= 0:
+        return False
+    if session and (session.get("stage") in PERSONAL_STAGES or session.get("email")):
+        return False
+    return True
+
+
+def cache_key(system_prompt: str, prompt: str, model: str, profile: str) -> str:
+    h = hashlib.sha256()
+    for part in (system_prompt, prompt, model, profile):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _Flight:
+    """One generation in progress; any number of readers follow its tokens."""
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.tokens = []
+        self.done = False
+        self.failed = False
+        self.readers = 0
+        self.abandoned = False      # every reader left before it finished
+        self.cond = threading.Condition()
+
+    def join(self):
+        with self.cond:
+            self.readers += 1
+
+    def leave(self):
+        with self.cond:
+            self.readers -= 1
+            if self.readers <= 0 and not self.done:
+                self.abandoned = True
+
+    def follow(self):
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.tokens) and not self.done:
+                    self.cond.wait()
+                chunk = self.tokens[i:]
+                finished = self.done
+            i += len(chunk)
+            yield from chunk
+            if finished and i >= len(self.tokens):
+                return
+
+
+class GenerationCache:
+    """
+    Single-flight + short-TTL cache for identical generations.
+
+    The first request for a key starts the generation in a background
+    thread; concurrent requests for the same key read the same token
+    stream instead of calling the provider again. Finished replies are
+    served from memory for the policy TTL. Failed, interrupted (producer
+    raised after some tokens) or empty generations are never stored. A generation whose readers have all gone away is
+    stopped and not stored either.
+    """
+
+    def __init__(self, max_entries: int = GENERATION_CACHE_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._flights = {}              # key -> _Flight
+        self._done = OrderedDict()      # key -> (expires_at, prompt, text)
+        self.stats = {"hits": 0, "coalesced": 0, "misses": 0, "bypassed": 0, "invalidated": 0, "abandoned": 0}
+
+    def stream(self, key: str, prompt: str, producer, fallback: str | None = None):
+        """producer() -> iterator of tokens; only called on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._done.get(key)
+            if entry and entry[0] > now:
+                self._done.move_to_end(key)
+                self.stats["hits"] += 1
+                text = entry[2]
+                flight = None
+            else:
+                text = None
+                flight = self._flights.get(key)
+                if flight and not flight.abandoned:
+                    self.stats["coalesced"] += 1
+                else:
+                    self.stats["misses"] += 1
+                    flight = _Flight(prompt)
+                    self._flights[key] = flight
+                    threading.Thread(
+                        target=self._run, args=(key, flight, producer),
+                        name="llm-single-flight", daemon=True
+                    ).start()
+                flight.join()
+
+        if text is not None:
+            yield text
+            return
+
+        produced = False
+        try:
+            for token in flight.follow():
+                produced = True
+                yield token
+        finally:
+            # Closed early (client gone): the last reader out stops the flight
+            flight.leave()
+
+        if not produced and fallback is not None:
+            yield fallback
+
+    def generate(self, key: str, prompt: str, producer, fallback: str | None = None) -> str | None:
+        """Non-streaming variant: producer() -> full reply or None."""
+        def once():
+            reply = producer()
+            if reply:
+                yield reply
+
+        text = "".join(self.stream(key, prompt, once))
+        return text or fallback
+
+    def bypass(self):
+        self.stats["bypassed"] += 1
+
+    def _run(self, key: str, flight: _Flight, producer):
+        tokens = None
+        try:
+            tokens = producer()
+            for token in tokens:
+                if flight.abandoned:
+                    break
+                with flight.cond:
+                    flight.tokens.append(token)
+                    flight.cond.notify_all()
+        except Exception as e:
+            # Includes LLMStreamInterrupted: readers keep the partial reply,
+            # the cache doesn't
+            print(f"⚠️ Shared generation failed: {e}")
+            flight.failed = True
+        finally:
+            # Stops the provider stream if we broke out early
+            if tokens is not None:
+                tokens.close()
+            text = "".join(flight.tokens)
+            ttl = ConfigManager.derived("generation_cache_policy")["ttl"]
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if flight.abandoned:
+                    self.stats["abandoned"] += 1
+                elif text and not flight.failed:
+                    self._done[key] = (time.time() + ttl, flight.prompt, text)
+                    self._done.move_to_end(key)
+                    while len(self._done) > self.max_entries:
+                        self._done.popitem(last=False)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    # ------------------------------------------------
+    # INVALIDATION
+    # ------------------------------------------------
+    def clear(self):
+        with self._lock:
+            self._done.clear()
+
+    def on_stock_event(self, event: dict):
+        """Drops finished replies whose prompt mentions the product that changed."""
+        needles = [n for n in (event.get("name"), event.get("sku")) if n]
+        if not needles:
+            return
+        with self._lock:
+            stale = [
+                key for key, (_, prompt, _) in self._done.items()
+                if any(n in prompt for n in needles)
+            ]
+            for key in stale:
+                del self._done[key]
+            self.stats["invalidated"] += len(stale)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats, "entries": len(self._done), "in_flight": len(self._flights)}
+
+
+generation_cache = GenerationCache()
+stock_events.subscribe(generation_cache.on_stock_event)
@@ -1,59 +1,124 @@
+import groq
 from groq import Groq
-from config import GROQ_API_KEY, GROQ_MODEL
+from config import GROQ_API_KEY, GROQ_MODEL, GROQ_SMALL_MODEL, GROQ_TIMEOUT
+from llm.cancel import on_cancel, abort_response
+from llm.errors import LLMError, LLMTimeout, LLMRateLimited, LLMUnavailable
+from llm.scheduler import scheduler
+
+PROVIDER = "groq"
+
+
+def _translate(e: Exception) -> LLMError:
+    """Maps Groq SDK errors onto llm.errors so the router can act on them."""
+    if isinstance(e, groq.APITimeoutError):
+        return LLMTimeout(f"Groq timed out: {e}", PROVIDER)
+    if isinstance(e, groq.RateLimitError):
+        scheduler.observe_headers(PROVIDER, e.response.headers)
+        retry_after = e.response.headers.get("retry-after")
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        return LLMRateLimited(f"Groq rate limited: {e}", PROVIDER, 429, retry_after)
+    if isinstance(e, groq.APIConnectionError):
+        return LLMUnavailable(f"Groq unreachable: {e}", PROVIDER)
+    if isinstance(e, groq.InternalServerError):
+        return LLMUnavailable(f"Groq returned {e.status_code}", PROVIDER, e.status_code)
+    if isinstance(e, groq.APIStatusError):
+        return LLMError(f"Groq returned {e.status_code}: {e}", PROVIDER, e.status_code)
+    return LLMError(f"Groq error: {e}", PROVIDER)
+
 
 class GroqClient:
+    """
+    Same interface as LLaMAClient. Failures raise llm.errors.LLMError;
+    fallbacks are the router's job (see llm/router.py).
+    """
+
     def __init__(self):
-        # Initialize Groq client with the key from config
-        self.client = Groq(api_key=GROQ_API_KEY)
+        # Initialize Groq client with the key from config.
+        # No SDK retries: the router fails over faster than a backoff would.
+        self.client = Groq(api_key=GROQ_API_KEY, timeout=GROQ_TIMEOUT, max_retries=0)
         self.model = GROQ_MODEL
+        self.models = {"large": GROQ_MODEL, "small": GROQ_SMALL_MODEL}
+        self.max_tokens = 1024
+        self.name = PROVIDER
 
-    def generate(self, prompt: str, system_prompt: str = "") -> str:
+    def model_for(self, profile: dict | None) -> str:
+        return self.models.get(profile["model"], self.model) if profile else self.model
+
+    def _params(self, profile: dict | None, temperature: float) -> dict:
+        """Sampling settings from a generation profile (llm/profiles.py)."""
+        if profile is None:
+            return {"model": self.model, "temperature": temperature,
+                    "max_completion_tokens": self.max_tokens, "stop": None}
+        return {
+            "model": self.model_for(profile),
+            "temperature": profile["temperature"],
+            "max_completion_tokens": profile["max_tokens"],
+            "stop": profile["stop"] or None,
+        }
+
+    @staticmethod
+    def _messages(prompt: str, system_prompt: str, messages: list | None) -> list:
+        if messages is not None:
+            return messages
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _create(self, **kwargs):
+        # Raw response so the scheduler can follow x-ratelimit-* headers
+        raw = self.client.chat.completions.with_raw_response.create(**kwargs)
+        scheduler.observe_headers(PROVIDER, raw.headers)
+        return raw.parse()
+
+    def generate(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
         """
         Non-streaming generation (used for Intent Detection).
+        `messages` replaces prompt + system_prompt; session_id is unused
+        (Groq caches matching prompt prefixes by itself).
         """
         try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                model=self.model,
-                temperature=0.1,
-                max_completion_tokens=1024,
+            chat_completion = self._create(
+                messages=self._messages(prompt, system_prompt, messages),
                 top_p=1,
                 stream=False,
-                stop=None
+                **self._params(profile, 0.1)
             )
-            return chat_completion.choices[0].message.content.strip()
         except Exception as e:
-            print(f"Groq API Error: {e}")
-            return "BROWSING"
+            raise _translate(e) from e
+
+        return (chat_completion.choices[0].message.content or "").strip()
 
-    def stream(self, prompt: str, system_prompt: str = ""):
+    def stream(self, prompt: str = "", system_prompt: str = "", profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
         """
         Streaming generation (used for Chat Response).
         Matches the logic: chunk.choices[0].delta.content
         """
         try:
-            stream = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                model=self.model,
-                temperature=0.7, # Slightly higher for more natural chat
-                max_completion_tokens=1024,
+            stream = self._create(
+                messages=self._messages(prompt, system_prompt, messages),
                 top_p=1,
                 stream=True,
-                stop=None
+                **self._params(profile, 0.7)   # 0.7: slightly higher for more natural chat
             )
 
-            for chunk in stream:
-                # Safe access to delta content
-                content = chunk.choices[0].delta.content
-                if content:
-                    yield content
+            # Closing the generator early closes the HTTP response too; a
+            # cancelled hedge aborts it from the router's thread
+            with stream, on_cancel(lambda: abort_response(stream.response)):
+                for chunk in stream:
+                    # Safe access to delta content
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        yield content
 
+        except LLMError:
+            raise
         except Exception as e:
-            print(f"Groq Stream Error: {e}")
-            yield "I am currently experiencing high traffic. Please try again."
\ No newline at end of file
+            raise _translate(e) from e
@@ -1,7 +1,17 @@
-import requests
-from typing import Generator
-from config import LLAMA_API_URL, LLAMA_MODEL, LLAMA_TIMEOUT
-import json
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Iterator
+
+import httpx
+import orjson
+
+from config import (
+    LLAMA_HOST, LLAMA_MODEL, LLAMA_SMALL_MODEL, LLAMA_TIMEOUT,
+    LLAMA_KEEP_ALIVE, LLAMA_MAX_CONNECTIONS,
+    LLAMA_CONTEXT_REUSE, LLAMA_CONTEXT_MAX_TOKENS, LLAMA_CONTEXT_SESSIONS
+)
+from llm.cancel import on_cancel, abort_response
+from llm.errors import LLMError, LLMTimeout, LLMRateLimited, LLMUnavailable
 
 DEFAULT_SYSTEM_PROMPT = (
     "You are Frono’s official AI assistant.\n"
@@ -13,76 +23,312 @@ DEFAULT_SYSTEM_PROMPT = (
     "- Be concise and helpful."
 )
 
+PROVIDER = "ollama"
+
+# ---------------------------------------------------
+# SHARED HTTP CLIENTS (one pool per process)
+# ---------------------------------------------------
+# Every LLaMAClient reuses these, so requests ride warm keep-alive
+# connections instead of opening a socket per call.
+_LIMITS = httpx.Limits(
+    max_connections=LLAMA_MAX_CONNECTIONS,
+    max_keepalive_connections=LLAMA_MAX_CONNECTIONS,
+    keepalive_expiry=60
+)
+# Read timeout is per chunk: a stream that stalls between tokens fails
+# after LLAMA_TIMEOUT seconds instead of hanging.
+_TIMEOUT = httpx.Timeout(LLAMA_TIMEOUT, connect=5)
+_HEADERS = {"Content-Type": "application/json"}
+
+_sync_clients = {}     # host -> httpx.Client
+_async_clients = {}    # host -> httpx.AsyncClient
+_client_lock = threading.Lock()
+
+
+def _get_sync_client(host: str) -> httpx.Client:
+    client = _sync_clients.get(host)
+    if client is None:
+        with _client_lock:
+            client = _sync_clients.get(host)
+            if client is None:
+                client = httpx.Client(base_url=host, limits=_LIMITS, timeout=_TIMEOUT, headers=_HEADERS)
+                _sync_clients[host] = client
+    return client
+
+
+def _get_async_client(host: str) -> httpx.AsyncClient:
+    # Created lazily inside the running event loop (the app's)
+    client = _async_clients.get(host)
+    if client is None:
+        client = httpx.AsyncClient(base_url=host, limits=_LIMITS, timeout=_TIMEOUT, headers=_HEADERS)
+        _async_clients[host] = client
+    return client
+
+
+def close_clients():
+    with _client_lock:
+        for client in _sync_clients.values():
+            client.close()
+        _sync_clients.clear()
+
+
+async def aclose_clients():
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+
+
+# ---------------------------------------------------
+# NDJSON DECODING
+# ---------------------------------------------------
+def _iter_ndjson(chunks: Iterator[bytes]) -> Iterator[dict]:
+    """Splits raw bytes on newlines and decodes each line with orjson."""
+    buf = b""
+    for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode(line)
+    if buf.strip():
+        yield _decode(buf)
+
+
+async def _aiter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict]:
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _decode(line)
+    if buf.strip():
+        yield _decode(buf)
+
+
+def _decode(line: bytes) -> dict:
+    try:
+        data = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise LLMError(f"Bad response line from Ollama: {line[:200]!r}", PROVIDER) from e
+    if data.get("error"):
+        raise LLMError(str(data["error"]), PROVIDER)
+    return data
+
+
+def _token(data: dict) -> str:
+    # /api/generate sends "response", /api/chat sends "message.content"
+    if "message" in data:
+        return data["message"].get("content", "")
+    return data.get("response", "")
+
+
+# ---------------------------------------------------
+# PER-SESSION CONTEXT (LLAMA_CONTEXT_REUSE)
+# ---------------------------------------------------
+# (host, model, session_id) -> {"context": [...], "reply": str}. "context"
+# is what Ollama returned on the session's last done line; "reply" is the
+# text it was generated with, so a turn whose history doesn't end with that
+# reply (edited, cancelled, another worker answered) starts over.
+_contexts = OrderedDict()
+_contexts_lock = threading.Lock()
+context_stats = {"reused": 0, "fresh": 0, "reset": 0}
+
+
+def _render_turns(messages: list) -> str:
+    """Chat messages as one /api/generate prompt (system messages excluded)."""
+    parts = []
+    for m in messages:
+        if m["role"] == "user":
+            parts.append(f"Customer: {m['content']}")
+        elif m["role"] == "assistant":
+            parts.append(f"Assistant: {m['content']}")
+    return "\n\n".join(parts)
+
+
+def _same_reply(history_reply: str, stored_reply: str) -> bool:
+    # History cuts long replies with "…" (agent/prompt_budget.fit_text)
+    history_reply = history_reply.strip()
+    if history_reply.endswith("…"):
+        return stored_reply.startswith(history_reply[:-1].rstrip())
+    return history_reply == stored_reply
+
+
+def _remember(key: tuple, data: dict, reply: str):
+    if not data.get("context"):
+        return
+    with _contexts_lock:
+        _contexts[key] = {"context": data["context"], "reply": reply.strip()}
+        _contexts.move_to_end(key)
+        while len(_contexts) > LLAMA_CONTEXT_SESSIONS:
+            _contexts.popitem(last=False)
+
+
+def _raise_for_status(response: httpx.Response):
+    if response.status_code < 400:
+        return
+    status = response.status_code
+    if status == 429:
+        raise LLMRateLimited("Ollama is overloaded", PROVIDER, status)
+    if status >= 500:
+        raise LLMUnavailable(f"Ollama returned {status}", PROVIDER, status)
+    raise LLMError(f"Ollama returned {status}", PROVIDER, status)
+
+
+def _translate(e: httpx.HTTPError) -> LLMError:
+    if isinstance(e, httpx.TimeoutException):
+        return LLMTimeout(f"Ollama timed out: {e!r}", PROVIDER)
+    return LLMUnavailable(f"Ollama request failed: {e!r}", PROVIDER)
+
 
 class LLaMAClient:
-    def __init__(self):
-        self.url = LLAMA_API_URL
-        self.model = LLAMA_MODEL
+    """
+    Ollama client over the shared keep-alive pool.
+
+    Pass `prompt` (+ `system_prompt`) for /api/generate, or `messages`
+    ([{"role", "content"}, ...]) for /api/chat. Every method raises
+    LLMError on failure; none of them return canned error text.
+    """
+
+    def __init__(self, model: str = LLAMA_MODEL, keep_alive: str = LLAMA_KEEP_ALIVE, host: str = LLAMA_HOST):
+        self.model = model
+        self.models = {"large": model, "small": LLAMA_SMALL_MODEL if model == LLAMA_MODEL else model}
+        self.host = host
+        self.max_tokens = 300
+        self.keep_alive = keep_alive
+        self.context_reuse = LLAMA_CONTEXT_REUSE
+        self.name = PROVIDER
+
+    def model_for(self, profile: dict | None) -> str:
+        return self.models.get(profile["model"], self.model) if profile else self.model
+
+    def _session_request(self, messages: list, model: str, session_id: str, stream: bool, options: dict):
+        """/api/generate carrying the session's last context, or a fresh one to start it."""
+        key = (self.host, model, session_id)
+        with _contexts_lock:
+            stored = _contexts.get(key)
+
+        previous = [m for m in messages[:-1] if m["role"] == "assistant"]
+        if stored and previous and _same_reply(previous[-1]["content"], stored["reply"]) \
+                and len(stored["context"]) <= LLAMA_CONTEXT_MAX_TOKENS:
+            context_stats["reused"] += 1
+            # The context already holds the system prompt and every earlier turn
+            return "/api/generate", {
+                "model": model,
+                "prompt": messages[-1]["content"],
+                "context": stored["context"],
+                "stream": stream,
+                "keep_alive": self.keep_alive,
+                "options": options
+            }, key
 
-    def _build_payload(self, prompt: str, system_prompt: str, stream: bool):
-        return {
-            "model": self.model,
+        context_stats["reset" if stored else "fresh"] += 1
+        return "/api/generate", {
+            "model": model,
+            "prompt": _render_turns(messages),
+            "system": "\n\n".join(m["content"] for m in messages if m["role"] == "system"),
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": options
+        }, key
+
+    def _build_request(self, prompt: str, system_prompt: str, stream: bool, messages: list | None = None,
+                       profile: dict | None = None, session_id: str | None = None):
+        """(path, payload, session key to store the returned context under or None)."""
+        options = {
+            "num_predict": self.max_tokens,       # <--- CHANGED from 120 to 300
+            "temperature": 0.3,       # Slightly higher for better flow
+            "top_p": 0.9,
+            "repeat_penalty": 1.1
+        }
+        model = self.model
+        if profile is not None:
+            model = self.model_for(profile)
+            options["num_predict"] = profile["max_tokens"]
+            options["temperature"] = profile["temperature"]
+            if profile["stop"]:
+                options["stop"] = profile["stop"]
+
+        if messages is not None and session_id and self.context_reuse:
+            return self._session_request(messages, model, session_id, stream, options)
+
+        if messages is not None:
+            if system_prompt and not any(m.get("role") == "system" for m in messages):
+                messages = [{"role": "system", "content": system_prompt}] + list(messages)
+            return "/api/chat", {
+                "model": model,
+                "messages": messages,
+                "stream": stream,
+                "keep_alive": self.keep_alive,
+                "options": options
+            }, None
+
+        return "/api/generate", {
+            "model": model,
             "prompt": prompt,
             "system": system_prompt or DEFAULT_SYSTEM_PROMPT,
             "stream": stream,
-            "options": {
-                "num_predict": 300,       # <--- CHANGED from 120 to 300
-                "temperature": 0.3,       # Slightly higher for better flow
-                "top_p": 0.9,
-                "repeat_penalty": 1.1
-            }
-        }
+            "keep_alive": self.keep_alive,
+            "options": options
+        }, None
+
     # -----------------------------
     # STANDARD (NON-STREAMING)
     # -----------------------------
-    def generate(self, prompt: str, system_prompt: str = "") -> str:
-        payload = self._build_payload(prompt, system_prompt, stream=False)
-
+    def generate(self, prompt: str = "", system_prompt: str = "", messages: list | None = None,
+                 profile: dict | None = None, session_id: str | None = None) -> str:
+        path, payload, key = self._build_request(prompt, system_prompt, False, messages, profile, session_id)
         try:
-            response = requests.post(
-                self.url,
-                json=payload,
-                timeout=LLAMA_TIMEOUT
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get("response", "").strip()
+            response = _get_sync_client(self.host).post(path, content=orjson.dumps(payload))
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
 
-        except requests.exceptions.Timeout:
-            return "Sorry — that took longer than expected. Please try again."
+        _raise_for_status(response)
+        data = _decode(response.content)
+        reply = _token(data).strip()
+        if key:
+            _remember(key, data, reply)
+        return reply
 
-        except requests.exceptions.RequestException:
-            return "I'm temporarily unavailable. Please try again later."
+    # -----------------------------
+    # STREAMING (sync)
+    # -----------------------------
+    def stream(self, prompt: str = "", system_prompt: str = "", messages: list | None = None,
+               profile: dict | None = None, session_id: str | None = None) -> Iterator[str]:
+        path, payload, key = self._build_request(prompt, system_prompt, True, messages, profile, session_id)
+        reply = ""
+        try:
+            with _get_sync_client(self.host).stream("POST", path, content=orjson.dumps(payload)) as response, \
+                    on_cancel(lambda: abort_response(response)):
+                _raise_for_status(response)
+                # Read to the end of the body (past "done") so the
+                # connection goes back to the pool instead of being closed
+                for data in _iter_ndjson(response.iter_bytes()):
+                    token = _token(data)
+                    if token:
+                        reply += token
+                        yield token
+                    if key and data.get("done"):
+                        _remember(key, data, reply)
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
 
     # -----------------------------
-    # STREAMING (STEP 9 READY)
+    # STREAMING (async)
     # -----------------------------
-    import json
-    import requests
-    from typing import Generator
-
-    def stream(self, prompt: str, system_prompt: str = ""):
-        payload = self._build_payload(prompt, system_prompt, stream=True)
-
-        with requests.post(
-            self.url,
-            json=payload,
-            stream=True,
-            timeout=LLAMA_TIMEOUT
-        ) as response:
-            response.raise_for_status()
-
-            for line in response.iter_lines(decode_unicode=True):
-                if not line:
-                    continue
-
-                try:
-                    data = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-
-                if "response" in data:
-                    yield data["response"]
-
-                if data.get("done") is True:
-                    break
+    async def astream(self, prompt: str = "", system_prompt: str = "", messages: list | None = None,
+                      profile: dict | None = None, session_id: str | None = None) -> AsyncIterator[str]:
+        path, payload, key = self._build_request(prompt, system_prompt, True, messages, profile, session_id)
+        reply = ""
+        try:
+            async with _get_async_client(self.host).stream("POST", path, content=orjson.dumps(payload)) as response:
+                _raise_for_status(response)
+                async for data in _aiter_ndjson(response.aiter_bytes()):
+                    token = _token(data)
+                    if token:
+                        reply += token
+                        yield token
+                    if key and data.get("done"):
+                        _remember(key, data, reply)
+        except httpx.HTTPError as e:
+            raise _translate(e) from e
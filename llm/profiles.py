@@ -0,0 +1,162 @@
+import threading
+
+from admin.config_manager import ConfigManager
+from config import LLM_PRICES
+
+# ---------------------------------------------------
+# GENERATION PROFILES (per intent)
+# ---------------------------------------------------
+# "model" is a tier, not a model name: each provider maps "small" and
+# "large" onto its own models (GroqClient.models, LLaMAClient.models).
+# Override any field from Admin Config with generation_profiles_json,
+# e.g. {"CLOSING": {"model": "large"}, "SUPPORT": {"max_tokens": 500}}.
+MODEL_TIERS = ("small", "large")
+
+# The assistant must not carry on the transcript by itself
+DEFAULT_STOP = ["\nUser:", "\nCustomer:"]
+
+DEFAULT_PROFILES = {
+    # Facts, prices and stock: keep the big model
+    "PRODUCT_INFO": {"model": "large", "max_tokens": 400, "temperature": 0.4},
+    "SUPPORT": {"model": "large", "max_tokens": 400, "temperature": 0.3},
+    "BUYING": {"model": "large", "max_tokens": 250, "temperature": 0.3},
+    "AFFIRMATION": {"model": "large", "max_tokens": 250, "temperature": 0.5},
+    # Short, formulaic replies
+    "ABOUT_BRAND": {"model": "small", "max_tokens": 200, "temperature": 0.5},
+    "BROWSING": {"model": "small", "max_tokens": 200, "temperature": 0.6},
+    "CLOSING": {"model": "small", "max_tokens": 60, "temperature": 0.5},
+    "LEAD_SUBMISSION": {"model": "small", "max_tokens": 120, "temperature": 0.3},
+    "OUT_OF_DOMAIN": {"model": "small", "max_tokens": 80, "temperature": 0.3},
+    # Internal calls
+    "INTENT_FALLBACK": {"model": "small", "max_tokens": 10, "temperature": 0.0, "stop": ["\n"]},
+    "SUMMARY": {"model": "small", "max_tokens": 160, "temperature": 0.2, "stop": []},
+    "default": {"model": "large", "max_tokens": 400, "temperature": 0.7},
+}
+
+
+def _clean(name: str, fields: dict, base: dict) -> dict:
+    profile = {**base, **fields, "name": name}
+    if profile["model"] not in MODEL_TIERS:
+        print(f"Unknown model tier for profile {name}: {profile['model']!r}, using large")
+        profile["model"] = "large"
+    try:
+        profile["max_tokens"] = max(int(profile["max_tokens"]), 1)
+        profile["temperature"] = float(profile["temperature"])
+    except (TypeError, ValueError):
+        print(f"Ignoring bad numbers in profile {name}: {fields!r}")
+        profile["max_tokens"], profile["temperature"] = base["max_tokens"], base["temperature"]
+    profile["stop"] = [str(s) for s in (profile.get("stop") or [])][:4]  # APIs allow 4
+    return profile
+
+
+def _build_profiles(config):
+    base = {"stop": DEFAULT_STOP, **DEFAULT_PROFILES["default"]}
+    raw = {name: dict(fields) for name, fields in DEFAULT_PROFILES.items()}
+
+    overrides = config.get_json("generation_profiles_json", {}) or {}
+    for name, fields in overrides.items():
+        if isinstance(fields, dict):
+            raw.setdefault(name, {}).update(fields)
+        else:
+            print(f"Ignoring generation profile for {name}: {fields!r}")
+
+    default = _clean("default", raw.pop("default"), base)
+    profiles = {name: _clean(name, fields, default) for name, fields in raw.items()}
+    profiles["default"] = default
+    return profiles
+
+
+ConfigManager.register_derived("generation_profiles", _build_profiles)
+
+
+def profile_for(intent: str) -> dict:
+    profiles = ConfigManager.derived("generation_profiles")
+    return profiles.get(intent, profiles["default"])
+
+
+# ---------------------------------------------------
+# LATENCY / COST REPORT
+# ---------------------------------------------------
+def _cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD at list price; models without a price (local Ollama) are free."""
+    price_in, price_out = LLM_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+class ProfileStats:
+    """
+    Per-profile calls, latency and spend. `saved_usd` is what the same
+    tokens would have cost on the provider's large model minus what they
+    did cost; `saved_ms_per_call` estimates the latency saved the same way, from
+    the measured TTFT and per-token speed of each model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self._models = {}       # "provider:model" -> timings
+
+    def record(self, profile: dict, provider, prompt_tokens: int, completion_tokens: int,
+               ttft: float | None, total: float):
+        model = provider.model_for(profile)
+        large = provider.model_for({"model": "large"})
+        key = f"{provider.name}:{model}"
+        with self._lock:
+            s = self._profiles.setdefault(profile["name"], {
+                "calls": 0, "total_ms": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+                "cost_usd": 0.0, "baseline_usd": 0.0, "models": {}, "large": {},
+            })
+            s["calls"] += 1
+            s["total_ms"] += total * 1000
+            s["prompt_tokens"] += prompt_tokens
+            s["completion_tokens"] += completion_tokens
+            s["cost_usd"] += _cost(model, prompt_tokens, completion_tokens)
+            s["baseline_usd"] += _cost(large, prompt_tokens, completion_tokens)
+            s["models"][key] = s["models"].get(key, 0) + 1
+            s["large"][key] = f"{provider.name}:{large}"
+
+            m = self._models.setdefault(key, {"calls": 0, "ttft_ms": 0.0, "gen_ms": 0.0, "tokens": 0})
+            m["calls"] += 1
+            m["ttft_ms"] += (ttft if ttft is not None else total) * 1000
+            m["gen_ms"] += (total - (ttft or total)) * 1000
+            m["tokens"] += completion_tokens
+
+    def _speed(self, key: str):
+        """(avg TTFT ms, ms per completion token) or None if never measured."""
+        m = self._models.get(key)
+        if not m:
+            return None
+        return m["ttft_ms"] / m["calls"], m["gen_ms"] / max(m["tokens"], 1)
+
+    def report(self) -> dict:
+        with self._lock:
+            profiles = {}
+            for name, s in self._profiles.items():
+                avg_tokens = s["completion_tokens"] / s["calls"]
+                saved_ms = 0.0
+                for key, calls in s["models"].items():
+                    mine, large = self._speed(key), self._speed(s["large"][key])
+                    if mine and large and key != s["large"][key]:
+                        saved_ms += calls * (large[0] - mine[0] + avg_tokens * (large[1] - mine[1]))
+                profiles[name] = {
+                    "calls": s["calls"],
+                    "avg_total_ms": round(s["total_ms"] / s["calls"], 1),
+                    "saved_ms_per_call": round(saved_ms / s["calls"], 1),
+                    "prompt_tokens": s["prompt_tokens"],
+                    "completion_tokens": s["completion_tokens"],
+                    "cost_usd": round(s["cost_usd"], 6),
+                    "saved_usd": round(s["baseline_usd"] - s["cost_usd"], 6),
+                    "models": dict(s["models"]),
+                }
+            models = {
+                key: {
+                    "calls": m["calls"],
+                    "avg_ttft_ms": round(m["ttft_ms"] / m["calls"], 1),
+                    "ms_per_token": round(m["gen_ms"] / max(m["tokens"], 1), 2),
+                }
+                for key, m in self._models.items()
+            }
+            return {"profiles": profiles, "models": models}
+
+
+profile_stats = ProfileStats()
@@ -0,0 +1,381 @@
+import threading
+import time
+from queue import Queue, Empty
+
+from config import LLM_PROVIDERS, LLM_HEDGE_AFTER_MS, LLM_CASSETTE_MODE
+from llm import cancel
+from llm.errors import LLMRateLimited, LLMStreamInterrupted
+from llm.profiles import profile_stats
+from llm.scheduler import scheduler as default_scheduler, LLMOverloaded, NORMAL
+
+FALLBACK_REPLY = "I am currently experiencing high traffic. Please try again."
+
+# Cool-down after a failure: doubles per consecutive failure up to the cap.
+# Rate limits use the provider's Retry-After when it sends one.
+COOLDOWN_BASE = 2
+COOLDOWN_MAX = 60
+TTFT_ALPHA = 0.2
+
+
+def _tokens(text: str) -> int:
+    # ~4 characters per token, same estimate as agent/prompt_budget.py
+    return (len(text) + 3) // 4
+
+
+class ProviderHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.open_until = 0.0
+        self.ttft_ms = None         # EWMA of time to first token
+        self.last_error = None
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def available(self, now: float | None = None) -> bool:
+        return (now or time.time()) >= self.open_until
+
+    def record_success(self, ttft: float | None = None):
+        with self._lock:
+            self.requests += 1
+            self.failures = 0
+            self.open_until = 0.0
+            if ttft is not None:
+                ms = ttft * 1000
+                self.ttft_ms = ms if self.ttft_ms is None else (1 - TTFT_ALPHA) * self.ttft_ms + TTFT_ALPHA * ms
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.failures += 1
+            self.last_error = str(error)
+            if isinstance(error, LLMRateLimited) and error.retry_after:
+                cooldown = error.retry_after
+            else:
+                cooldown = COOLDOWN_BASE * 2 ** (self.failures - 1)
+            self.open_until = time.time() + min(cooldown, COOLDOWN_MAX)
+
+    def as_dict(self) -> dict:
+        return {
+            "available": self.available(),
+            "consecutive_failures": self.failures,
+            "open_for_s": round(max(self.open_until - time.time(), 0), 1),
+            "ttft_ms": round(self.ttft_ms, 1) if self.ttft_ms is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+class LLMRouter:
+    """
+    Drop-in for GroqClient / LLaMAClient over several providers.
+
+    Providers are tried in configured order, those in cool-down after the
+    ready ones (soonest recovery first): a cooling provider is only called
+    once every ready one has failed, as a last resort before `fallback`.
+    A provider that fails before its first token is failed over; one that
+    fails mid-stream ends the reply (tokens already sent can't be taken
+    back). When every provider fails, callers get `fallback` instead of an exception
+    (nothing at all from stream() when fallback is None). With
+    fallback=None a mid-stream failure raises LLMStreamInterrupted after
+    the partial reply, so callers that keep replies (generation_cache)
+    can tell it from a finished one.
+
+    With hedge_after_ms set, stream() starts the next provider too if the
+    current one hasn't produced a token by then, keeps whichever streams
+    first and cancels the other: its response is aborted (llm/cancel.py)
+    and its scheduler slot freed at once, even while it is stalled.
+
+    `profile` (llm/profiles.py) picks each provider's model tier, max tokens,
+    temperature and stop sequences; calls made with one are timed and
+    costed in profile_stats. `messages` (chat format, see
+    agent/rag_prompt.py) replaces prompt + system_prompt when given;
+    `session_id` lets a provider keep per-session state (Ollama context).
+    """
+
+    def __init__(self, providers: list, hedge_after_ms: int = 0, scheduler=None):
+        self.providers = providers
+        self.scheduler = scheduler or default_scheduler
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms else None
+        self.health = {p.name: ProviderHealth(p.name) for p in providers}
+        # Identifies what answers a prompt (for cache keys)
+        self.model_key = "|".join(f"{p.name}:{getattr(p, 'model', '')}" for p in providers)
+        self.stats = {"failovers": 0, "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "shed": 0}
+
+    def _ordered(self) -> list:
+        """Available providers in configured order, then the rest by soonest recovery."""
+        now = time.time()
+        ready = [p for p in self.providers if self.health[p.name].available(now)]
+        cooling = sorted(
+            (p for p in self.providers if not self.health[p.name].available(now)),
+            key=lambda p: self.health[p.name].open_until
+        )
+        return ready + cooling
+
+    @staticmethod
+    def _call(prompt: str, system_prompt: str, profile: dict | None, messages: list | None,
+              session_id: str | None) -> dict:
+        """Provider keyword arguments, plus the prompt size estimate under "_tokens"."""
+        text = "".join(m["content"] for m in messages) if messages else prompt + system_prompt
+        return {
+            "prompt": prompt, "system_prompt": system_prompt, "profile": profile,
+            "messages": messages, "session_id": session_id, "_tokens": _tokens(text),
+        }
+
+    def _acquire(self, provider, priority: int, call: dict):
+        """Waits for a scheduler slot; raises LLMOverloaded when shed."""
+        profile = call["profile"]
+        max_tokens = profile["max_tokens"] if profile else getattr(provider, "max_tokens", 0)
+        return self.scheduler.acquire(provider.name, priority, call["_tokens"] + max_tokens)
+
+    def _invoke(self, provider, method: str, call: dict):
+        return getattr(provider, method)(**{k: v for k, v in call.items() if k != "_tokens"})
+
+    def _record(self, provider, call: dict, reply_chars: int, ttft: float | None, total: float):
+        if call["profile"] is not None:
+            profile_stats.record(
+                call["profile"], provider, call["_tokens"], (reply_chars + 3) // 4, ttft, total
+            )
+
+    def _shed(self, provider, error: LLMOverloaded):
+        # Not a provider failure: just move on (downgrade) or fall back
+        self.stats["shed"] += 1
+        print(f"🚦 {provider.name}: {error}")
+
+    def health_report(self) -> dict:
+        return {
+            "providers": {name: h.as_dict() for name, h in self.health.items()},
+            "hedge_after_ms": int(self.hedge_after * 1000) if self.hedge_after else 0,
+            **self.stats
+        }
+
+    # -----------------------------
+    # STANDARD (NON-STREAMING)
+    # -----------------------------
+    def generate(self, prompt: str = "", system_prompt: str = "", fallback: str = FALLBACK_REPLY,
+                 priority: int = NORMAL, profile: dict | None = None,
+                 messages: list | None = None, session_id: str | None = None) -> str:
+        call = self._call(prompt, system_prompt, profile, messages, session_id)
+        for i, provider in enumerate(self._ordered()):
+            if i:
+                self.stats["failovers"] += 1
+            try:
+                release = self._acquire(provider, priority, call)
+            except LLMOverloaded as e:
+                self._shed(provider, e)
+                continue
+            start = time.time()
+            try:
+                reply = self._invoke(provider, "generate", call)
+            except Exception as e:
+                print(f"⚠️ LLM {provider.name} failed: {e}")
+                self.health[provider.name].record_failure(e)
+                continue
+            finally:
+                release()
+            elapsed = time.time() - start
+            self.health[provider.name].record_success(elapsed)
+            self._record(provider, call, len(reply or ""), None, elapsed)
+            return reply
+
+        self.stats["fallbacks"] += 1
+        return fallback
+
+    # -----------------------------
+    # STREAMING
+    # -----------------------------
+    def stream(self, prompt: str = "", system_prompt: str = "", fallback: str = FALLBACK_REPLY,
+               priority: int = NORMAL, profile: dict | None = None,
+               messages: list | None = None, session_id: str | None = None):
+        call = self._call(prompt, system_prompt, profile, messages, session_id)
+        if self.hedge_after and len(self.providers) > 1:
+            yield from self._hedged_stream(call, fallback, priority)
+        else:
+            yield from self._failover_stream(call, fallback, priority)
+
+    def _failover_stream(self, call: dict, fallback: str, priority: int):
+        for i, provider in enumerate(self._ordered()):
+            if i:
+                self.stats["failovers"] += 1
+            try:
+                release = self._acquire(provider, priority, call)
+            except LLMOverloaded as e:
+                self._shed(provider, e)
+                continue
+            health = self.health[provider.name]
+            start = time.time()
+            ttft = None
+            chars = 0
+            stream = self._invoke(provider, "stream", call)
+            try:
+                for token in stream:
+                    if ttft is None:
+                        ttft = time.time() - start
+                    chars += len(token)
+                    yield token
+            except Exception as e:
+                print(f"⚠️ LLM {provider.name} stream failed: {e}")
+                health.record_failure(e)
+                if ttft is None:
+                    continue
+                if fallback is None:
+                    raise LLMStreamInterrupted(f"{provider.name} failed mid-stream: {e}", provider.name) from e
+                return
+            finally:
+                # Also runs when our caller closes us: ends the provider's HTTP stream
+                stream.close()
+                release()
+            health.record_success(ttft)
+            self._record(provider, call, chars, ttft, time.time() - start)
+            return
+
+        self.stats["fallbacks"] += 1
+        if fallback is not None:
+            yield fallback
+
+    def _hedged_stream(self, call: dict, fallback: str, priority: int):
+        candidates = self._ordered()
+        events = Queue()
+        running = {}                # provider name -> CancelScope
+        winner = None
+
+        def run(provider, scope: cancel.CancelScope):
+            # Cancelling closes the open response from the controlling
+            # thread and frees the slot at once, even mid-stall
+            cancel.bind(scope)
+            try:
+                release = self._acquire(provider, priority, call)
+            except LLMOverloaded as e:
+                events.put((provider, "error", e))
+                return
+            scope.add(release)
+            if scope.cancelled:
+                return
+            stream = self._invoke(provider, "stream", call)
+            try:
+                for token in stream:
+                    if scope.cancelled:
+                        break
+                    events.put((provider, "token", token))
+                events.put((provider, "done", None))
+            except Exception as e:
+                events.put((provider, "error", e))
+            finally:
+                stream.close()
+                release()
+                cancel.bind(None)
+
+        def launch():
+            provider = candidates.pop(0)
+            starts[provider.name] = time.time()
+            running[provider.name] = cancel.CancelScope()
+            threading.Thread(
+                target=run,
+                args=(provider, running[provider.name]),
+                name=f"llm-{provider.name}",
+                daemon=True
+            ).start()
+
+        starts = {}
+        first = candidates[0].name
+        ttft = None
+        chars = 0
+        launch()
+
+        try:
+            while running:
+                # Before a winner exists, wake up in time to hedge
+                timeout = self.hedge_after if winner is None and candidates else None
+                try:
+                    provider, kind, value = events.get(timeout=timeout)
+                except Empty:
+                    self.stats["hedges"] += 1
+                    print(f"🦔 No token after {self.hedge_after * 1000:.0f}ms, hedging with {candidates[0].name}")
+                    launch()
+                    continue
+
+                name = provider.name
+                if winner is not None and name != winner:
+                    if kind != "token":
+                        running.pop(name, None)
+                    continue
+
+                if kind == "token":
+                    if winner is None:
+                        winner = name
+                        ttft = time.time() - starts[name]
+                        self.health[name].record_success(ttft)
+                        if name != first:
+                            self.stats["hedge_wins"] += 1
+                        # Cancel the losers
+                        for other, scope in running.items():
+                            if other != name:
+                                scope.cancel()
+                    chars += len(value)
+                    yield value
+                    continue
+
+                running.pop(name, None)
+
+                if kind == "done":
+                    if winner is None:
+                        # Finished without a single token: treat as an empty reply
+                        self.health[name].record_success()
+                    self._record(provider, call, chars, ttft, time.time() - starts[name])
+                    return
+
+                # kind == "error"
+                if isinstance(value, LLMOverloaded):
+                    self._shed(provider, value)
+                else:
+                    print(f"⚠️ LLM {name} stream failed: {value}")
+                    self.health[name].record_failure(value)
+                if winner is not None:
+                    if fallback is None:
+                        raise LLMStreamInterrupted(f"{name} failed mid-stream: {value}", name) from value
+                    return
+                if not running and candidates:
+                    self.stats["failovers"] += 1
+                    launch()
+
+            self.stats["fallbacks"] += 1
+            if fallback is not None:
+                yield fallback
+        finally:
+            # Caller went away or we finished: stop every stream still running
+            for scope in running.values():
+                scope.cancel()
+
+
+# ---------------------------------------------------
+# SHARED ROUTER
+# ---------------------------------------------------
+_router = None
+_router_lock = threading.Lock()
+
+
+def _make_provider(name: str):
+    if name == "groq":
+        from llm.groq_client import GroqClient
+        return GroqClient()
+    if name == "ollama":
+        from llm.llama_client import LLaMAClient
+        return LLaMAClient()
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+def get_router() -> LLMRouter:
+    """One router per process so every caller shares provider health."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                providers = [_make_provider(n) for n in LLM_PROVIDERS]
+                if LLM_CASSETTE_MODE:
+                    from llm.cassette import wrap_providers
+                    providers = wrap_providers(providers, LLM_CASSETTE_MODE)
+                _router = LLMRouter(providers, LLM_HEDGE_AFTER_MS)
+    return _router
@@ -0,0 +1,271 @@
+import itertools
+import re
+import threading
+import time
+
+from config import LLM_MAX_CONCURRENCY, GROQ_RPM, GROQ_TPM
+from llm.errors import LLMError
+
+# ---------------------------------------------------
+# PRIORITY CLASSES
+# ---------------------------------------------------
+# Lower number = served first.
+CRITICAL = 0      # checkout, order confirmation, lead submission
+NORMAL = 1        # product questions, support, policies
+LOW = 2           # browsing, greetings, goodbyes, intent fallback
+BACKGROUND = 3    # summaries, debug endpoints
+
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", LOW: "low", BACKGROUND: "background"}
+
+# How long each class may queue before it is shed (and the router moves on
+# to the next provider, i.e. downgrades, or falls back).
+# Kept short: waiting longer than the slower provider takes is a loss.
+MAX_WAIT = {CRITICAL: 3.0, NORMAL: 1.0, LOW: 0.25, BACKGROUND: 0.0}
+
+# Share of capacity each class must leave free for the classes above it.
+# LOW can't take the last 40% of a rate limit or concurrency; CRITICAL can
+# use everything.
+RESERVE = {CRITICAL: 0.0, NORMAL: 0.15, LOW: 0.4, BACKGROUND: 0.6}
+
+CRITICAL_INTENTS = {"BUYING", "LEAD_SUBMISSION"}
+CRITICAL_STAGES = {"checkout", "converted"}
+NORMAL_INTENTS = {"PRODUCT_INFO", "SUPPORT", "POLICY_QUERY", "AFFIRMATION"}
+
+
+def priority_for(intent: str, session: dict | None = None) -> int:
+    if intent in CRITICAL_INTENTS or (session and session.get("stage") in CRITICAL_STAGES):
+        return CRITICAL
+    if intent in NORMAL_INTENTS:
+        return NORMAL
+    return LOW
+
+
+class LLMOverloaded(LLMError):
+    """Shed by the scheduler; not the provider's fault, so not a health failure."""
+    pass
+
+
+# ---------------------------------------------------
+# RATE LIMITS (token buckets synced from headers)
+# ---------------------------------------------------
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+
+def parse_reset(value) -> float | None:
+    """'2m59.56s', '7.66s', '120ms' or plain seconds -> seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    m = _DURATION.match(value)
+    if not m or not any(m.groups()):
+        return None
+    h, mins, s, ms = (float(g) if g else 0.0 for g in m.groups())
+    return h * 3600 + mins * 60 + s + ms / 1000
+
+
+class RateBucket:
+    """
+    Capacity `limit`, refilling at limit/window per second. Provider headers
+    (remaining + time to reset) correct the local estimate whenever they
+    arrive: the bucket then refills from there to full by the reset.
+    """
+
+    def __init__(self, limit: float, window: float = 60):
+        self.limit = limit
+        self.window = window
+        self._base = limit              # level at _observed_at
+        self._observed_at = time.time()
+        self._rate = limit / window
+        self._spent = 0.0               # local spending since _observed_at
+        self._paused_until = 0.0
+
+    def available(self, now: float) -> float:
+        if now < self._paused_until:
+            return 0.0
+        level = min(self.limit, self._base + self._rate * (now - self._observed_at))
+        return level - self._spent
+
+    def spend(self, amount: float):
+        self._spent += amount
+
+    def observe(self, limit: float | None, remaining: float | None, reset: float | None):
+        if limit:
+            self.limit = limit
+        if remaining is None:
+            return
+        now = time.time()
+        # Calls we admitted may not have reached the provider yet, so a header
+        # can only lower our estimate, never raise it above local accounting.
+        local = min(self.limit, self._base + self._rate * (now - self._observed_at)) - self._spent
+        self._base = min(remaining, local)
+        self._observed_at = now
+        self._rate = (self.limit - remaining) / reset if reset else self.limit / self.window
+        self._spent = 0.0
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+class ProviderLimits:
+    def __init__(self, rpm: float | None = None, tpm: float | None = None):
+        self.requests = RateBucket(rpm) if rpm else None
+        self.tokens = RateBucket(tpm) if tpm else None
+
+    def fits(self, tokens: int, reserve: float, now: float) -> bool:
+        for bucket, need in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket and bucket.available(now) - need < bucket.limit * reserve:
+                return False
+        return True
+
+    def spend(self, tokens: int):
+        if self.requests:
+            self.requests.spend(1)
+        if self.tokens:
+            self.tokens.spend(tokens)
+
+
+# ---------------------------------------------------
+# SCHEDULER
+# ---------------------------------------------------
+class LLMScheduler:
+    """
+    Global concurrency cap + per-provider rate limits, served by priority.
+
+    acquire() blocks until the call may start and returns a release
+    callable, or raises LLMOverloaded once the class's MAX_WAIT has passed
+    (BACKGROUND never waits). A waiter only starts when no higher-priority
+    request for the same provider is queued ahead of it.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.limits = {}
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []          # [(priority, seq, provider)]
+        self._seq = itertools.count()
+        self.stats = {
+            name: {"started": 0, "shed": 0, "wait_ms": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    def set_limits(self, provider: str, rpm: float | None = None, tpm: float | None = None):
+        self.limits[provider] = ProviderLimits(rpm, tpm)
+
+    def _can_start(self, entry, provider: str, priority: int, tokens: int, now: float) -> bool:
+        ahead = any(
+            w[2] == provider and (w[0], w[1]) < (entry[0], entry[1])
+            for w in self._waiting
+        )
+        if ahead:
+            return False
+        if self._active >= self.max_concurrency * (1 - RESERVE[priority]):
+            return False
+        limits = self.limits.get(provider)
+        return limits is None or limits.fits(tokens, RESERVE[priority], now)
+
+    def acquire(self, provider: str, priority: int = NORMAL, tokens: int = 0):
+        start = time.time()
+        deadline = start + MAX_WAIT[priority]
+        entry = (priority, next(self._seq), provider)
+        stats = self.stats[PRIORITY_NAMES[priority]]
+
+        with self._cond:
+            self._waiting.append(entry)
+            try:
+                while True:
+                    now = time.time()
+                    if self._can_start(entry, provider, priority, tokens, now):
+                        self._active += 1
+                        if provider in self.limits:
+                            self.limits[provider].spend(tokens)
+                        stats["started"] += 1
+                        stats["wait_ms"] += (now - start) * 1000
+                        break
+                    if now >= deadline:
+                        stats["shed"] += 1
+                        raise LLMOverloaded(
+                            f"{PRIORITY_NAMES[priority]} request shed after {now - start:.1f}s",
+                            provider
+                        )
+                    # Buckets refill with time, so poll as well as wait for releases
+                    self._cond.wait(min(deadline - now, 0.05))
+            finally:
+                self._waiting.remove(entry)
+                self._cond.notify_all()
+
+        released = False
+
+        def release():
+            # Also called from the router's thread when a hedge is cancelled
+            nonlocal released
+            with self._cond:
+                if released:
+                    return
+                released = True
+                self._active -= 1
+                self._cond.notify_all()
+
+        return release
+
+    # ------------------------------------------------
+    # FEEDBACK FROM PROVIDERS
+    # ------------------------------------------------
+    def observe_headers(self, provider: str, headers):
+        """Syncs buckets from x-ratelimit-* headers (Groq / OpenAI style)."""
+        limits = self.limits.get(provider)
+        if not limits or headers is None:
+            return
+
+        def num(name):
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+
+        with self._cond:
+            if limits.tokens:
+                limits.tokens.observe(
+                    num("x-ratelimit-limit-tokens"),
+                    num("x-ratelimit-remaining-tokens"),
+                    parse_reset(headers.get("x-ratelimit-reset-tokens"))
+                )
+            if limits.requests:
+                remaining = num("x-ratelimit-remaining-requests")
+                # Groq's request headers are per day; only trust them when low
+                if remaining is not None and remaining < limits.requests.limit:
+                    limits.requests.observe(
+                        None, remaining, parse_reset(headers.get("x-ratelimit-reset-requests"))
+                    )
+            retry_after = parse_reset(headers.get("retry-after"))
+            if retry_after:
+                for bucket in (limits.requests, limits.tokens):
+                    if bucket:
+                        bucket.pause(retry_after)
+            self._cond.notify_all()
+
+    def report(self) -> dict:
+        now = time.time()
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "max_concurrency": self.max_concurrency,
+                "classes": {k: dict(v, wait_ms=round(v["wait_ms"], 1)) for k, v in self.stats.items()},
+                "providers": {
+                    name: {
+                        "requests_available": round(l.requests.available(now), 1) if l.requests else None,
+                        "tokens_available": round(l.tokens.available(now)) if l.tokens else None,
+                    }
+                    for name, l in self.limits.items()
+                },
+            }
+
+
+scheduler = LLMScheduler()
+scheduler.set_limits("groq", rpm=GROQ_RPM, tpm=GROQ_TPM)
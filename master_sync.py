@@ -1,34 +1,62 @@
-import requests
+import argparse
+import hashlib
 import json
 import re
-import shopify
-from opensearchpy import OpenSearch, helpers
+import threading
+from queue import Queue, Full
+from opensearchpy import OpenSearch, NotFoundError, helpers
 from config import (
-    SHOPIFY_ACCESS_TOKEN,
     SHOPIFY_STORE_NAME,
-    API_VERSION,
-    OPENSEARCH_HOST
+    OPENSEARCH_HOST,
+    PRODUCT_FULL_SYNC_HOURS,
+    SYNC_BULK_CHUNK,
+    SYNC_BULK_MAX_BYTES,
+    SYNC_PREFETCH_PAGES,
+    SYNC_COLLECTIONS_LOOKUP_MAX,
+    SYNC_FULL_REBUILD,
+    SYNC_KEEP_VERSIONS
 )
 import time
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+from services import sync_events, index_versions
+from services.shopify_client import ShopifyClient
 
 # ---------------- INITIALIZATION ----------------
-shopify.Session.setup(api_key=None, secret=None)
-session = shopify.Session(
-    f"{SHOPIFY_STORE_NAME}.myshopify.com",
-    API_VERSION,
-    SHOPIFY_ACCESS_TOKEN
-)
-shopify.ShopifyResource.activate_session(session)
-
 os_client = OpenSearch(
     hosts=[{"host": OPENSEARCH_HOST, "port": 9200}],
     http_compress=True
 )
 
+# Pooled, rate-limit-aware REST client for every fetch below
+shopify_client = ShopifyClient()
+
+# Aliases: full syncs build a new versioned index behind them (see
+# services/index_versions.py), everything else reads and writes through them
 PRODUCT_INDEX = "frono_products"
 FACTS_INDEX = "frono_site_facts"
 
+# Only read back by the sync (mget), never searched
+PRODUCT_PROPERTIES = {"content_hash": {"type": "keyword", "index": False, "doc_values": False}}
+
+# Run against a new version before it goes live: what the retriever asks most
+PRODUCT_WARMUP = [
+    {"size": 0, "aggs": {"collections": {"terms": {"field": "collection", "size": 100}}}},
+    {"size": 4, "query": {"bool": {"filter": [{"range": {"qty": {"gt": 0}}}]}}},
+    {"size": 5, "query": {"bool": {
+        "must": [{"multi_match": {"query": "garden heater", "fields": ["name^3", "description^2", "collection^2"],
+                                  "fuzziness": "AUTO"}}],
+        "filter": [{"range": {"qty": {"gt": 0}}}]
+    }}}
+]
+FACTS_WARMUP = [
+    {"size": 3, "query": {"multi_match": {"query": "delivery returns", "fields": ["title^3", "content^2", "type"],
+                                          "fuzziness": "AUTO"}}}
+]
+
+# Incremental runs re-read a little before the checkpoint (clock skew,
+# edits landing in the same second); reindexing is idempotent
+CHECKPOINT_OVERLAP = timedelta(minutes=2)
+
 # ---------------- HELPERS ----------------
 def log_time(label, start):
     elapsed = time.time() - start
@@ -41,167 +69,525 @@ def clean_html(raw_html):
 
 
 def fetch_collections_map():
-    collections_map = {}
-    headers = {"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN}
-    base = f"https://{SHOPIFY_STORE_NAME}.myshopify.com/admin/api/{API_VERSION}"
-
-    def paginate(url):
-        while url:
-            res = requests.get(url, headers=headers)
-            data = res.json()
-            link = res.headers.get("Link")
-            url = (
-                re.findall(r'<(.*?)>; rel="next"', link)[0]
-                if link and 'rel="next"' in link
-                else None
-            )
-            yield data
-
-    # 1️⃣ Fetch ALL collections
-    collections = []
-    for data in paginate(f"{base}/custom_collections.json?limit=250"):
-        collections.extend(data.get("custom_collections", []))
-
-    for data in paginate(f"{base}/smart_collections.json?limit=250"):
-        collections.extend(data.get("smart_collections", []))
-
-    # 2️⃣ Fetch ALL products per collection
-    for col in collections:
-        for data in paginate(f"{base}/collections/{col['id']}/products.json?limit=250"):
-            for p in data.get("products", []):
-                collections_map.setdefault(p["id"], []).append(col["title"])
+    # 1️⃣ Fetch ALL collections (custom + smart side by side)
+    list_start = time.time()
+    collections = shopify_client.list_collections()
+    log_time(f"Collections list ({len(collections)} collections)", list_start)
 
+    # 2️⃣ Fetch product ids per collection, several collections at once
+    products_start = time.time()
+    collections_map = shopify_client.collection_products_map(collections)
+    log_time(f"Collection products ({len(collections_map)} products)", products_start)
+
+    print(f"🛍️ Shopify calls so far: {shopify_client.report()}")
     return collections_map
 
 
-# ---------------- PRODUCT SYNC ----------------
-def sync_all_products():
-    total_start = time.time()
-    print(f"--- 🚀 Starting Full Product Sync for {SHOPIFY_STORE_NAME} ---")
-
-    collections_start = time.time()
-    collections_map = fetch_collections_map()
-    log_time("Collections map fetch", collections_start)
+# ---------------- PRODUCT DOCS ----------------
+def variant_docs(product, collections_map):
+    """One frono_products document per variant with a SKU."""
+    category = product.get("product_type") or "General"
+
+    # ✅ Shopify collections (dynamic, multi-valued)
+    collections = collections_map.get(product["id"], [])
+    if not collections:
+        collections = ["Other"]
+
+    raw_body = product.get("body_html") or ""
+    clean_description = clean_html(raw_body[:500])
+
+    docs = []
+    for variant in product.get("variants", []):
+        sku = variant.get("sku")
+        if not sku:
+            continue
+
+        qty = int(variant.get("inventory_quantity") or 0)
+        docs.append({
+            "sku": sku,
+            "product_id": product["id"],
+            "name": product["title"],
+            "category": category,
+            "collection": collections,  # ✅ ARRAY
+            "price": float(variant["price"]),
+            "qty": qty,
+            "in_stock": qty > 0,
+            "description": clean_description,
+            "updated_at": product["updated_at"]
+        })
+    for doc in docs:
+        doc["content_hash"] = content_hash(doc)
+    return docs
+
+
+def content_hash(doc):
+    """
+    Hash of everything a search can see in a variant document (name, price,
+    qty, collections, description, ...). updated_at is left out: it moves
+    on every product edit, even when this variant didn't change.
+    """
+    fields = {k: v for k, v in doc.items() if k not in ("updated_at", "content_hash")}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+def report_counts(counts):
+    print(f"📊 Documents: {counts['unchanged']} unchanged, {counts['updated']} updated, "
+          f"{counts['created']} created, {counts['deleted']} deleted.")
+
+
+def later(a, b):
+    """The later of two Shopify timestamps (either may be None)."""
+    if not a or not b:
+        return a or b
+    return a if datetime.fromisoformat(a) >= datetime.fromisoformat(b) else b
+
+
+def write_actions(actions, label):
+    """
+    Streams actions (any iterable, consumed lazily) through streaming_bulk.
+    Failures are printed as they come back and progress once per chunk;
+    a delete that finds nothing (404) is not a failure. True if none failed.
+    """
+    done = failed = 0
+    chunk_start = time.time()
+    for ok, item in helpers.streaming_bulk(
+        os_client,
+        actions,
+        chunk_size=SYNC_BULK_CHUNK,
+        max_chunk_bytes=SYNC_BULK_MAX_BYTES,
+        max_retries=3,
+        raise_on_error=False,
+        raise_on_exception=False
+    ):
+        op, result = next(iter(item.items()))
+        done += 1
+        if not ok and not (op == "delete" and result.get("status") == 404):
+            failed += 1
+            print(f"❌ {label}: {op} {result.get('_id')} failed ({result.get('status')}): "
+                  f"{json.dumps(result.get('error'))}")
+        if done % SYNC_BULK_CHUNK == 0:
+            print(f"💾 {label}: {done} actions, {failed} failed (+{time.time() - chunk_start:.2f}s)")
+            chunk_start = time.time()
+
+    print(f"✅ {label}: {done - failed} operations successful, {failed} failed.")
+    return failed == 0
+
+
+def publish_sync_event(stock_changes=(), reindexed=None):
+    """
+    Hands stock changes and alias swaps to the app workers through
+    frono_sync_events (this cron process has no stock_events subscribers).
+    A failure here must not fail the sync.
+    """
+    try:
+        sync_events.publish(os_client, stock_changes, reindexed)
+    except Exception as e:
+        print(f"❌ Could not publish sync event: {e}")
+        return
+    if stock_changes:
+        print(f"📣 Published {len(stock_changes)} stock changes.")
+    if reindexed:
+        print(f"📣 Published the {reindexed} alias swap.")
+
+
+def publish_stock_changes(stock_changes):
+    # Notify open chats in the app workers
+    if stock_changes:
+        publish_sync_event(stock_changes)
+
+
+def execute_actions(actions, stock_changes):
+    """Writes a (small) list of actions, then publishes stock changes. True if nothing failed."""
+    if not actions:
+        print("✅ Nothing to write.")
+        return True
+
+    print(f"\n--- 💾 Executing {len(actions)} total actions ---")
+    bulk_start = time.time()
+    ok = write_actions(actions, "Product sync")
+    log_time("OpenSearch bulk execution", bulk_start)
+    publish_stock_changes(stock_changes)
+    return ok
+
+
+def prefetch(items, size):
+    """
+    Iterates `items` in a background thread, staying at most `size` ahead
+    of the consumer: Shopify pages download while the previous ones are
+    being indexed. Errors are re-raised in the consumer.
+    """
+    queue = Queue(maxsize=size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(("item", item)):
+                    return
+            put(("done", None))
+        except Exception as e:
+            put(("error", e))
+
+    threading.Thread(target=produce, name="sync-prefetch", daemon=True).start()
+    try:
+        while True:
+            kind, item = queue.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def indexed_state(skus):
+    """sku -> {"qty", "content_hash"} currently indexed, for one page of SKUs."""
+    if not skus:
+        return {}
+    try:
+        res = os_client.mget(index=PRODUCT_INDEX, body={"ids": skus}, _source_includes=["qty", "content_hash"])
+    except NotFoundError:
+        return {}
+    return {d["_id"]: d["_source"] for d in res["docs"] if d.get("found")}
 
 
-    # Existing SKUs (for cleanup)
-    existing_skus = set()
+# ---------------- SYNC CHECKPOINT ----------------
+# Stored in the product index's mapping _meta, so an index that is
+# rebuilt from scratch has no checkpoint and gets a full sync first.
+def read_checkpoint():
     try:
-        for hit in helpers.scan(
-            os_client,
-            index=PRODUCT_INDEX,
-            query={"_source": ["sku"]}
-        ):
-            existing_skus.add(hit["_source"]["sku"])
-    except Exception:
-        pass
-
-    url = f"https://{SHOPIFY_STORE_NAME}.myshopify.com/admin/api/{API_VERSION}/products.json?status=active&limit=250"
-    headers = {"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN}
+        mappings = os_client.indices.get_mapping(index=PRODUCT_INDEX)
+    except Exception as e:
+        print(f"⚠️ Could not read sync checkpoint: {e}")
+        return {}
+    for body in mappings.values():
+        return body.get("mappings", {}).get("_meta", {}).get("product_sync") or {}
+    return {}
 
-    actions = []
-    active_skus = set()
 
-    product_loop_start = time.time()
-    while url:
+def write_checkpoint(high_water_mark, full, index=PRODUCT_INDEX):
+    mappings = os_client.indices.get_mapping(index=index)
+    meta = next(iter(mappings.values()), {}).get("mappings", {}).get("_meta", {})
+    checkpoint = dict(meta.get("product_sync") or {})
+    now = datetime.now(timezone.utc).isoformat()
 
-        response = requests.get(url, headers=headers)
-        if response.status_code != 200:
-            break
+    checkpoint["last_run"] = now
+    if high_water_mark:
+        checkpoint["high_water_mark"] = later(checkpoint.get("high_water_mark"), high_water_mark)
+    if full:
+        checkpoint["last_full_sync"] = now
 
-        products = response.json().get("products", [])
+    # _meta is replaced as a whole, so keep any other keys in it
+    os_client.indices.put_mapping(index=index, body={"_meta": {**meta, "product_sync": checkpoint}})
+    print(f"📌 Checkpoint: {checkpoint}")
 
-        for product in products:
-            category = product.get("product_type") or "General"
 
-            # ✅ Shopify collections (dynamic, multi-valued)
-            collections = collections_map.get(product["id"], [])
-            if not collections:
-                collections = ["Other"]
+def full_sync_due(checkpoint):
+    if not checkpoint.get("high_water_mark") or not checkpoint.get("last_full_sync"):
+        return True
+    last_full = datetime.fromisoformat(checkpoint["last_full_sync"])
+    return datetime.now(timezone.utc) - last_full > timedelta(hours=PRODUCT_FULL_SYNC_HOURS)
 
-            raw_body = product.get("body_html") or ""
-            clean_description = clean_html(raw_body[:500])
 
-            for variant in product.get("variants", []):
-                sku = variant.get("sku")
-                if not sku:
-                    continue
+# ---------------- PRODUCT SYNC ----------------
+def sync_all_products(index=PRODUCT_INDEX, stock_changes=None):
+    """
+    Full sync as one pipeline: Shopify pages are fetched ahead in the
+    background, turned into index actions page by page and streamed into
+    OpenSearch, so writing starts with the first page and memory holds a
+    few pages plus one bulk chunk, not the catalog. Variants whose
+    content_hash matches the indexed one are not rewritten. SKUs that
+    didn't show up are swept afterwards.
+
+    With `index` set to a new, empty version every variant is written and
+    nothing needs deleting; the live index is still read for stock change
+    events and the counts. Pass a `stock_changes` list to collect the
+    events instead of publishing them (rebuild_index publishes them once
+    the new version is live). True if every write succeeded.
+    """
+    rebuild = index != PRODUCT_INDEX
+    total_start = time.time()
+    print(f"--- 🚀 Starting Full Product Sync for {SHOPIFY_STORE_NAME} ---")
 
-                qty = int(variant.get("inventory_quantity") or 0)
-                active_skus.add(sku)
+    collections_start = time.time()
+    collections_map = fetch_collections_map()
+    log_time("Collections map fetch", collections_start)
 
-                actions.append({
+    seen = set()            # SKUs in this listing (ids only, for the sweep)
+    collect = stock_changes is not None
+    stock_changes = stock_changes if collect else []
+    state = {"high_water_mark": None, "products": 0}
+    counts = {"unchanged": 0, "updated": 0, "created": 0, "deleted": 0}
+
+    def index_actions():
+        # Raises ShopifyError rather than stopping early: a partial listing
+        # would make the sweep below delete every SKU it didn't reach
+        pages = shopify_client.paginate("products.json", status="active", limit=250)
+        for page in prefetch(pages, SYNC_PREFETCH_PAGES):
+            docs = []
+            for product in page.get("products", []):
+                state["high_water_mark"] = later(state["high_water_mark"], product["updated_at"])
+                state["products"] += 1
+                docs.extend(variant_docs(product, collections_map))
+
+            # Indexed hash (skip unchanged) and stock (change events)
+            indexed = indexed_state([doc["sku"] for doc in docs])
+            for doc in docs:
+                sku = doc["sku"]
+                seen.add(sku)
+                old = indexed.get(sku)
+                if old is None:
+                    counts["created"] += 1
+                elif old.get("content_hash") == doc["content_hash"]:
+                    counts["unchanged"] += 1
+                    if not rebuild:
+                        continue
+                else:
+                    counts["updated"] += 1
+                    if old.get("qty") != doc["qty"]:
+                        stock_changes.append((sku, doc["qty"], doc["name"]))
+                yield {
                     "_op_type": "index",
-                    "_index": PRODUCT_INDEX,
+                    "_index": index,
                     "_id": sku,
-                    "_source": {
-                        "sku": sku,
-                        "name": product["title"],
-                        "category": category,
-                        "collection": collections,  # ✅ ARRAY
-                        "price": float(variant["price"]),
-                        "qty": qty,
-                        "in_stock": qty > 0,
-                        "description": clean_description,
-                        "updated_at": product["updated_at"]
-                    }
-                })
-
-        link = response.headers.get("Link")
-        url = (
-            re.findall(r'<(.*?)>; rel="next"', link)[0]
-            if link and 'rel="next"' in link
-            else None
-        )
-    log_time("Product fetch & action build", product_loop_start)
+                    "_source": doc
+                }
+
+    def delete_actions():
+        try:
+            for hit in helpers.scan(os_client, index=PRODUCT_INDEX, query={"_source": False}):
+                if hit["_id"] not in seen:
+                    counts["deleted"] += 1
+                    stock_changes.append((hit["_id"], 0, None))
+                    if not rebuild:
+                        yield {"_op_type": "delete", "_index": PRODUCT_INDEX, "_id": hit["_id"]}
+        except NotFoundError:
+            return
 
+    product_loop_start = time.time()
+    ok = write_actions(index_actions(), "Product index")
+    log_time(f"Product fetch & indexing ({state['products']} products, {len(seen)} SKUs)", product_loop_start)
 
     # Cleanup deleted SKUs
-    for sku in (existing_skus - active_skus):
-        actions.append({
-            "_op_type": "delete",
-            "_index": PRODUCT_INDEX,
-            "_id": sku
-        })
-
-    if actions:
-        print(f"\n--- 💾 Executing {len(actions)} total actions ---")
-        bulk_start = time.time()
-        success, errors = helpers.bulk(
+    sweep_start = time.time()
+    ok = write_actions(delete_actions(), "Deleted SKU cleanup") and ok
+    log_time("Deleted SKU sweep", sweep_start)
+
+    report_counts(counts)
+    if not collect:
+        publish_stock_changes(stock_changes)
+    if ok:
+        write_checkpoint(state["high_water_mark"], full=True, index=index)
+    log_time("Total product sync", total_start)
+    return ok
+
+
+def rebuild_index(alias, fill, warmup, properties=None, stock_changes=()):
+    """
+    Blue/green: `fill(new_index)` writes a complete new version, which goes
+    live only if it returns True. Readers keep using the old version (and
+    its caches) until the alias swap; a failed build is deleted.
+    `stock_changes` (filled by `fill`) go out with the swap event, so the
+    app hears about them only once they are live, and never for a build
+    that was thrown away.
+    """
+    name = index_versions.create_version(os_client, alias, properties)
+    try:
+        ok = fill(name)
+    except BaseException:
+        os_client.indices.delete(index=name, ignore_unavailable=True)
+        raise
+    if not ok:
+        print(f"❌ {name} incomplete, {alias} left on its current version")
+        os_client.indices.delete(index=name, ignore_unavailable=True)
+        return False
+
+    index_versions.finish_version(os_client, alias, name, warmup)
+    index_versions.swap_alias(os_client, alias, name)
+    # The app's catalog caches and cached replies describe the old version
+    publish_sync_event(stock_changes, reindexed=alias)
+    index_versions.prune_versions(os_client, alias, SYNC_KEEP_VERSIONS)
+    return True
+
+
+# ---------------- INCREMENTAL PRODUCT SYNC ----------------
+def existing_variants(product_ids, skus):
+    """sku -> indexed qty and content_hash, for the given products or SKUs."""
+    found = {}
+    product_ids, skus = list(product_ids), list(skus)
+    for i in range(0, max(len(product_ids), len(skus)), 1000):
+        should = []
+        if product_ids[i:i + 1000]:
+            should.append({"terms": {"product_id": product_ids[i:i + 1000]}})
+        if skus[i:i + 1000]:
+            # Documents written before product_id existed
+            should.append({"ids": {"values": skus[i:i + 1000]}})
+        for hit in helpers.scan(
             os_client,
-            actions,
-            stats_only=False,
-            raise_on_error=False
+            index=PRODUCT_INDEX,
+            query={"query": {"bool": {"should": should}}, "_source": ["qty", "content_hash"]}
+        ):
+            found[hit["_id"]] = hit["_source"]
+    return found
+
+
+def indexed_product_ids():
+    """Distinct product_id values in the index (composite aggregation, no documents)."""
+    ids = set()
+    after = None
+    while True:
+        composite = {"size": 1000, "sources": [{"product_id": {"terms": {"field": "product_id"}}}]}
+        if after:
+            composite["after"] = after
+        res = os_client.search(
+            index=PRODUCT_INDEX,
+            body={"size": 0, "aggs": {"products": {"composite": composite}}}
         )
-        log_time("OpenSearch bulk execution", bulk_start)
+        agg = res["aggregations"]["products"]
+        ids.update(int(b["key"]["product_id"]) for b in agg["buckets"])
+        after = agg.get("after_key")
+        if not agg["buckets"] or not after:
+            return ids
 
 
-        print(f"✅ Sync complete. {success} operations successful.")
-
-        real_errors = [
-            e for e in errors
-            if list(e.values())[0].get("status") != 404
-        ]
-        if real_errors:
-            print("❌ Actual failures:")
-            print(json.dumps(real_errors, indent=2))
-    log_time("Total product sync", total_start)
+def count_without_product_id():
+    """Variants indexed before product_id existed: the reconciliation can't see them."""
+    return os_client.count(
+        index=PRODUCT_INDEX,
+        body={"query": {"bool": {"must_not": {"exists": {"field": "product_id"}}}}}
+    )["count"]
 
 
-# ---------------- SITE FACTS SYNC ----------------
-def sync_site_facts():
+def sync_changed_products(checkpoint):
     total_start = time.time()
-    print(f"--- 🌐 Starting Site Facts Sync ---")
+    since = datetime.fromisoformat(checkpoint["high_water_mark"]) - CHECKPOINT_OVERLAP
+    print(f"--- 🔁 Starting Incremental Product Sync (changed since {since.isoformat()}) ---")
 
-    headers = {"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN}
-    base = f"https://{SHOPIFY_STORE_NAME}.myshopify.com/admin/api/{API_VERSION}"
+    actions = []
+    stock_changes = []
+    counts = {"unchanged": 0, "updated": 0, "created": 0, "deleted": 0}
+
+    # 1️⃣ Products edited since the checkpoint, any status: archived and
+    # draft products have to leave the index too
+    fetch_start = time.time()
+    changed = []
+    for page in shopify_client.paginate(
+        "products.json", updated_at_min=since.isoformat(), status="any", limit=250
+    ):
+        changed.extend(page.get("products", []))
+    log_time(f"Changed products fetch ({len(changed)} products)", fetch_start)
+
+    high_water_mark = None
+    for product in changed:
+        high_water_mark = later(high_water_mark, product["updated_at"])
+
+    # 2️⃣ Reindex only the variants that differ from what is indexed
+    if changed:
+        # Collection membership isn't part of updated_at; changes that only
+        # move a product between collections wait for the next full sync
+        active_ids = [p["id"] for p in changed if p.get("status", "active") == "active"]
+        if len(active_ids) > SYNC_COLLECTIONS_LOOKUP_MAX:
+            collections_map = fetch_collections_map()
+        else:
+            lookup_start = time.time()
+            collections_map = shopify_client.collections_for_products(active_ids)
+            log_time(f"Collections of changed products ({len(active_ids)} products)", lookup_start)
+
+        diff_start = time.time()
+        wanted = {}
+        for product in changed:
+            if product.get("status", "active") == "active":
+                for doc in variant_docs(product, collections_map):
+                    wanted[doc["sku"]] = doc
+        existing = existing_variants({p["id"] for p in changed}, wanted)
+
+        for sku, doc in wanted.items():
+            old = existing.get(sku)
+            if old is None:
+                counts["created"] += 1
+            elif old.get("content_hash") == doc["content_hash"]:
+                counts["unchanged"] += 1
+                continue
+            else:
+                counts["updated"] += 1
+                if old.get("qty") != doc["qty"]:
+                    stock_changes.append((sku, doc["qty"], doc["name"]))
+            actions.append({"_op_type": "index", "_index": PRODUCT_INDEX, "_id": sku, "_source": doc})
+
+        # Variants removed from a product, or products no longer active
+        for sku in existing.keys() - wanted.keys():
+            counts["deleted"] += 1
+            actions.append({"_op_type": "delete", "_index": PRODUCT_INDEX, "_id": sku})
+            stock_changes.append((sku, 0, None))
+        log_time(f"Variant diff ({len(wanted)} variants, {len(actions)} to write)", diff_start)
+
+    # 3️⃣ Reconciliation: deleted products never show up in updated_at_min,
+    # so compare product ids (one small page per 250 products) with the index
+    reconcile_start = time.time()
+    live_ids = set()
+    for page in shopify_client.paginate("products.json", status="active", fields="id", limit=250):
+        live_ids.update(p["id"] for p in page.get("products", []))
+    gone = indexed_product_ids() - live_ids - {p["id"] for p in changed}
+    if gone:
+        for sku in existing_variants(gone, []):
+            counts["deleted"] += 1
+            actions.append({"_op_type": "delete", "_index": PRODUCT_INDEX, "_id": sku})
+            stock_changes.append((sku, 0, None))
+    log_time(f"Deletion reconciliation ({len(gone)} products gone)", reconcile_start)
+
+    report_counts(counts)
+    if execute_actions(actions, stock_changes):
+        write_checkpoint(high_water_mark, full=False)
+    log_time("Total incremental product sync", total_start)
+
+
+def sync_products(mode="auto"):
+    """mode: "full", "incremental", or "auto" (full when PRODUCT_FULL_SYNC_HOURS have passed)."""
+    checkpoint = read_checkpoint()
+    if mode == "auto":
+        mode = "full" if full_sync_due(checkpoint) else "incremental"
+    if mode == "incremental" and not checkpoint.get("high_water_mark"):
+        print("⚠️ No sync checkpoint yet, running a full sync")
+        mode = "full"
+    if mode == "incremental":
+        # Their products can't be matched against Shopify, so one deleted
+        # there would never leave the index; a full sync sweeps them by SKU
+        # and rewrites the rest with product_id
+        legacy = count_without_product_id()
+        if legacy:
+            print(f"⚠️ {legacy} variants indexed without product_id, running a full sync")
+            mode = "full"
+
+    if mode == "full" and SYNC_FULL_REBUILD:
+        changes = []
+        rebuild_index(PRODUCT_INDEX, lambda name: sync_all_products(name, changes),
+                      PRODUCT_WARMUP, PRODUCT_PROPERTIES, changes)
+    elif mode == "full":
+        sync_all_products()
+    else:
+        sync_changed_products(checkpoint)
+
+
+# ---------------- SITE FACTS SYNC ----------------
+def write_site_facts(index):
+    """Pages and policies into `index` (a new version: pages removed in Shopify go with the old one)."""
     actions = []
 
     # Pages
-    pages = requests.get(f"{base}/pages.json", headers=headers).json().get("pages", [])
+    pages = shopify_client.get("pages.json").json().get("pages", [])
     for p in pages:
         actions.append({
-            "_index": FACTS_INDEX,
+            "_index": index,
             "_id": f"page_{p['id']}",
             "_source": {
                 "type": "Page",
@@ -213,10 +599,10 @@ def sync_site_facts():
         })
 
     # Policies
-    policies = requests.get(f"{base}/policies.json", headers=headers).json().get("policies", [])
+    policies = shopify_client.get("policies.json").json().get("policies", [])
     for pol in policies:
         actions.append({
-            "_index": FACTS_INDEX,
+            "_index": index,
             "_id": f"policy_{pol['title'].lower()}",
             "_source": {
                 "type": "Policy",
@@ -227,15 +613,35 @@ def sync_site_facts():
             }
         })
 
-    helpers.bulk(os_client, actions)
-    log_time("Site facts sync", total_start)
+    return write_actions(actions, "Site facts")
 
-    print("✅ Site Facts Updated.")
+
+def sync_site_facts():
+    total_start = time.time()
+    print(f"--- 🌐 Starting Site Facts Sync ---")
+
+    if rebuild_index(FACTS_INDEX, write_site_facts, FACTS_WARMUP):
+        print("✅ Site Facts Updated.")
+    log_time("Site facts sync", total_start)
 
 
 # ---------------- ENTRY ----------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync Shopify products and site facts into OpenSearch")
+    parser.add_argument("--mode", choices=["auto", "full", "incremental"], default="auto",
+                        help="auto: incremental, with a full sync every PRODUCT_FULL_SYNC_HOURS")
+    parser.add_argument("--rollback", choices=["products", "facts"],
+                        help="point the alias back at the previous index version and exit")
+    args = parser.parse_args()
+
+    if args.rollback:
+        alias = PRODUCT_INDEX if args.rollback == "products" else FACTS_INDEX
+        if index_versions.rollback(os_client, alias):
+            publish_sync_event(reindexed=alias)
+        raise SystemExit(0)
+
     script_start = time.time()
-    sync_all_products()
+    sync_products(args.mode)
     sync_site_facts()
     log_time("TOTAL SCRIPT EXECUTION", script_start)
+    print(f"🛍️ Shopify calls: {shopify_client.report()}")
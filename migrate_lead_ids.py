@@ -0,0 +1,199 @@
+"""
+One-off migration: move frono_leads onto deterministic lead ids and
+merge duplicates created by the old search-then-write create_lead, then
+set lead_id (the export's sort tiebreaker) on every lead missing it.
+
+    python migrate_lead_ids.py --dry-run
+    python migrate_lead_ids.py
+"""
+import argparse
+import time
+from datetime import datetime
+from opensearchpy import helpers
+from search.opensearch_client import client
+from search.leads_repo import INDEX, RETRY_ON_CONFLICT, ensure_leads_mapping, lead_id_for, normalize_email
+
+# Like leads_repo.UPSERT_SCRIPT, but a target that a live create_lead
+# updated after the merged history (stored updated_at is newer) keeps its
+# own values; the older merged ones only fill gaps. created_at is the
+# earliest of both, updated_at the latest.
+MIGRATE_SCRIPT = """
+    def stored = ctx._source.updated_at;
+    boolean newer = stored != null && stored.compareTo(params.now) > 0;
+    def oldScore = ctx._source.lead_score == null ? 0 : ctx._source.lead_score;
+    def oldCreated = ctx._source.created_at;
+
+    for (entry in params.data.entrySet()) {
+        if (entry.getValue() != null && (!newer || ctx._source[entry.getKey()] == null)) {
+            ctx._source[entry.getKey()] = entry.getValue();
+        }
+    }
+
+    ctx._source.lead_score = (int) Math.max(oldScore, params.data.lead_score);
+
+    def created = params.data.created_at;
+    if (oldCreated != null && (created == null || oldCreated.compareTo(created) < 0)) {
+        created = oldCreated;
+    }
+    ctx._source.created_at = created == null ? params.now : created;
+    ctx._source.updated_at = newer ? stored : params.now;
+"""
+
+
+def merge_leads(docs: list) -> dict:
+    """
+    Oldest first, so later non-empty values win; score is the max,
+    created_at the earliest and updated_at the latest.
+    """
+    docs = sorted(docs, key=lambda d: d.get("updated_at") or d.get("created_at") or "")
+
+    merged = {}
+    for doc in docs:
+        for key, value in doc.items():
+            if value is not None and value != "":
+                merged[key] = value
+
+    merged["lead_score"] = max(int(d.get("lead_score") or 0) for d in docs)
+
+    created = [d["created_at"] for d in docs if d.get("created_at")]
+    updated = [d["updated_at"] for d in docs if d.get("updated_at")]
+    if created:
+        merged["created_at"] = min(created)
+    if updated:
+        merged["updated_at"] = max(updated)
+
+    if merged.get("email"):
+        merged["email"] = normalize_email(merged["email"])
+
+    return merged
+
+
+def plan_migration():
+    groups = {}
+    skipped = 0
+
+    for hit in helpers.scan(client, index=INDEX, query={"query": {"match_all": {}}}):
+        target = lead_id_for(hit["_source"])
+        if not target:
+            skipped += 1
+            continue
+        groups.setdefault(target, []).append(hit)
+
+    return groups, skipped
+
+
+def pending(groups: dict):
+    """(target, old ids) for every contact not yet on its deterministic id alone."""
+    for target, hits in groups.items():
+        ids = {h["_id"] for h in hits}
+        if ids != {target}:
+            yield target, hits, ids - {target}
+
+
+def upsert_actions(groups: dict):
+    """
+    The merged lead as a scripted upsert (MIGRATE_SCRIPT) stamped with the
+    merged updated_at, so migrated leads keep their history. If a live
+    create_lead reached the target id after the scan, its newer values
+    and updated_at are kept and the merged lead only fills missing fields.
+    """
+    for target, hits, _ in pending(groups):
+        merged = merge_leads([h["_source"] for h in hits])
+        yield {
+            "_op_type": "update",
+            "_index": INDEX,
+            "_id": target,
+            "retry_on_conflict": RETRY_ON_CONFLICT,
+            "scripted_upsert": True,
+            "upsert": {},
+            "script": {
+                "lang": "painless",
+                "source": MIGRATE_SCRIPT,
+                "params": {
+                    "data": {**merged, "lead_id": target},
+                    "now": merged.get("updated_at") or datetime.utcnow().isoformat()
+                }
+            }
+        }
+
+
+def run_bulk(actions, chunk_size: int, label: str) -> tuple[set, list]:
+    """(ids written, failures); 429 rejections are retried with backoff."""
+    done, errors = set(), []
+    for ok, item in helpers.streaming_bulk(
+        client,
+        actions,
+        chunk_size=chunk_size,
+        max_retries=5,
+        raise_on_error=False,
+        raise_on_exception=False
+    ):
+        op, result = next(iter(item.items()))
+        if ok or (op == "delete" and result.get("status") == 404):
+            done.add(result.get("_id"))
+        else:
+            errors.append(item)
+    print(f"✅ {label}: {len(done)} ok, {len(errors)} failed")
+    for e in errors[:20]:
+        print(f"❌ {e}")
+    return done, errors
+
+
+def backfill_lead_ids():
+    """lead_id on leads already at their deterministic id (the export's sort tiebreaker)."""
+    res = client.update_by_query(
+        index=INDEX,
+        body={
+            "query": {"bool": {"must_not": {"exists": {"field": "lead_id"}}}},
+            "script": {"lang": "painless", "source": "ctx._source.lead_id = ctx._id;"}
+        },
+        conflicts="proceed",
+        refresh=True
+    )
+    print(f"🏷️ lead_id set on {res.get('updated', 0)} leads")
+
+
+def migrate(groups: dict, to_move: list, chunk_size: int):
+    # 1️⃣ Merged leads first; 2️⃣ old ids only where that write landed, so a
+    # rejected upsert never leaves a contact with no document at all
+    written, _ = run_bulk(upsert_actions(groups), chunk_size, "Merged leads")
+    deletes = (
+        {"_op_type": "delete", "_index": INDEX, "_id": old_id}
+        for target, _, old_ids in pending(groups) if target in written
+        for old_id in old_ids
+    )
+    _, failed = run_bulk(deletes, chunk_size, "Old ids removed")
+    client.indices.refresh(index=INDEX)
+
+    kept = len(to_move) - len(written)
+    if kept or failed:
+        print(f"⚠️ {kept} contacts kept their old ids (upsert failed), {len(failed)} deletes failed: re-run to retry")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.time()
+    groups, skipped = plan_migration()
+
+    to_move = [target for target, _, _ in pending(groups)]
+    duplicates = sum(len(groups[t]) - 1 for t in to_move)
+
+    print(f"📊 {sum(len(h) for h in groups.values())} leads, {len(groups)} unique contacts")
+    print(f"🔁 {len(to_move)} to migrate, {duplicates} duplicates to merge, {skipped} without contact")
+
+    if args.dry_run:
+        return
+
+    ensure_leads_mapping()
+    if to_move:
+        migrate(groups, to_move, args.chunk_size)
+    backfill_lead_ids()
+    print(f"⏱️ Done in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
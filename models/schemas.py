@@ -1,3 +1,4 @@
+import re
 from pydantic import BaseModel, EmailStr, model_validator
 from typing import Optional
 from datetime import datetime
@@ -21,8 +22,9 @@ class LeadCreate(BaseModel):
 
     @model_validator(mode="after")
     def validate_contact_and_consent(self):
-        # Require at least one contact method
-        if not self.email and not self.phone:
+        # Require at least one contact method; a phone without digits
+        # ("n/a", "-") can't identify anyone
+        if not self.email and not re.search(r"\d", self.phone or ""):
             raise ValueError(
                 "At least one contact method (email or phone) is required."
             )
@@ -39,3 +41,19 @@ class LeadCreate(BaseModel):
 class LeadResponse(BaseModel):
     id: str
     created_at: datetime
+
+
+class BulkLeadResult(BaseModel):
+    row: int
+    status: str                      # created | updated | merged | invalid | error
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkLeadResponse(BaseModel):
+    total: int
+    written: int
+    invalid: int
+    failed: int
+    took_ms: int
+    results: list[BulkLeadResult]
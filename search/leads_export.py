@@ -0,0 +1,174 @@
+import csv
+import io
+import json
+import threading
+from queue import Queue
+
+from search.opensearch_client import client
+from search.leads_repo import INDEX
+
+EXPORT_FIELDS = [
+    "name", "email", "phone", "intent", "lead_score",
+    "source", "page_url", "consent", "created_at", "updated_at",
+]
+
+PAGE_SIZE = 1000
+KEEP_ALIVE = "2m"
+
+# Bounded hand-off between slice readers and the response generator:
+# memory stays at slices * QUEUE_PAGES * PAGE_SIZE hits whatever the index size.
+QUEUE_PAGES = 4
+
+# Response chunk size: large enough to avoid per-row writes
+CHUNK_BYTES = 64 * 1024
+
+_DONE = object()
+
+
+def build_export_query(
+    min_score: int | None = None,
+    max_score: int | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    intents: list[str] | None = None,
+) -> dict:
+    filters = []
+
+    if min_score is not None or max_score is not None:
+        score_range = {}
+        if min_score is not None:
+            score_range["gte"] = min_score
+        if max_score is not None:
+            score_range["lte"] = max_score
+        filters.append({"range": {"lead_score": score_range}})
+
+    if date_from or date_to:
+        date_range = {}
+        if date_from:
+            date_range["gte"] = date_from
+        if date_to:
+            date_range["lte"] = date_to
+        filters.append({"range": {"created_at": date_range}})
+
+    if intents:
+        filters.append({"terms": {"intent": intents}})
+
+    if not filters:
+        return {"match_all": {}}
+
+    return {"bool": {"filter": filters}}
+
+
+def _read_slice(pit_id: str, query: dict, slice_id: int, slices: int, out: Queue, stop: threading.Event):
+    """Pages through one slice of the PIT with search_after."""
+    search_after = None
+
+    try:
+        while not stop.is_set():
+            body = {
+                "size": PAGE_SIZE,
+                "query": query,
+                "_source": EXPORT_FIELDS,
+                "pit": {"id": pit_id, "keep_alive": KEEP_ALIVE},
+                # lead_id: stored keyword copy of _id (see leads_repo.PROPERTIES)
+                "sort": [{"created_at": "asc"}, {"lead_id": {"order": "asc", "unmapped_type": "keyword"}}],
+                "track_total_hits": False,
+            }
+            if slices > 1:
+                body["slice"] = {"id": slice_id, "max": slices}
+            if search_after:
+                body["search_after"] = search_after
+
+            hits = client.search(body=body)["hits"]["hits"]
+            if not hits:
+                break
+
+            out.put([{"id": h["_id"], **h["_source"]} for h in hits])
+            search_after = hits[-1]["sort"]
+
+            if len(hits) < PAGE_SIZE:
+                break
+    except Exception as e:
+        print(f"❌ Lead export slice {slice_id} failed: {e}")
+        out.put(e)
+    finally:
+        out.put(_DONE)
+
+
+def iter_leads(query: dict, slices: int = 4):
+    """
+    Yields every matching lead from a point-in-time snapshot, read by
+    `slices` threads in parallel. Order across slices is not guaranteed.
+    """
+    pit_id = client.create_point_in_time(index=INDEX, keep_alive=KEEP_ALIVE)["pit_id"]
+
+    out = Queue(maxsize=max(slices, 1) * QUEUE_PAGES)
+    stop = threading.Event()
+
+    readers = [
+        threading.Thread(
+            target=_read_slice,
+            args=(pit_id, query, i, slices, out, stop),
+            name=f"lead-export-{i}",
+            daemon=True
+        )
+        for i in range(slices)
+    ]
+    for t in readers:
+        t.start()
+
+    try:
+        running = len(readers)
+        while running:
+            page = out.get()
+            if page is _DONE:
+                running -= 1
+                continue
+            if isinstance(page, Exception):
+                raise page
+            yield from page
+    finally:
+        # Client went away or a slice failed: unblock the readers and clean up
+        stop.set()
+        while any(t.is_alive() for t in readers):
+            while not out.empty():
+                out.get_nowait()
+            for t in readers:
+                t.join(0.05)
+        try:
+            client.delete_point_in_time(body={"pit_id": [pit_id]})
+        except Exception as e:
+            print(f"⚠️ Could not delete export PIT: {e}")
+
+
+def stream_csv(leads, chunk_bytes: int = CHUNK_BYTES):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=["id"] + EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+
+    for lead in leads:
+        writer.writerow(lead)
+        if buf.tell() >= chunk_bytes:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def stream_ndjson(leads, chunk_bytes: int = CHUNK_BYTES):
+    lines = []
+    size = 0
+
+    for lead in leads:
+        line = json.dumps(lead, default=str) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield "".join(lines)
+            lines = []
+            size = 0
+
+    if lines:
+        yield "".join(lines)
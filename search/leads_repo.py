@@ -1,72 +1,144 @@
+import hashlib
+import re
 from datetime import datetime
+from opensearchpy import helpers
 from search.opensearch_client import client
 
 INDEX = "frono_leads"
 
+RETRY_ON_CONFLICT = 5
 
-def create_lead(data: dict) -> dict:
-    now = datetime.utcnow().isoformat()
+# lead_id mirrors _id as a keyword, so exports can sort on it as a unique
+# tiebreaker (sorting on _id needs fielddata, which is deprecated)
+PROPERTIES = {"lead_id": {"type": "keyword"}}
 
-    # Build dedup query
-    should = []
+# Runs as a scripted upsert: on a new lead ctx._source starts empty, on an
+# existing one it holds the stored lead. Either way one call does the merge.
+UPSERT_SCRIPT = """
+    def oldScore = ctx._source.lead_score == null ? 0 : ctx._source.lead_score;
 
-    if data.get("email"):
-        should.append({"term": {"email": data["email"]}})
+    for (entry in params.data.entrySet()) {
+        if (entry.getValue() != null) {
+            ctx._source[entry.getKey()] = entry.getValue();
+        }
+    }
 
-    if data.get("phone"):
-        should.append({"term": {"phone": data["phone"]}})
+    ctx._source.lead_score = (int) Math.max(oldScore, params.data.lead_score);
 
-    # Search for existing lead
-    existing = client.search(
-        index=INDEX,
-        body={
-            "size": 1,
-            "query": {
-                "bool": {
-                    "should": should,
-                    "minimum_should_match": 1
-                }
-            }
-        }
-    )
+    if (ctx._source.created_at == null) {
+        ctx._source.created_at = params.now;
+    }
+    ctx._source.updated_at = params.now;
+"""
 
-    hits = existing["hits"]["hits"]
-
-    # -----------------------------------
-    # UPDATE EXISTING LEAD
-    # -----------------------------------
-    if hits:
-        lead_id = hits[0]["_id"]
-        old = hits[0]["_source"]
-
-        updated_score = max(old.get("lead_score", 0), data["lead_score"])
-
-        client.update(
-            index=INDEX,
-            id=lead_id,
-            body={
-                "doc": {
-                    **data,
-                    "lead_score": updated_score,
-                    "updated_at": now
-                }
-            }
-        )
 
-        return {
-            "id": lead_id,
-            "created_at": old["created_at"]
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+def normalize_phone(phone: str) -> str:
+    digits = re.sub(r"\D", "", phone)
+    # 0044... and +44... are the same number
+    return digits[2:] if digits.startswith("00") else digits
+
+
+def lead_id_for(data: dict) -> str | None:
+    """
+    Deterministic lead id: email wins over phone, so the same person
+    always lands on the same document. A value that normalizes to nothing
+    ("n/a", "-") counts as missing; keying on it would merge strangers.
+    """
+    email = normalize_email(data.get("email") or "")
+    phone = normalize_phone(data.get("phone") or "")
+    if email:
+        key = "email:" + email
+    elif phone:
+        key = "phone:" + phone
+    else:
+        return None
+
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def ensure_leads_mapping():
+    """Creates frono_leads, or adds PROPERTIES to its mapping (new fields only)."""
+    if client.indices.exists(index=INDEX):
+        client.indices.put_mapping(index=INDEX, body={"properties": PROPERTIES})
+    else:
+        client.indices.create(index=INDEX, body={"mappings": {"properties": PROPERTIES}})
+        print(f"✅ Created {INDEX} index.")
+
+
+def upsert_body(data: dict, now: str) -> dict:
+    data = {**data, "lead_id": lead_id_for(data)}
+    if data.get("email"):
+        data["email"] = normalize_email(data["email"])
+
+    return {
+        "scripted_upsert": True,
+        "upsert": {},
+        "script": {
+            "lang": "painless",
+            "source": UPSERT_SCRIPT,
+            "params": {
+                "data": data,
+                "now": now
+            }
         }
+    }
+
 
-    # -----------------------------------
-    # CREATE NEW LEAD
-    # -----------------------------------
-    data["created_at"] = now
-    data["updated_at"] = now
+def create_lead(data: dict) -> dict:
+    now = datetime.utcnow().isoformat()
+    lead_id = lead_id_for(data)
 
-    res = client.index(index=INDEX, body=data)
+    res = client.update(
+        index=INDEX,
+        id=lead_id,
+        body=upsert_body(data, now),
+        retry_on_conflict=RETRY_ON_CONFLICT,
+        _source=["created_at"]
+    )
 
     return {
-        "id": res["_id"],
-        "created_at": now
+        "id": lead_id,
+        "created_at": res.get("get", {}).get("_source", {}).get("created_at", now)
     }
+
+
+def bulk_upsert_leads(leads: list, chunk_size: int = 1000) -> dict:
+    """
+    Writes many leads with the same scripted upsert as create_lead,
+    batched through streaming_bulk. Callers must pass leads with unique ids
+    (see lead_id_for). Returns {lead_id: {"status", "error"?}} where status
+    is "created", "updated" or "error"; retried chunks come back out of
+    order, hence the mapping.
+    """
+    now = datetime.utcnow().isoformat()
+
+    def actions():
+        for data in leads:
+            yield {
+                "_op_type": "update",
+                "_index": INDEX,
+                "_id": lead_id_for(data),
+                "retry_on_conflict": RETRY_ON_CONFLICT,
+                **upsert_body(data, now)
+            }
+
+    results = {}
+    for ok, item in helpers.streaming_bulk(
+        client,
+        actions(),
+        chunk_size=chunk_size,
+        max_retries=3,
+        raise_on_error=False,
+        raise_on_exception=False
+    ):
+        item = item.get("update", {})
+        if ok:
+            results[item.get("_id")] = {"status": item.get("result", "updated")}
+        else:
+            results[item.get("_id")] = {"status": "error", "error": item.get("error")}
+
+    return results
@@ -1,10 +1,27 @@
 from search.opensearch_client import client, search_opensearch
+import re
 import time
 from search.opensearch_client import client, search_opensearch
 
 # ---------------- COLLECTION GROUPS ----------------
 from admin.config_manager import ConfigManager
-MAX_PRODUCTS_TO_SHOW = ConfigManager.get_setting("max_products_to_show", 3)
+
+
+def _build_group_matchers(config):
+    """One compiled alternation per group from collection_groups_json."""
+    groups = config.get_json("collection_groups_json", {}) or {}
+    return [
+        (group, re.compile("|".join(re.escape(kw.lower()) for kw in keywords)))
+        for group, keywords in groups.items()
+        if keywords
+    ]
+
+
+ConfigManager.register_derived("group_matchers", _build_group_matchers)
+ConfigManager.register_derived(
+    "max_products_to_show",
+    lambda config: config.get_int("max_products_to_show", 3)
+)
 
 COLLECTION_GROUPS = {
     "Pest Control": [
@@ -47,24 +64,30 @@ def normalize_query(text: str) -> str:
         text = text[:-1]
     return text
 
-import json
-
 def resolve_group_from_query(query: str) -> str | None:
     q = query.lower()
-    # Fetch the dynamic dictionary from Admin Config
-    raw_groups = ConfigManager.get_setting("collection_groups_json", "{}")
-    groups_dict = json.loads(raw_groups) if raw_groups else {}
-
-    for group, keywords in groups_dict.items():
-        for kw in keywords:
-            if kw in q:
-                return group
+    # Matchers are compiled once per config version (see _build_group_matchers)
+    for group, matcher in ConfigManager.derived("group_matchers"):
+        if matcher.search(q):
+            return group
     return None
 
 def get_collections_for_group(group: str) -> list[str]:
     return COLLECTION_GROUPS.get(group, [])
 
 
+def group_for_collections(collections) -> str | None:
+    """Maps a product's collection list back to its collection group."""
+    if isinstance(collections, str):
+        collections = [collections]
+
+    for group, members in COLLECTION_GROUPS.items():
+        if any(c in members for c in collections or []):
+            return group
+
+    return None
+
+
 def resolve_collection_group(query: str) -> str | None:
     q = query.lower()
 
@@ -116,6 +139,17 @@ def get_all_collections():
     return collections
 
 
+def invalidate_caches(event: dict | None = None):
+    """
+    Drops the cached collection list. Subscribed to stock change events so
+    collections a sync added or emptied show up on the next retrieval.
+    Quantities are never cached here: every retrieval reads them from
+    OpenSearch.
+    """
+    _COLLECTION_CACHE["data"] = None
+    _COLLECTION_CACHE["timestamp"] = 0
+
+
 def get_product_by_name(identifier: str):
     # Clean the identifier to remove buying intent phrases
     clean_id = identifier.lower().strip()
@@ -170,6 +204,8 @@ def retrieve_context(query: str, intent: str, session: dict | None) -> tuple[str
             None
         )
 
+    max_show = ConfigManager.derived("max_products_to_show")
+
     # 1️⃣ Collection / Browse queries
     # 1️⃣ Dynamic collection-based search
     collections = get_all_collections()
@@ -193,13 +229,13 @@ def retrieve_context(query: str, intent: str, session: dict | None) -> tuple[str
                         ]
                     }
                 },
-                limit=MAX_PRODUCTS_TO_SHOW + 1
+                limit=max_show + 1
             )
 
         if results:
-            visible = results[:MAX_PRODUCTS_TO_SHOW]
+            visible = results[:max_show]
 
-            has_more = len(results) > MAX_PRODUCTS_TO_SHOW
+            has_more = len(results) > max_show
 
             if session is not None:
                 session["menu"] = {str(i+1): r['name'] for i, r in enumerate(visible)}
@@ -256,13 +292,13 @@ def retrieve_context(query: str, intent: str, session: dict | None) -> tuple[str
     )
 
     if session is not None:
-            session["menu"] = {str(i+1): r['name'] for i, r in enumerate(product_results[:MAX_PRODUCTS_TO_SHOW])}
+            session["menu"] = {str(i+1): r['name'] for i, r in enumerate(product_results[:max_show])}
             
             items = [
                 f"{i+1}. {r['name']} (£{float(r['price']):,.2f} | Stock: {r.get('qty', 0)})"
-                for i, r in enumerate(product_results[:MAX_PRODUCTS_TO_SHOW])
+                for i, r in enumerate(product_results[:max_show])
             ]
-            return "Here are some products that match your request:\n" + "\n".join(items), product_results[:MAX_PRODUCTS_TO_SHOW]
+            return "Here are some products that match your request:\n" + "\n".join(items), product_results[:max_show]
 
     # 3️⃣ Policy / Knowledge
     policy_results = search_opensearch(
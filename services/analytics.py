@@ -0,0 +1,344 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from opensearchpy import helpers
+from search.opensearch_client import client
+from search.leads_repo import INDEX as LEADS_INDEX
+
+# ---------------------------------------------------
+# HOURLY ROLLUPS
+# ---------------------------------------------------
+# One document per UTC hour (id = hour) holding:
+#   stages:          sessions entering each funnel stage
+#   group_interest:  sessions that selected a product, per collection group
+#   group_converted: sessions that converted, per collection group
+# Each counts a session once (session["counted"]), however often it comes
+# back to a stage or picks another product from the same group, so
+# converted / interest compares sessions with sessions.
+#   leads:           {"count", "scores": {bucket: n}, "intents": {intent: n}}
+# /admin/analytics reads only these documents, never raw leads or sessions.
+
+ROLLUP_INDEX = "frono_analytics_rollups"
+CHECKPOINT_ID = "rollup_checkpoint"
+ROLLUP_INTERVAL = 300           # seconds between background rollups
+SCORE_BUCKET = 10
+
+FUNNEL_STAGES = ["browsing", "interest", "checkout", "converted", "completed"]
+
+# Adds the counters from params.counts into the stored hour document
+INCREMENT_SCRIPT = """
+    ctx._source.hour = params.hour;
+    for (section in params.counts.entrySet()) {
+        if (ctx._source[section.getKey()] == null) {
+            ctx._source[section.getKey()] = new HashMap();
+        }
+        def target = ctx._source[section.getKey()];
+        for (entry in section.getValue().entrySet()) {
+            def old = target.get(entry.getKey());
+            target[entry.getKey()] = (old == null ? 0 : old) + entry.getValue();
+        }
+    }
+"""
+
+# Replaces an hour's lead histogram: keys that dropped out of the new
+# aggregation (a lead whose score moved up a bucket) must not keep their old count
+SET_LEADS_SCRIPT = """
+    ctx._source.hour = params.hour;
+    ctx._source.leads = params.leads;
+"""
+
+_counters = {}
+_lock = threading.Lock()
+
+
+def create_rollup_index():
+    mapping = {
+        "mappings": {
+            "properties": {
+                "hour": {"type": "date"},
+                "stages": {"type": "object"},
+                "group_interest": {"type": "object"},
+                "group_converted": {"type": "object"},
+                "leads": {"type": "object"},
+                "leads_hour": {"type": "date"}
+            }
+        }
+    }
+    if not client.indices.exists(index=ROLLUP_INDEX):
+        client.indices.create(index=ROLLUP_INDEX, body=mapping)
+        print(f"✅ Created {ROLLUP_INDEX} index.")
+
+
+def _hour_key(ts: float | None = None) -> str:
+    dt = datetime.fromtimestamp(ts if ts is not None else time.time(), tz=timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:00:00Z")
+
+
+# ---------------------------------------------------
+# IN-PROCESS COUNTERS (hot path: memory only)
+# ---------------------------------------------------
+def _bucket(hour: str) -> dict:
+    if hour not in _counters:
+        _counters[hour] = {
+            "stages": Counter(),
+            "group_interest": Counter(),
+            "group_converted": Counter(),
+        }
+    return _counters[hour]
+
+
+def _first_time(session: dict | None, key: tuple) -> bool:
+    """True the first time this session reports `key`."""
+    if session is None:
+        return True
+    counted = session.setdefault("counted", set())
+    if key in counted:
+        return False
+    counted.add(key)
+    return True
+
+
+def record_stage(stage: str, session: dict | None = None):
+    if not _first_time(session, ("stage", stage)):
+        return
+    with _lock:
+        _bucket(_hour_key())["stages"][stage] += 1
+
+
+def record_group(kind: str, group: str | None, session: dict | None = None):
+    """kind is "interest" or "converted"."""
+    if not group or not _first_time(session, (kind, group)):
+        return
+    with _lock:
+        _bucket(_hour_key())[f"group_{kind}"][group] += 1
+
+
+def flush_counters() -> int:
+    """Adds this process' counters into the hourly documents."""
+    global _counters
+
+    with _lock:
+        snapshot, _counters = _counters, {}
+
+    def actions():
+        for hour, sections in snapshot.items():
+            yield {
+                "_op_type": "update",
+                "_index": ROLLUP_INDEX,
+                "_id": hour,
+                "retry_on_conflict": 5,
+                "scripted_upsert": True,
+                "upsert": {},
+                "script": {
+                    "lang": "painless",
+                    "source": INCREMENT_SCRIPT,
+                    "params": {
+                        "hour": hour,
+                        "counts": {k: dict(v) for k, v in sections.items() if v}
+                    }
+                }
+            }
+
+    # Each hour is its own update: the ones that went through must not be
+    # put back, or the next flush would count them twice
+    applied = set()
+    try:
+        for ok, item in helpers.streaming_bulk(
+            client,
+            actions(),
+            max_retries=3,
+            raise_on_error=False,
+            raise_on_exception=False
+        ):
+            result = item.get("update", {})
+            if ok:
+                applied.add(result.get("_id"))
+            else:
+                print(f"❌ Analytics counter flush failed for {result.get('_id')}: "
+                      f"{result.get('error') or result.get('status')}")
+    except Exception as e:
+        print(f"❌ Analytics counter flush failed: {e}")
+
+    # Put the failed hours back so the next run retries them
+    failed = {hour: sections for hour, sections in snapshot.items() if hour not in applied}
+    with _lock:
+        for hour, sections in failed.items():
+            bucket = _bucket(hour)
+            for name, counts in sections.items():
+                bucket[name].update(counts)
+
+    return len(applied)
+
+
+# ---------------------------------------------------
+# LEAD ROLLUP (incremental from a checkpoint)
+# ---------------------------------------------------
+def rollup_leads() -> int:
+    """
+    Re-aggregates frono_leads from the last checkpointed hour onwards.
+    The checkpoint hour itself is recomputed because it may have been
+    partial last time.
+    """
+    try:
+        checkpoint = client.get(index=ROLLUP_INDEX, id=CHECKPOINT_ID)["_source"].get("leads_hour")
+    except Exception:
+        checkpoint = None
+
+    query = {"range": {"created_at": {"gte": checkpoint}}} if checkpoint else {"match_all": {}}
+
+    res = client.search(
+        index=LEADS_INDEX,
+        body={
+            "size": 0,
+            "query": query,
+            "aggs": {
+                "hours": {
+                    "date_histogram": {
+                        "field": "created_at",
+                        "fixed_interval": "1h",
+                        "min_doc_count": 1
+                    },
+                    "aggs": {
+                        "scores": {"histogram": {"field": "lead_score", "interval": SCORE_BUCKET}},
+                        "intents": {"terms": {"field": "intent", "size": 50}}
+                    }
+                }
+            }
+        }
+    )
+
+    buckets = res.get("aggregations", {}).get("hours", {}).get("buckets", [])
+    if not buckets:
+        return 0
+
+    actions = []
+    for b in buckets:
+        hour = _hour_key(b["key"] / 1000)
+        actions.append({
+            "_op_type": "update",
+            "_index": ROLLUP_INDEX,
+            "_id": hour,
+            "retry_on_conflict": 5,
+            "scripted_upsert": True,
+            "upsert": {},
+            "script": {
+                "lang": "painless",
+                "source": SET_LEADS_SCRIPT,
+                "params": {
+                    "hour": hour,
+                    "leads": {
+                        "count": b["doc_count"],
+                        "scores": {str(int(s["key"])): s["doc_count"] for s in b["scores"]["buckets"]},
+                        "intents": {i["key"]: i["doc_count"] for i in b["intents"]["buckets"]}
+                    }
+                }
+            }
+        })
+
+    # Raises on any failed hour, so the checkpoint only moves once they're all in
+    helpers.bulk(client, actions)
+    client.index(
+        index=ROLLUP_INDEX,
+        id=CHECKPOINT_ID,
+        body={"leads_hour": _hour_key(buckets[-1]["key"] / 1000)}
+    )
+    return len(buckets)
+
+
+def run_rollup():
+    start = time.time()
+    hours = flush_counters()
+    lead_hours = rollup_leads()
+    invalidate_cache()
+    print(f"📈 Analytics rollup: {hours} counter hours, {lead_hours} lead hours "
+          f"in {(time.time() - start) * 1000:.0f}ms")
+
+
+def start_rollup_job(interval: int = ROLLUP_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_rollup()
+            except Exception as e:
+                print(f"❌ Analytics rollup failed: {e}")
+
+    thread = threading.Thread(target=loop, name="analytics-rollup", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------
+# READ SIDE (rollups only, cached)
+# ---------------------------------------------------
+CACHE_TTL = 30
+_cache = {}
+
+
+def invalidate_cache():
+    _cache.clear()
+
+
+def get_analytics(hours: int = 168) -> dict:
+    cached = _cache.get(hours)
+    if cached and time.time() - cached[0] < CACHE_TTL:
+        return cached[1]
+
+    res = client.search(
+        index=ROLLUP_INDEX,
+        body={
+            "size": hours + 1,
+            "query": {"range": {"hour": {"gte": f"now-{hours}h/h"}}},
+            "sort": [{"hour": "asc"}]
+        }
+    )
+
+    stages = Counter()
+    interest = Counter()
+    converted = Counter()
+    scores = Counter()
+    intents = Counter()
+    leads_per_day = Counter()
+
+    for hit in res["hits"]["hits"]:
+        doc = hit["_source"]
+        stages.update(doc.get("stages", {}))
+        interest.update(doc.get("group_interest", {}))
+        converted.update(doc.get("group_converted", {}))
+
+        leads = doc.get("leads", {})
+        if leads:
+            leads_per_day[doc["hour"][:10]] += leads.get("count", 0)
+            scores.update(leads.get("scores", {}))
+            intents.update(leads.get("intents", {}))
+
+    result = {
+        "hours": hours,
+        "funnel": {stage: stages.get(stage, 0) for stage in FUNNEL_STAGES},
+        "leads_per_day": dict(sorted(leads_per_day.items())),
+        "score_distribution": {
+            f"{k}-{int(k) + SCORE_BUCKET - 1}": v
+            for k, v in sorted(scores.items(), key=lambda kv: int(kv[0]))
+        },
+        "intents": dict(intents.most_common()),
+        "conversion_by_group": {
+            group: {
+                "interest": interest[group],
+                "converted": converted[group],
+                "rate": round(converted[group] / interest[group], 4) if interest[group] else None
+            }
+            for group in sorted(set(interest) | set(converted))
+        },
+        "generated_at": time.time()
+    }
+
+    _cache[hours] = (time.time(), result)
+    return result
+
+
+if __name__ == "__main__":
+    # Cron-friendly: python -m services.analytics
+    create_rollup_index()
+    run_rollup()
@@ -1,6 +1,18 @@
-def customer_confirmation_email(product, qty, price):
+def customer_confirmation_email(lines):
     print("Generating customer confirmation email...")
-    total = qty * price
+
+    items = ""
+    total = 0
+
+    for line in lines:
+        line_total = line["qty"] * line["price"]
+        total += line_total
+        items += (
+            f"Product: {line['name']}\n"
+            f"Quantity: {line['qty']}\n"
+            f"Price: £{line['price']}\n"
+            f"Subtotal: £{line_total:.2f}\n\n"
+        )
 
     return f"""
 Hello,
@@ -9,10 +21,7 @@ Thank you for your order with Frono.uk.
 
 Order Details:
 
-Product: {product}
-Quantity: {qty}
-Price: £{price}
-Total: £{total}
+{items}Total: £{total:.2f}
 
 Your order is now being processed.
 
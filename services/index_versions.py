@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+
+# ---------------------------------------------------
+# BLUE/GREEN INDEX VERSIONS
+# ---------------------------------------------------
+# Readers always go through an alias ("frono_products"); every rebuild
+# writes a new "<alias>_v<UTC timestamp>" index that nobody reads yet,
+# with refresh off and no replicas. Once it is full it gets the live
+# settings back, is warmed with a few real queries, and the alias moves
+# to it in one _aliases call. Previous versions stay for rollback().
+
+BUILD_SETTINGS = {"refresh_interval": "-1", "number_of_replicas": 0}
+# Index settings worth carrying over; the rest (uuid, creation_date,
+# version, provided_name) belong to the old index
+COPIED_SETTINGS = ("number_of_shards", "number_of_replicas", "refresh_interval", "analysis")
+
+
+def version_name(alias: str) -> str:
+    return f"{alias}_v{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+
+
+def versions(client, alias: str) -> list:
+    """Every versioned index of the alias, oldest first."""
+    return sorted(client.indices.get(index=f"{alias}_v*", expand_wildcards="open"))
+
+
+def live_index(client, alias: str):
+    """
+    The index the alias points at, or None. Before the first rebuild the
+    name is still a plain index; that is returned as-is.
+    """
+    if client.indices.exists_alias(name=alias):
+        return next(iter(client.indices.get_alias(name=alias)))
+    if client.indices.exists(index=alias):
+        return alias
+    return None
+
+
+def create_version(client, alias: str, properties: dict | None = None) -> str:
+    """
+    Creates the next version with the live index's mappings and settings
+    (minus the sync checkpoint, which describes the old index) and bulk
+    build settings. `properties` are added to the mapping.
+    """
+    live = live_index(client, alias)
+    mappings, settings = {}, {}
+    if live:
+        mappings = next(iter(client.indices.get_mapping(index=live).values()))["mappings"]
+        current = next(iter(client.indices.get_settings(index=live).values()))["settings"]["index"]
+        settings = {k: current[k] for k in COPIED_SETTINGS if k in current}
+        meta = {k: v for k, v in mappings.get("_meta", {}).items() if k != "product_sync"}
+        mappings = {**mappings, "_meta": meta}
+    if properties:
+        mappings = {**mappings, "properties": {**mappings.get("properties", {}), **properties}}
+
+    name = version_name(alias)
+    client.indices.create(index=name, body={
+        "settings": {"index": {**settings, **BUILD_SETTINGS}},
+        "mappings": mappings
+    })
+    print(f"🆕 Building {name} (from {live or 'scratch'}, refresh off, 0 replicas)")
+    return name
+
+
+def finish_version(client, alias: str, name: str, warmup: list):
+    """Restores live settings, waits for the shards, refreshes and warms `name`."""
+    live = live_index(client, alias)
+    restore = {"refresh_interval": None, "number_of_replicas": None}     # None = cluster default
+    if live:
+        current = next(iter(client.indices.get_settings(index=live).values()))["settings"]["index"]
+        restore = {k: current.get(k) for k in ("refresh_interval", "number_of_replicas")}
+    client.indices.put_settings(index=name, body={"index": restore})
+    client.indices.refresh(index=name)
+
+    # Replicas that can't be placed (single node) must not block the swap.
+    # request_timeout keeps the client from reading `timeout` as its own
+    health = client.cluster.health(index=name, wait_for_status="yellow", wait_for_no_initializing_shards=True,
+                                   timeout="120s", request_timeout=130)
+    if health.get("timed_out"):
+        print(f"⚠️ {name} shards still initializing ({health.get('status')}), swapping anyway")
+
+    # First queries pay for loading segments and filling caches; let the
+    # sync pay instead of the first shoppers
+    for body in warmup:
+        client.search(index=name, body=body, request_cache=True)
+    print(f"🔥 {name}: settings restored {restore}, warmed with {len(warmup)} queries")
+
+
+def swap_alias(client, alias: str, name: str):
+    """Points the alias at `name` in one atomic _aliases call."""
+    live = live_index(client, alias)
+    actions = [{"add": {"index": name, "alias": alias}}]
+    if live == alias:
+        # A plain index holds the name; it is removed in the same call
+        # (its documents are in `name` now, but it can't be rolled back to)
+        actions.append({"remove_index": {"index": alias}})
+    elif live:
+        actions.insert(0, {"remove": {"index": live, "alias": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    print(f"🔀 {alias}: {live or '-'} -> {name}")
+
+
+def prune_versions(client, alias: str, keep: int):
+    """Deletes all but the live version and the `keep` newest before it."""
+    live = live_index(client, alias)
+    older = [v for v in versions(client, alias) if v != live and (live is None or v < live)]
+    for name in older[:max(len(older) - keep, 0)]:
+        client.indices.delete(index=name)
+        print(f"🗑️ Deleted old version {name}")
+
+
+def rollback(client, alias: str) -> str | None:
+    """Moves the alias back to the newest version older than the live one."""
+    live = live_index(client, alias)
+    older = [v for v in versions(client, alias) if live not in (None, alias) and v < live]
+    if not older:
+        print(f"⚠️ {alias}: no older version to roll back to")
+        return None
+    swap_alias(client, alias, older[-1])
+    return older[-1]
@@ -0,0 +1,270 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from search.leads_repo import bulk_upsert_leads, lead_id_for
+
+
+class LeadBufferFull(Exception):
+    """Raised when a lead can't be buffered (too many waiting, or stopped); write it directly."""
+    pass
+
+
+class LeadBuffer:
+    """
+    Write-behind buffer for frono_leads.
+
+    submit() journals the lead to disk, keeps it in a bounded in-memory map
+    and returns straight away. A background thread writes the map with
+    bulk_upsert_leads every `flush_interval_ms` or as soon as
+    `max_records` leads are waiting.
+
+    Journal layout: every worker process journals to its own files, since
+    they all share one configured path. `<path>.<pid>` is the active
+    append-only file. A flush rotates it to `<path>.<pid>.<ns>.seg`, and a
+    segment is deleted only once its leads are in OpenSearch. The worker
+    holds an exclusive flock on `<path>.<pid>.lock` while it runs.
+
+    At startup a worker replays its own leftovers, then adopts the files of
+    any worker whose lock it can take: that worker is gone. A live
+    worker's files are never touched. Lead ids are deterministic and the
+    upsert is idempotent, so replaying a segment that was in fact written
+    is harmless.
+    """
+
+    def __init__(
+        self,
+        journal_path: str,
+        flush_interval_ms: int = 500,
+        max_records: int = 500,
+        max_pending: int = 10000,
+        max_retries: int = 5,
+        fsync: bool = True,
+    ):
+        self.base_path = journal_path
+        self.journal_path = None        # <base_path>.<pid>, set by start()
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_records = max_records
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._pending = {}          # lead_id -> lead data
+        self._segments = []         # segment files backing _pending
+        self._journal = None
+        self._owner_lock = None
+        self._thread = None
+
+        self.stats = {"submitted": 0, "flushed": 0, "failed_flushes": 0, "replayed": 0}
+
+    # ------------------------------------------------
+    # LIFECYCLE
+    # ------------------------------------------------
+    def start(self):
+        os.makedirs(os.path.dirname(self.base_path) or ".", exist_ok=True)
+
+        # Per process, not per instance: workers forked after import share it
+        self.journal_path = f"{self.base_path}.{os.getpid()}"
+        self._owner_lock = open(f"{self.journal_path}.lock", "a")
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX)
+
+        with self._lock:
+            self._adopt_orphans()
+            self._replay()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="lead-flusher", daemon=True)
+        self._thread.start()
+
+        if self._pending:
+            print(f"♻️ Replaying {len(self._pending)} journaled leads.")
+            self._wakeup.set()
+
+    def stop(self, timeout: float = 10):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still draining: the flusher closes the journal when it's done
+                print(f"⚠️ Lead flusher still running after {timeout}s, leaving the journal open.")
+                return
+        self._close_journal()
+
+    def _close_journal(self):
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+            if self._owner_lock:
+                # Unflushed files stay on disk for whoever starts next
+                self._owner_lock.close()
+                self._owner_lock = None
+
+    # ------------------------------------------------
+    # REQUEST PATH
+    # ------------------------------------------------
+    def submit(self, data: dict) -> dict:
+        """
+        Returns the provisional {"id", "created_at"}. The id is the final
+        lead id; created_at is only final for brand new leads.
+        """
+        lead_id = lead_id_for(data)
+        now = datetime.utcnow().isoformat()
+
+        with self._lock:
+            if self._stopping.is_set() or self._journal is None:
+                raise LeadBufferFull("lead buffer is stopped")
+            if lead_id not in self._pending and len(self._pending) >= self.max_pending:
+                raise LeadBufferFull(f"{len(self._pending)} leads waiting to be written")
+
+            self._journal.write(json.dumps({"id": lead_id, "data": data}) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+
+            self._merge(lead_id, data)
+            self.stats["submitted"] += 1
+            full = len(self._pending) >= self.max_records
+
+        if full:
+            self._wakeup.set()
+
+        return {"id": lead_id, "created_at": now}
+
+    def _merge(self, lead_id: str, data: dict):
+        prev = self._pending.get(lead_id)
+        if prev is None:
+            self._pending[lead_id] = data
+            return
+
+        self._pending[lead_id] = {
+            **prev,
+            **{k: v for k, v in data.items() if v is not None},
+            "lead_score": max(prev.get("lead_score", 0), data.get("lead_score", 0)),
+        }
+
+    # ------------------------------------------------
+    # FLUSHER
+    # ------------------------------------------------
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+        # Final drain on shutdown
+        try:
+            self.flush()
+        finally:
+            self._close_journal()
+
+    def flush(self) -> int:
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch = self._pending
+            # A closed journal was already rotated by the final drain
+            segments = self._segments + ([self._rotate()] if self._journal else [])
+            self._pending = {}
+            self._segments = []
+
+        start = time.time()
+        remaining = batch
+
+        for attempt in range(self.max_retries):
+            try:
+                results = bulk_upsert_leads(list(remaining.values()))
+            except Exception as e:
+                results = {lead_id: {"status": "error", "error": str(e)} for lead_id in remaining}
+
+            remaining = {
+                lead_id: data for lead_id, data in remaining.items()
+                if results.get(lead_id, {}).get("status") in (None, "error")
+            }
+            if not remaining:
+                break
+            time.sleep(min(0.2 * 2 ** attempt, 5))
+
+        if remaining:
+            # Keep the segments on disk and retry these leads next round
+            self.stats["failed_flushes"] += 1
+            print(f"❌ Lead flush failed for {len(remaining)} leads, will retry.")
+            with self._lock:
+                for lead_id, data in remaining.items():
+                    self._merge(lead_id, data)
+                self._segments = segments + self._segments
+            return len(batch) - len(remaining)
+
+        for seg in segments:
+            try:
+                os.remove(seg)
+            except FileNotFoundError:
+                pass
+
+        self.stats["flushed"] += len(batch)
+        print(f"💾 Flushed {len(batch)} leads in {(time.time() - start) * 1000:.0f}ms")
+        return len(batch)
+
+    def _rotate(self) -> str:
+        """Closes the active journal as a segment. Caller holds the lock."""
+        seg = f"{self.journal_path}.{time.time_ns()}.seg"
+        self._journal.close()
+        os.replace(self.journal_path, seg)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return seg
+
+    def _adopt_orphans(self):
+        """
+        Moves the journal and segments of dead workers into our own segments.
+        A worker is dead when its lock can be taken. Caller holds the lock.
+        """
+        for lock_path in sorted(glob.glob(f"{glob.escape(self.base_path)}.*.lock")):
+            owner = lock_path[len(self.base_path) + 1:-len(".lock")]
+            if not owner.isdigit() or lock_path == f"{self.journal_path}.lock":
+                continue
+            with open(lock_path, "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue        # still running
+                prefix = f"{self.base_path}.{owner}"
+                orphans = sorted(glob.glob(f"{glob.escape(prefix)}.*.seg"))
+                if os.path.exists(prefix):
+                    if os.path.getsize(prefix):
+                        orphans.append(prefix)
+                    else:
+                        os.remove(prefix)
+                for path in orphans:
+                    os.replace(path, f"{self.journal_path}.{time.time_ns()}.seg")
+                if orphans:
+                    print(f"♻️ Adopted {len(orphans)} lead journal files from worker {owner}.")
+
+    def _replay(self):
+        """Loads every unflushed record into _pending. Caller holds the lock."""
+        files = sorted(glob.glob(f"{glob.escape(self.journal_path)}.*.seg"))
+
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path):
+            seg = f"{self.journal_path}.{time.time_ns()}.seg"
+            os.replace(self.journal_path, seg)
+            files.append(seg)
+
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn final line from a crash mid-write
+                        continue
+                    self._merge(record["id"], record["data"])
+                    self.stats["replayed"] += 1
+
+        self._segments = files
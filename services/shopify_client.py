@@ -0,0 +1,211 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from config import (
+    SHOPIFY_ACCESS_TOKEN, SHOPIFY_STORE_NAME, API_VERSION,
+    SHOPIFY_MAX_CONCURRENCY, SHOPIFY_LEAK_RATE, SHOPIFY_TIMEOUT, SHOPIFY_MAX_RETRIES
+)
+
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"     # e.g. "32/40"
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+
+
+class ShopifyError(Exception):
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------------------------------------------------
+# LEAKY BUCKET (client-side mirror of Shopify's)
+# ---------------------------------------------------
+class LeakyBucket:
+    """
+    Every call fills Shopify's bucket by one and it drains at `leak_rate`
+    per second; a call into a full bucket gets a 429. acquire() blocks
+    until the estimated level plus calls still in flight leaves room, so
+    concurrent fetches slow down before Shopify starts refusing them.
+    The call-limit header can only raise the estimate: other API clients
+    share the bucket, but a response that overtook a slower one reports a
+    level that is already stale.
+    """
+
+    def __init__(self, capacity: int = 40, leak_rate: float = SHOPIFY_LEAK_RATE, headroom: int = 2):
+        self.capacity = capacity
+        self.leak_rate = leak_rate
+        self.headroom = headroom
+        self.level = 0.0
+        self.in_flight = 0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self.stats = {"waits": 0, "wait_s": 0.0}
+
+    def _drain(self, now: float):
+        self.level = max(self.level - (now - self._updated) * self.leak_rate, 0.0)
+        self._updated = now
+
+    def acquire(self):
+        with self._cond:
+            start = time.monotonic()
+            while True:
+                self._drain(time.monotonic())
+                free = self.capacity - self.headroom - self.level - self.in_flight
+                if free >= 1:
+                    break
+                self._cond.wait((1 - free) / self.leak_rate)
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.stats["waits"] += 1
+                self.stats["wait_s"] += waited
+            self.in_flight += 1
+
+    def release(self, headers=None, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            self._drain(time.monotonic())
+            self.level += 1
+            limit = headers.get(CALL_LIMIT_HEADER) if headers is not None else None
+            if limit:
+                try:
+                    used, capacity = limit.split("/")
+                    self.level, self.capacity = max(self.level, float(used)), int(capacity)
+                except ValueError:
+                    pass
+            if throttled:
+                self.level = float(self.capacity)
+            self._cond.notify_all()
+
+
+# ---------------------------------------------------
+# CLIENT
+# ---------------------------------------------------
+class ShopifyClient:
+    """
+    Admin REST client for the sync scripts: one keep-alive pool, at most
+    `max_concurrency` calls in flight, paced by LeakyBucket. 429s wait for
+    Retry-After, 5xx and connection errors back off exponentially; after
+    SHOPIFY_MAX_RETRIES a ShopifyError is raised instead of returning a
+    partial listing.
+    """
+
+    def __init__(self, base_url: str | None = None, token: str = SHOPIFY_ACCESS_TOKEN,
+                 max_concurrency: int = SHOPIFY_MAX_CONCURRENCY, leak_rate: float = SHOPIFY_LEAK_RATE):
+        self.base_url = base_url or f"https://{SHOPIFY_STORE_NAME}.myshopify.com/admin/api/{API_VERSION}"
+        self.max_concurrency = max_concurrency
+        self.http = httpx.Client(
+            base_url=self.base_url,
+            headers={"X-Shopify-Access-Token": token},
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=SHOPIFY_TIMEOUT,
+        )
+        self.bucket = LeakyBucket(leak_rate=leak_rate)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "retries": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, url: str, params: dict | None = None) -> httpx.Response:
+        error = None
+        for attempt in range(SHOPIFY_MAX_RETRIES + 1):
+            if attempt:
+                self._count("retries")
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                response = self.http.get(url, params=params)
+            except httpx.TransportError as e:
+                self.bucket.release()
+                error = ShopifyError(f"Shopify request failed: {e!r}")
+                time.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+                continue
+
+            throttled = response.status_code == 429
+            self.bucket.release(response.headers, throttled)
+            if throttled:
+                self._count("throttled")
+                try:
+                    wait = float(response.headers.get("Retry-After", 2))
+                except ValueError:
+                    wait = 2.0
+                error = ShopifyError("Shopify rate limited", 429)
+                time.sleep(wait)
+            elif response.status_code >= 500:
+                error = ShopifyError(f"Shopify returned {response.status_code}", response.status_code)
+                time.sleep(min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX))
+            elif response.status_code >= 400:
+                raise ShopifyError(f"Shopify returned {response.status_code} for {url}", response.status_code)
+            else:
+                return response
+        raise error
+
+    def paginate(self, path: str, **params):
+        """Yields each page's JSON, following the Link rel="next" cursor."""
+        url, query = path, params
+        while url:
+            response = self.get(url, query)
+            yield response.json()
+            url = response.links.get("next", {}).get("url")
+            query = None    # the next URL carries page_info and limit
+
+    # ------------------------------------------------
+    # COLLECTIONS
+    # ------------------------------------------------
+    def list_collections(self) -> list:
+        """Custom then smart collections, both listings fetched at once."""
+        def listing(kind):
+            items = []
+            for data in self.paginate(f"{kind}.json", limit=250):
+                items.extend(data.get(kind, []))
+            return items
+
+        with ThreadPoolExecutor(2) as pool:
+            custom, smart = pool.map(listing, ("custom_collections", "smart_collections"))
+        return custom + smart
+
+    def collection_product_ids(self, collection_id) -> list:
+        ids = []
+        for data in self.paginate(f"collections/{collection_id}/products.json", limit=250, fields="id"):
+            ids.extend(p["id"] for p in data.get("products", []))
+        return ids
+
+    def collection_products_map(self, collections: list) -> dict:
+        """product id -> collection titles, in collection order."""
+        with ThreadPoolExecutor(self.max_concurrency) as pool:
+            per_collection = list(pool.map(lambda c: self.collection_product_ids(c["id"]), collections))
+
+        collections_map = {}
+        for col, product_ids in zip(collections, per_collection):
+            for product_id in product_ids:
+                collections_map.setdefault(product_id, []).append(col["title"])
+        return collections_map
+
+    def product_collections(self, product_id) -> list:
+        """Titles of the custom then smart collections holding one product."""
+        titles = []
+        for kind in ("custom_collections", "smart_collections"):
+            for data in self.paginate(f"{kind}.json", product_id=product_id, limit=250):
+                titles.extend(c["title"] for c in data.get(kind, []))
+        return titles
+
+    def collections_for_products(self, product_ids) -> dict:
+        """product id -> collection titles for just these products (two calls each)."""
+        product_ids = list(product_ids)
+        with ThreadPoolExecutor(self.max_concurrency) as pool:
+            per_product = list(pool.map(self.product_collections, product_ids))
+        return {pid: titles for pid, titles in zip(product_ids, per_product) if titles}
+
+    def report(self) -> dict:
+        return {
+            **self.stats,
+            "bucket_waits": self.bucket.stats["waits"],
+            "bucket_wait_s": round(self.bucket.stats["wait_s"], 2),
+        }
+
+    def close(self):
+        self.http.close()
@@ -0,0 +1,50 @@
+import threading
+import time
+
+# ---------------------------------------------------
+# IN-PROCESS STOCK CHANGE PUB/SUB
+# ---------------------------------------------------
+# Anything that changes a SKU's quantity (order commits, rollbacks,
+# catalog syncs) publishes here. master_sync runs in its own process and
+# reaches the app through services/sync_events.py, which republishes its
+# changes here. Subscribers are plain callables that receive one event dict:
+#   {"sku": str, "qty": int | None, "name": str | None,
+#    "source": str, "ts": float}
+
+_subscribers = []
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    with _lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+    return callback
+
+
+def unsubscribe(callback):
+    with _lock:
+        if callback in _subscribers:
+            _subscribers.remove(callback)
+
+
+def publish(sku: str, qty, name=None, source: str = "order"):
+    event = {
+        "sku": sku,
+        "qty": qty,
+        "name": name,
+        "source": source,
+        "ts": time.time(),
+    }
+
+    with _lock:
+        callbacks = list(_subscribers)
+
+    # A broken subscriber must never fail the stock write that triggered it.
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"❌ Stock event subscriber error: {e}")
+
+    return event
@@ -1,82 +1,223 @@
 from datetime import date
+from opensearchpy import NotFoundError, ConflictError
 from search.opensearch_client import client
+from services import stock_events
 
 INDEX = "frono_products"
 
+# How many times OpenSearch re-runs the script when a concurrent
+# write bumps the document version between its internal get and index.
+RETRY_ON_CONFLICT = 5
+
+# A restock that lost every retry wrote nothing (409), so sending it again
+# is safe; it must not be dropped or the units are gone for good.
+RESTOCK_ROUNDS = 3
+
+# The stock check lives inside the script so the read and the decrement
+# happen on the shard as one operation. Short stock turns the update into
+# a no-op, which OpenSearch reports back as result == "noop".
+# Both scripts drop content_hash: the document no longer matches what
+# master_sync hashed, so the next sync rewrites it from Shopify.
+COMMIT_SCRIPT = """
+    if (ctx._source.qty == null || ctx._source.qty < params.q) {
+        ctx.op = 'noop';
+    } else {
+        ctx._source.qty -= params.q;
+        ctx._source.in_stock = ctx._source.qty > 0;
+        ctx._source.updated_at = params.today;
+        ctx._source.remove('content_hash');
+    }
+"""
+
+# Compensation for a partially committed cart.
+RESTOCK_SCRIPT = """
+    ctx._source.qty += params.q;
+    ctx._source.in_stock = ctx._source.qty > 0;
+    ctx._source.updated_at = params.today;
+    ctx._source.remove('content_hash');
+"""
+
 
 class StockService:
 
     @staticmethod
     def get_by_sku(sku: str):
-        query = {
-            "query": {
-                "bool": {
-                    "should": [
-                        {"term": {"sku.keyword": sku}},
-                        {"match": {"sku": sku}}
-                    ]
-                }
+        """
+        Products are indexed with _id = sku (see master_sync), so this is a
+        realtime get rather than a search.
+        """
+        try:
+            return client.get(index=INDEX, id=sku)
+        except NotFoundError:
+            return None
+
+    @staticmethod
+    def _script(qty: int, source: str = COMMIT_SCRIPT) -> dict:
+        return {
+            "lang": "painless",
+            "source": source,
+            "params": {
+                "q": qty,
+                "today": date.today().isoformat()
             }
         }
 
-        # ✅ FIX: Add seq_no_primary_term=True to get the metadata
-        result = client.search(
-            index=INDEX,
-            body=query,
-            seq_no_primary_term=True
-        )
+    @staticmethod
+    def _line_result(sku: str, result: str, src: dict) -> dict:
+        return {
+            "sku": sku,
+            "status": "committed" if result == "updated" else "insufficient",
+            "qty": src.get("qty"),
+            "name": src.get("name"),
+        }
 
-        hits = result["hits"]["hits"]
+    @staticmethod
+    def commit(sku: str, qty: int) -> dict:
+        """
+        Single round-trip stock decrement keyed by document id.
 
-        if not hits:
-            return None
+        Returns {"sku", "status", "qty"} where status is one of
+        "committed", "insufficient", "conflict" or "not_found" and qty is
+        the stock left after the call (None when it is unknown).
+        """
+        try:
+            result = client.update(
+                index=INDEX,
+                id=sku,
+                body={"script": StockService._script(qty)},
+                retry_on_conflict=RETRY_ON_CONFLICT,
+                _source=["qty", "name"]
+            )
+        except NotFoundError:
+            return {"sku": sku, "status": "not_found", "qty": None}
+        except ConflictError:
+            # Every server-side retry lost the race; nothing was written.
+            return {"sku": sku, "status": "conflict", "qty": None}
+
+        line = StockService._line_result(
+            sku,
+            result.get("result"),
+            result.get("get", {}).get("_source", {})
+        )
+        StockService._publish([line])
+        return line
 
-        return hits[0] # Returns full metadata + source
+    @staticmethod
+    def _publish(results: list):
+        """Tells open chats about every quantity this process just changed."""
+        for r in results:
+            if r["status"] in ("committed", "rolled_back") and r.get("qty") is not None:
+                stock_events.publish(r["sku"], r["qty"], r.get("name"), source="order")
 
     @staticmethod
-    def reserve_and_commit(sku: str, qty: int):
+    def _bulk_scripts(lines: list, source: str) -> list:
         """
-        Atomic stock reduction with optimistic locking
+        Runs one scripted update per line in a single _bulk request and
+        returns a result dict per line, in order.
         """
+        body = []
+        for line in lines:
+            body.append({
+                "update": {
+                    "_index": INDEX,
+                    "_id": line["sku"],
+                    "retry_on_conflict": RETRY_ON_CONFLICT
+                }
+            })
+            body.append({
+                "script": StockService._script(line["qty"], source),
+                "_source": ["qty", "name"]
+            })
+
+        res = client.bulk(body=body)
+
+        results = []
+        for line, item in zip(lines, res.get("items", [])):
+            item = item.get("update", {})
+            status = item.get("status")
+
+            if status == 404:
+                results.append({"sku": line["sku"], "status": "not_found", "qty": None})
+            elif status == 409:
+                results.append({"sku": line["sku"], "status": "conflict", "qty": None})
+            elif item.get("error"):
+                results.append({"sku": line["sku"], "status": "error", "qty": None, "error": item["error"]})
+            else:
+                results.append(StockService._line_result(
+                    line["sku"],
+                    item.get("result"),
+                    item.get("get", {}).get("_source", {})
+                ))
+
+        return results
 
-        doc = StockService.get_by_sku(sku)
+    @staticmethod
+    def commit_cart(lines: list) -> dict:
+        """
+        Commits every cart line in one _bulk request.
 
-        if not doc:
-            raise Exception("Product not found")
+        All-or-nothing: if any line is not committed, the lines that were
+        decremented are restocked with a compensating bulk update.
+        Returns {"committed": bool, "lines": [per-line result]}.
+        """
+        # One update per SKU, otherwise two lines would race each other.
+        merged = {}
+        for line in lines:
+            if line["sku"] in merged:
+                merged[line["sku"]]["qty"] += line["qty"]
+            else:
+                merged[line["sku"]] = {"sku": line["sku"], "qty": line["qty"]}
+        lines = list(merged.values())
+
+        results = StockService._bulk_scripts(lines, COMMIT_SCRIPT)
+
+        if all(r["status"] == "committed" for r in results):
+            StockService._publish(results)
+            return {"committed": True, "lines": results}
+
+        # ------------------------------------------------
+        # Compensating rollback
+        # ------------------------------------------------
+        to_restock = [
+            line for line, r in zip(lines, results)
+            if r["status"] == "committed"
+        ]
+
+        if to_restock:
+            restocked = {}
+            for _ in range(RESTOCK_ROUNDS):
+                for r in StockService._bulk_scripts(to_restock, RESTOCK_SCRIPT):
+                    restocked[r["sku"]] = r
+                to_restock = [line for line in to_restock if restocked[line["sku"]]["status"] == "conflict"]
+                if not to_restock:
+                    break
+
+            for r in results:
+                if r["status"] == "committed":
+                    r["status"] = "rolled_back"
+                    r["qty"] = restocked[r["sku"]]["qty"]
+
+            failed = [r for r in restocked.values() if r["status"] != "committed"]
+            if failed:
+                print(f"❌ Stock rollback incomplete, fix manually: {failed}")
+
+        StockService._publish(results)
+        return {"committed": False, "lines": results}
 
-        doc_id = doc["_id"]
-        src = doc["_source"]
+    @staticmethod
+    def reserve_and_commit(sku: str, qty: int):
+        """
+        Atomic stock reduction. Raises when the order cannot be fulfilled.
+        """
+        result = StockService.commit(sku, qty)
 
-        seq_no = doc["_seq_no"]
-        primary_term = doc["_primary_term"]
+        if result["status"] == "not_found":
+            raise Exception("Product not found")
 
-        if src["qty"] < qty:
+        if result["status"] == "insufficient":
             raise Exception("Insufficient stock")
 
-        today = date.today().isoformat()
-
-        body = {
-            "script": {
-                "source": """
-                    if (ctx._source.qty >= params.q) {
-                        ctx._source.qty -= params.q;
-                        ctx._source.in_stock = ctx._source.qty > 0;
-                        ctx._source.updated_at = params.today;
-                    }
-                """,
-                "params": {
-                    "q": qty,
-                    "today": today
-                }
-            }
-        }
-
-        result = client.update(
-            index=INDEX,
-            id=doc_id,
-            if_seq_no=seq_no,
-            if_primary_term=primary_term,
-            body=body
-        )
+        if result["status"] == "conflict":
+            raise Exception("Stock is being updated by another order, please retry")
 
         return result
@@ -0,0 +1,122 @@
+import threading
+import time
+
+# ---------------------------------------------------
+# SSE READERS + REPLY CANCELLATION
+# ---------------------------------------------------
+# POST /chat/stream generates the reply and pushes tokens into the
+# session's queue; GET /chat/stream/events/{session_id} is the only thing
+# that reads it. When that reader goes away (tab closed) the generation is
+# pointless, so the producer checks should_stop() between tokens and
+# closes the LLM stream.
+#
+# EventSource reconnects by itself after a network blip, so a session
+# only counts as gone once it has had no reader for DISCONNECT_GRACE
+# seconds. A session whose reader hasn't connected yet is never cancelled.
+DISCONNECT_GRACE = 2.0
+FORGET_AFTER = 600
+
+
+class ReplyTicket:
+    """One reply being generated for a session."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.superseded = threading.Event()
+        self.started_at = time.time()
+
+
+class StreamSessions:
+    def __init__(self, grace: float = DISCONNECT_GRACE):
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._readers = {}          # session_id -> open SSE connections
+        self._gone_since = {}       # session_id -> when the last reader left
+        self._replies = {}          # session_id -> ReplyTicket in progress
+        self.stats = {"started": 0, "completed": 0, "cancelled": 0, "superseded": 0, "tokens_not_generated": 0}
+
+    # ------------------------------------------------
+    # SSE SIDE
+    # ------------------------------------------------
+    def connect(self, session_id: str):
+        with self._lock:
+            self._readers[session_id] = self._readers.get(session_id, 0) + 1
+            self._gone_since.pop(session_id, None)
+
+    def disconnect(self, session_id: str):
+        with self._lock:
+            left = self._readers.get(session_id, 0) - 1
+            if left > 0:
+                self._readers[session_id] = left
+                return
+            self._readers.pop(session_id, None)
+            now = time.time()
+            self._gone_since[session_id] = now
+            # Sessions that never came back don't need remembering for long
+            for sid, since in list(self._gone_since.items()):
+                if now - since > FORGET_AFTER:
+                    del self._gone_since[sid]
+
+    # ------------------------------------------------
+    # PRODUCER SIDE
+    # ------------------------------------------------
+    def begin(self, session_id: str) -> ReplyTicket:
+        """Registers a new reply; an older one still streaming is superseded."""
+        ticket = ReplyTicket(session_id)
+        with self._lock:
+            previous = self._replies.get(session_id)
+            if previous:
+                previous.superseded.set()
+            self._replies[session_id] = ticket
+            self.stats["started"] += 1
+        return ticket
+
+    def should_stop(self, ticket: ReplyTicket) -> str | None:
+        """Why the reply should stop ("disconnected" / "superseded"), or None."""
+        if ticket.superseded.is_set():
+            return "superseded"
+        gone = self._gone_since.get(ticket.session_id)
+        if gone is not None and time.time() - gone >= self.grace:
+            return "disconnected"
+        return None
+
+    def pump(self, ticket: ReplyTicket, tokens, queue, max_tokens: int = 0) -> tuple[str, str | None]:
+        """
+        Moves tokens into the session's SSE queue until they run out or
+        should_stop() says otherwise, then closes `tokens` (which closes the
+        Groq / Ollama HTTP stream). Returns (text sent, stop reason or None).
+        """
+        text = ""
+        sent = 0
+        stopped = None
+        try:
+            for token in tokens:
+                stopped = self.should_stop(ticket)
+                if stopped:
+                    break
+                text += token
+                sent += 1
+                queue.put(token)
+        finally:
+            tokens.close()
+            self.end(ticket, stopped, max_tokens, sent)
+        return text, stopped
+
+    def end(self, ticket: ReplyTicket, reason: str | None = None, max_tokens: int = 0, tokens: int = 0):
+        """reason: why it stopped early (see should_stop), None if it finished."""
+        with self._lock:
+            if self._replies.get(ticket.session_id) is ticket:
+                del self._replies[ticket.session_id]
+            if reason is None:
+                self.stats["completed"] += 1
+                return
+            self.stats["cancelled" if reason == "disconnected" else "superseded"] += 1
+            # Upper bound on what the provider would still have produced
+            self.stats["tokens_not_generated"] += max(max_tokens - tokens, 0)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {**self.stats, "readers": sum(self._readers.values()), "in_progress": len(self._replies)}
+
+
+stream_sessions = StreamSessions()
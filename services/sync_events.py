@@ -0,0 +1,169 @@
+import threading
+import time
+
+from opensearchpy import NotFoundError
+
+from services import stock_events
+
+# ---------------------------------------------------
+# SYNC -> APP EVENTS (across processes)
+# ---------------------------------------------------
+# master_sync runs as its own cron process, so stock_events.publish there
+# reaches nobody. It writes its events to frono_sync_events instead:
+#   sync_seq      counter bumped once per event (like config_version)
+#   event_<seq>   {"seq", "ts", "changes": [{"sku", "qty", "name"}], "reindexed": alias | None}
+# Every app worker polls the counter, reads the events it hasn't seen with
+# a realtime mget and republishes the stock changes in-process, so the
+# usual subscribers (retriever caches, SSE pushes, generation cache) run.
+# An alias swap (reindexed) or a gap in the events calls on_rebuild.
+
+SYNC_EVENTS_INDEX = "frono_sync_events"
+SEQ_ID = "sync_seq"
+POLL_INTERVAL = 1.0
+KEEP_EVENTS = 200               # older events are pruned; a worker further behind resets
+
+NEXT_SEQ_SCRIPT = """
+    ctx._source.value = (ctx._source.value == null ? 0 : ctx._source.value) + 1;
+    ctx._source.updated_at = params.now;
+"""
+
+
+def create_sync_events_index(client):
+    if not client.indices.exists(index=SYNC_EVENTS_INDEX):
+        client.indices.create(index=SYNC_EVENTS_INDEX, body={
+            "mappings": {
+                "properties": {
+                    "seq": {"type": "long"},
+                    "ts": {"type": "date", "format": "epoch_second"},
+                    "reindexed": {"type": "keyword"},
+                    "changes": {"type": "object", "enabled": False}
+                }
+            }
+        })
+        print(f"✅ Created {SYNC_EVENTS_INDEX} index.")
+
+
+# ------------------------------------------------
+# WRITER (master_sync)
+# ------------------------------------------------
+def publish(client, changes=(), reindexed: str | None = None) -> int:
+    """Records (sku, qty, name) stock changes and/or an alias swap. Returns the event's seq."""
+    create_sync_events_index(client)
+    res = client.update(
+        index=SYNC_EVENTS_INDEX,
+        id=SEQ_ID,
+        body={
+            "scripted_upsert": True,
+            "upsert": {},
+            "script": {"lang": "painless", "source": NEXT_SEQ_SCRIPT, "params": {"now": int(time.time())}}
+        },
+        retry_on_conflict=5,
+        _source=["value"]
+    )
+    seq = int(res["get"]["_source"]["value"])
+
+    client.index(index=SYNC_EVENTS_INDEX, id=f"event_{seq}", body={
+        "seq": seq,
+        "ts": int(time.time()),
+        "changes": [{"sku": sku, "qty": qty, "name": name} for sku, qty, name in changes],
+        "reindexed": reindexed
+    })
+
+    if seq > KEEP_EVENTS:
+        try:
+            client.delete_by_query(
+                index=SYNC_EVENTS_INDEX,
+                body={"query": {"range": {"seq": {"lte": seq - KEEP_EVENTS}}}},
+                conflicts="proceed"
+            )
+        except Exception as e:
+            print(f"⚠️ Sync event pruning failed: {e}")
+    return seq
+
+
+# ------------------------------------------------
+# LISTENER (app workers)
+# ------------------------------------------------
+def _fetch_seq(client) -> int | None:
+    """Realtime get of the counter; None when it can't be read."""
+    try:
+        doc = client.get(index=SYNC_EVENTS_INDEX, id=SEQ_ID, _source_includes=["value"])
+        return int(doc["_source"].get("value") or 0)
+    except NotFoundError:
+        return 0
+    except Exception:
+        return None
+
+
+def _apply(event: dict, on_rebuild):
+    for change in event.get("changes") or []:
+        stock_events.publish(change["sku"], change["qty"], change.get("name"), source="sync")
+    if event.get("reindexed"):
+        on_rebuild(event["reindexed"])
+
+
+def poll(client, state: dict, on_rebuild):
+    """
+    Applies the events after state["seq"], in order. A missing event is
+    waited for one round (the writer bumps the counter before writing it),
+    then skipped with on_rebuild(None): whatever it held is unknown.
+    """
+    current = _fetch_seq(client)
+    if current is not None and state["seq"] is None:
+        state["seq"] = current          # started while the index was unreachable
+    if current is None or current <= state["seq"]:
+        return
+
+    if current - state["seq"] > KEEP_EVENTS:
+        print(f"⚠️ {current - state['seq']} sync events behind, resetting catalog caches")
+        state["seq"], state["missing"] = current, None
+        on_rebuild(None)
+        return
+
+    ids = [f"event_{seq}" for seq in range(state["seq"] + 1, current + 1)]
+    docs = client.mget(index=SYNC_EVENTS_INDEX, body={"ids": ids})["docs"]
+    for doc in docs:
+        if not doc.get("found"):
+            if state["missing"] != doc["_id"]:
+                state["missing"] = doc["_id"]
+                return
+            print(f"⚠️ Sync event {doc['_id']} never arrived, resetting catalog caches")
+            on_rebuild(None)
+        else:
+            _apply(doc["_source"], on_rebuild)
+        state["seq"] += 1
+        state["missing"] = None
+
+
+def start_listener(client, on_rebuild, interval: float = POLL_INTERVAL):
+    """
+    Polls from the current seq on (nothing older is replayed). on_rebuild(alias)
+    runs after an alias swap, or with None when events were missed. Never
+    fails startup: while OpenSearch is unreachable the loop keeps retrying.
+    """
+    state = {"seq": None, "missing": None, "ready": False}
+
+    def prepare():
+        try:
+            create_sync_events_index(client)
+            state["ready"] = True
+            state["seq"] = _fetch_seq(client)
+        except Exception as e:
+            print(f"⚠️ Sync events index unavailable, will retry: {e}")
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            if not state["ready"]:
+                prepare()
+                continue
+            try:
+                poll(client, state, on_rebuild)
+            except Exception as e:
+                print(f"❌ Sync event poll failed: {e}")
+
+    prepare()
+
+    thread = threading.Thread(target=loop, name="sync-events", daemon=True)
+    thread.start()
+    return thread